@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Sınırlı Alarm Deposu
+Alarmları (tip, CAN ID) anahtarıyla toplar: sayaçlar, ilk/son görülme zamanı
+ve bastırma pencereleri. Aynı koşul her frame'de tekrarlandığında bellek ve
+log satırı sayısı sabit kalır.
+"""
+
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# Tutulacak en fazla (tip, CAN ID) toplamı; dolunca en uzun süredir görülmeyen atılır
+DEFAULT_AGGREGATE_CAPACITY = 1024
+# Son loglanan alarm olayları ring'i
+DEFAULT_RECENT_SIZE = 100
+# Aynı (tip, CAN ID) için iki log satırı arasındaki en kısa süre (saniye)
+DEFAULT_SUPPRESSION_WINDOW = 10.0
+# Tüm anahtarlar için saniyede en fazla alarm log satırı
+DEFAULT_MAX_LOGS_PER_SECOND = 20
+
+
+class AlarmAggregate:
+    """Tek bir (tip, CAN ID) alarm toplamı"""
+    
+    __slots__ = ('alarm_type', 'can_id', 'count', 'suppressed', 'pending', 'first_seen_ns',
+                 'last_seen_ns', 'last_logged_ns', 'last_message')
+                 
+    def __init__(self, alarm_type: str, can_id: int, timestamp_ns: int, message: str):
+        self.alarm_type = alarm_type
+        self.can_id = can_id
+        self.count = 0
+        self.suppressed = 0  # Toplam bastırılan tekrar
+        self.pending = 0  # Son log satırından beri bastırılan tekrar
+        self.first_seen_ns = timestamp_ns
+        self.last_seen_ns = timestamp_ns
+        self.last_logged_ns: Optional[int] = None
+        self.last_message = message
+
+
+class AlarmStore:
+    """
+    (tip, CAN ID) anahtarlı, sınırlı alarm deposu
+    
+    `record()` frame yolunda çağrılır: yalnızca sayaç ve zaman damgası
+    günceller, alarmın loglanıp loglanmayacağını döndürür. Bir anahtar için ilk
+    alarm hemen loglanır; bastırma penceresi içindeki tekrarlar sayılır ve
+    pencere dolduktan sonraki ilk tekrarda özetlenir. Anahtarlar arası flood'a
+    karşı saniyelik global log bütçesi de uygulanır.
+    
+    Zaman damgaları monotonic ns'dir (CANIDS'in frame zaman damgası); raporlarda
+    duvar saatine çevrilir.
+    
+    Örnek:
+        store = AlarmStore()
+        suppressed = store.record('MALICIOUS_FRAME', 0x9FF, message, time.monotonic_ns())
+        if suppressed is not None:
+            logger.warning(...)  # suppressed: önceki satırdan beri bastırılan tekrar
+    """
+    
+    def __init__(self, capacity: int = DEFAULT_AGGREGATE_CAPACITY, recent_size: int = DEFAULT_RECENT_SIZE,
+                 suppression_window: float = DEFAULT_SUPPRESSION_WINDOW,
+                 max_logs_per_second: int = DEFAULT_MAX_LOGS_PER_SECOND,
+                 clock_offset_ns: Optional[int] = None):
+        """
+        Args:
+            capacity: En fazla (tip, CAN ID) toplamı
+            recent_size: Son alarm olayları ring'inin boyutu
+            suppression_window: Anahtar başına log bastırma penceresi (saniye)
+            max_logs_per_second: Global log satırı sınırı
+            clock_offset_ns: Zaman damgasını Unix ns'ye çeviren fark (varsayılan: monotonic → duvar saati)
+        """
+        self.capacity = capacity
+        self.suppression_window_ns = int(suppression_window * 1e9)
+        self.max_logs_per_second = max_logs_per_second
+        self.clock_offset_ns = time.time_ns() - time.monotonic_ns() if clock_offset_ns is None else clock_offset_ns
+        self._aggregates: 'OrderedDict[Tuple[str, int], AlarmAggregate]' = OrderedDict()
+        self.recent: deque = deque(maxlen=recent_size)
+        
+        self.total = 0
+        self.logged = 0
+        self.suppressed = 0
+        self.evicted = 0
+        self._log_window_start_ns = 0
+        self._log_window_count = 0
+        
+    def __len__(self) -> int:
+        """Toplam alarm sayısı (bastırılanlar dahil)"""
+        return self.total
+        
+    def record(self, alarm_type: str, can_id: int, message: str,
+               timestamp_ns: int, count: int = 1, first_seen_ns: Optional[int] = None) -> Optional[int]:
+        """
+        Alarmı topla
+        
+        Args:
+            alarm_type: Alarm tipi
+            can_id: CAN ID
+            message: Alarm mesajı
+            timestamp_ns: Alarm zamanı (monotonic ns); toplu kayıtta son tekrarın zamanı
+            count: Önceden toplanmış tekrar sayısı (ör. sharded IDS worker'ından)
+            first_seen_ns: Toplu kayıtta ilk tekrarın zamanı (None ise timestamp_ns)
+            
+        Returns:
+            Bastırıldıysa None; loglanmalıysa önceki log satırından beri
+            bastırılan tekrar sayısı
+        """
+        self.total += count
+        key = (alarm_type, can_id)
+        aggregates = self._aggregates
+        aggregate = aggregates.get(key)
+        if aggregate is None:
+            first_seen_ns = timestamp_ns if first_seen_ns is None else first_seen_ns
+            aggregate = aggregates[key] = AlarmAggregate(alarm_type, can_id, first_seen_ns, message)
+            if len(aggregates) > self.capacity:
+                aggregates.popitem(last=False)
+                self.evicted += 1
+        else:
+            aggregates.move_to_end(key)
+        aggregate.count += count
+        aggregate.last_seen_ns = timestamp_ns
+        aggregate.last_message = message
+        
+        last_logged = aggregate.last_logged_ns
+        if last_logged is not None and timestamp_ns - last_logged < self.suppression_window_ns:
+            return self._suppress(aggregate, count)
+            
+        # Global log bütçesi (1 saniyelik sabit pencere)
+        if timestamp_ns - self._log_window_start_ns >= 1_000_000_000:
+            self._log_window_start_ns = timestamp_ns
+            self._log_window_count = 0
+        if self._log_window_count >= self.max_logs_per_second:
+            return self._suppress(aggregate, count)
+        self._log_window_count += 1
+        self.logged += 1
+        if count > 1:
+            # Toplu kayıtta loglanan satır dışındaki tekrarlar bastırılmış sayılır
+            self._suppress(aggregate, count - 1)
+        aggregate.last_logged_ns = timestamp_ns
+        self.recent.append(self._event(aggregate, message, timestamp_ns))
+        pending, aggregate.pending = aggregate.pending, 0
+        return pending
+        
+    def _suppress(self, aggregate: AlarmAggregate, count: int = 1) -> None:
+        aggregate.suppressed += count
+        aggregate.pending += count
+        self.suppressed += count
+        return None
+        
+    def _isoformat(self, timestamp_ns: int) -> str:
+        return datetime.fromtimestamp((timestamp_ns + self.clock_offset_ns) / 1e9).isoformat()
+        
+    def _event(self, aggregate: AlarmAggregate, message: str, timestamp_ns: int) -> Dict[str, Any]:
+        return {
+            'type': aggregate.alarm_type,
+            'message': message,
+            'can_id': hex(aggregate.can_id),
+            'timestamp': self._isoformat(timestamp_ns),
+            'count': aggregate.count,
+        }
+        
+    def aggregates(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Alarm toplamları (en sık görülen önce)"""
+        items = sorted(self._aggregates.values(), key=lambda a: a.count, reverse=True)
+        if limit is not None:
+            items = items[:limit]
+        return [
+            {
+                'type': a.alarm_type,
+                'can_id': hex(a.can_id),
+                'count': a.count,
+                'suppressed': a.suppressed,
+                'first_seen': self._isoformat(a.first_seen_ns),
+                'last_seen': self._isoformat(a.last_seen_ns),
+                'last_message': a.last_message,
+            }
+            for a in items
+        ]
+        
+    def get_statistics(self, limit: Optional[int] = 20) -> Dict[str, Any]:
+        """Sayaçlar ve alarm toplamları"""
+        return {
+            'total': self.total,
+            'logged': self.logged,
+            'suppressed': self.suppressed,
+            'unique': len(self._aggregates),
+            'evicted': self.evicted,
+            'aggregates': self.aggregates(limit),
+        }
+        
+    def clear(self):
+        """Tüm toplamları ve sayaçları sıfırla"""
+        self._aggregates.clear()
+        self.recent.clear()
+        self.total = self.logged = self.suppressed = self.evicted = 0
+        self._log_window_start_ns = 0
+        self._log_window_count = 0
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Event Loop Uyumlu CAN Okuyucu / Yazıcı
+Bloklayan `bus.recv(timeout=0.1)` döngüleri yerine can.Notifier üzerinden
+frame'leri sınırlı bir asyncio kuyruğuna aktarır ve backpressure metrikleri tutar.
+Gönderim yönünde tek bir TX görevi sınırlı kuyruktaki frame'leri batch halinde yazar.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import can
+
+from latency_histogram import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# Kuyruk dolduğunda tüketici yetişemiyor demektir; varsayılan ~1 sn'lik yoğun trafik
+DEFAULT_QUEUE_SIZE = 1024
+# TX kuyruğu: komut frame'leri seyrek gelir, dolması bus'ın tıkandığını gösterir
+DEFAULT_TX_QUEUE_SIZE = 256
+# TX görevinin bir uyanışta yazdığı en fazla frame
+DEFAULT_TX_BATCH_SIZE = 32
+# Soket TX tamponu doluyken (ENOBUFS) frame başına deneme sayısı ve bekleme (saniye)
+DEFAULT_TX_RETRIES = 3
+TX_RETRY_DELAY = 0.001
+# TX gecikme histogramı kovaları (64 ns .. ~0.5 s; kuyrukta bekleme dahil)
+TX_LATENCY_BUCKETS = 24
+
+
+class AsyncCANReader(can.Listener):
+    """
+    CAN bus'tan event loop'u bloklamadan frame okuyan sınırlı kuyruklu okuyucu
+    
+    Notifier loop ile kurulduğunda SocketCAN gibi fileno() destekleyen bus'larda
+    `loop.add_reader` kullanılır (ek thread yok); diğer bus'larda okuma thread'i
+    frame'leri `call_soon_threadsafe` ile loop'a aktarır. Her iki durumda da
+    `on_message_received` loop thread'inde çalışır, bu yüzden kuyruk güvenle
+    `put_nowait` ile beslenir.
+    
+    Kuyruk dolduğunda varsayılan olarak en eski frame atılır (en güncel durum
+    korunur); `drop_oldest=False` ile yeni gelen frame atılır. Atılan frame'ler
+    `get_metrics()` içinde raporlanır.
+    
+    Örnek:
+        reader = AsyncCANReader(bus, name='CP_001')
+        reader.start()
+        while (msg := await reader.recv()) is not None:
+            ...
+    """
+    
+    def __init__(self, bus: can.BusABC, maxsize: int = DEFAULT_QUEUE_SIZE, name: str = 'can',
+                 drop_oldest: bool = True):
+        """
+        Args:
+            bus: Okunacak CAN bus
+            maxsize: Kuyruk kapasitesi (frame)
+            name: Log ve metriklerde kullanılacak okuyucu adı
+            drop_oldest: Kuyruk doluyken en eski frame mi (True) yoksa yeni frame mi (False) atılsın?
+        """
+        self.bus = bus
+        self.name = name
+        self.maxsize = maxsize
+        self.drop_oldest = drop_oldest
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._notifier: Optional[can.Notifier] = None
+        self._stopped = False
+        self._overflowing = False
+        
+        # Backpressure metrikleri
+        self.received = 0
+        self.dropped = 0
+        self.errors = 0
+        self.high_watermark = 0
+        
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Notifier'ı başlat (çalışan event loop içinden çağrılmalı)"""
+        loop = loop or asyncio.get_running_loop()
+        self._notifier = can.Notifier(self.bus, [self], loop=loop)
+        logger.debug(f"[{self.name}] Async CAN okuyucu başlatıldı (kuyruk: {self.maxsize})")
+        
+    def on_message_received(self, msg: can.Message):
+        """Notifier callback'i - frame'i kuyruğa koy (loop thread'inde çalışır)"""
+        if self._stopped:
+            return
+        self.received += 1
+        queue = self._queue
+        
+        if queue.full():
+            self.dropped += 1
+            if not self._overflowing:
+                self._overflowing = True
+                logger.warning(f"[{self.name}] CAN okuma kuyruğu dolu ({self.maxsize}), frame'ler atılıyor")
+            if not self.drop_oldest:
+                return
+            queue.get_nowait()
+        elif self._overflowing and queue.qsize() < self.maxsize // 2:
+            self._overflowing = False
+            logger.info(f"[{self.name}] CAN okuma kuyruğu normale döndü (toplam atılan: {self.dropped})")
+            
+        queue.put_nowait(msg)
+        depth = queue.qsize()
+        if depth > self.high_watermark:
+            self.high_watermark = depth
+            
+    def on_error(self, exc: Exception):
+        """Bus okuma hatası (Notifier tarafından loop thread'inde çağrılır)"""
+        self.errors += 1
+        if not self._stopped:
+            logger.error(f"[{self.name}] CAN hata: {exc}")
+            
+    async def recv(self) -> Optional[can.Message]:
+        """Sıradaki frame'i bekle; okuyucu durdurulduysa None döner"""
+        if self._stopped and self._queue.empty():
+            return None
+        return await self._queue.get()
+        
+    def recv_nowait(self) -> Optional[can.Message]:
+        """Kuyrukta bekleyen frame varsa döndür, yoksa None"""
+        try:
+            return self._queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+            
+    def get_metrics(self) -> Dict[str, Any]:
+        """Backpressure metrikleri"""
+        return {
+            'received': self.received,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'queue_depth': self._queue.qsize(),
+            'high_watermark': self.high_watermark,
+            'maxsize': self.maxsize,
+        }
+        
+    def stop(self):
+        """Notifier'ı durdur ve bekleyen recv() çağrılarını None ile uyandır"""
+        if self._stopped:
+            return
+        self._stopped = True
+        if self._notifier:
+            self._notifier.stop()  # Listener.stop() tekrar çağrılır, _stopped ile korunur
+            
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+        logger.debug(f"[{self.name}] Async CAN okuyucu durduruldu: {self.get_metrics()}")
+
+
+class AsyncCANWriter:
+    """
+    Tek TX görevli, sınırlı kuyruklu CAN yazıcı
+    
+    `send_nowait` frame'i kuyruğa koyar ve hemen döner (OCPP handler'ları gibi
+    senkron kod içinden çağrılabilir). TX görevi uyanınca kuyrukta bekleyen en
+    fazla `batch_size` frame'i aralarında loop'a dönmeden `bus.send(timeout=0)`
+    ile yazar; soket TX tamponu doluysa kısa bekleyip tekrar dener. Frame'ler
+    kuyruğa giriş sırasıyla gönderilir.
+    
+    Kuyruk doluysa frame kuyruğa alınmaz ve `send_nowait` False döner; çağıran
+    bunu komut yanıtına yansıtabilir (sessizce sınırsız görev oluşmaz).
+    
+    Örnek:
+        writer = AsyncCANWriter(bus, name='CP_001')
+        writer.start()
+        if not writer.send_nowait(can.Message(arbitration_id=0x200, data=payload, is_extended_id=False)):
+            ...  # Rejected
+    """
+    
+    def __init__(self, bus: can.BusABC, maxsize: int = DEFAULT_TX_QUEUE_SIZE,
+                 batch_size: int = DEFAULT_TX_BATCH_SIZE, name: str = 'can', retries: int = DEFAULT_TX_RETRIES):
+        """
+        Args:
+            bus: Yazılacak CAN bus (send() sunan herhangi bir nesne, ör. HubSubscriber)
+            maxsize: Kuyruk kapasitesi (frame)
+            batch_size: Uyanış başına en fazla frame
+            name: Log ve metriklerde kullanılacak yazıcı adı
+            retries: Soket TX tamponu doluyken frame başına deneme sayısı
+        """
+        self.bus = bus
+        self.name = name
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.retries = retries
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._task: Optional[asyncio.Task] = None
+        self._stopped = False
+        self._overflowing = False
+        
+        # Metrikler: latency = kuyruğa girişten yazılana kadar, send = bus.send süresi
+        self.latency = LatencyHistogram(TX_LATENCY_BUCKETS)
+        self.send_latency = LatencyHistogram(TX_LATENCY_BUCKETS)
+        self.sent = 0
+        self.rejected = 0
+        self.retried = 0
+        self.errors = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.high_watermark = 0
+        
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """TX görevini başlat (çalışan event loop içinden çağrılmalı)"""
+        loop = loop or asyncio.get_running_loop()
+        self._task = loop.create_task(self._run())
+        logger.debug(f"[{self.name}] Async CAN yazıcı başlatıldı (kuyruk: {self.maxsize}, batch: {self.batch_size})")
+        
+    def send_nowait(self, msg: can.Message) -> bool:
+        """
+        Frame'i TX kuyruğuna koy (beklemez)
+        
+        Returns:
+            Kuyruğa alındıysa True; kuyruk dolu veya yazıcı durdurulmuşsa False
+        """
+        queue = self._queue
+        if self._stopped or queue.full():
+            self.rejected += 1
+            if not self._stopped and not self._overflowing:
+                self._overflowing = True
+                logger.warning(f"[{self.name}] CAN TX kuyruğu dolu ({self.maxsize}), frame'ler reddediliyor")
+            return False
+        if self._overflowing and queue.qsize() < self.maxsize // 2:
+            self._overflowing = False
+            logger.info(f"[{self.name}] CAN TX kuyruğu normale döndü (toplam reddedilen: {self.rejected})")
+        queue.put_nowait((time.monotonic_ns(), msg))
+        depth = queue.qsize()
+        if depth > self.high_watermark:
+            self.high_watermark = depth
+        return True
+        
+    async def _run(self):
+        """TX görevi: kuyruktaki frame'leri batch halinde yaz"""
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            self.batches += 1
+            if len(batch) > self.largest_batch:
+                self.largest_batch = len(batch)
+            for enqueued_ns, msg in batch:
+                await self._send(msg, enqueued_ns)
+                
+    async def _send(self, msg: can.Message, enqueued_ns: int):
+        """Tek frame'i yaz; soket tamponu doluysa kısa beklemeyle tekrar dene"""
+        for attempt in range(self.retries):
+            started = time.monotonic_ns()
+            try:
+                self.bus.send(msg, timeout=0)
+            except can.CanError as e:
+                if attempt + 1 < self.retries:
+                    self.retried += 1
+                    await asyncio.sleep(TX_RETRY_DELAY * (attempt + 1))
+                    continue
+                self.errors += 1
+                logger.error(f"[{self.name}] CAN gönderme hatası (ID=0x{msg.arbitration_id:x}): {e}")
+                return
+            now = time.monotonic_ns()
+            self.send_latency.record(now - started)
+            self.latency.record(now - enqueued_ns)
+            self.sent += 1
+            return
+            
+    def get_metrics(self) -> Dict[str, Any]:
+        """TX metrikleri"""
+        return {
+            'sent': self.sent,
+            'rejected': self.rejected,
+            'retried': self.retried,
+            'errors': self.errors,
+            'batches': self.batches,
+            'largest_batch': self.largest_batch,
+            'queue_depth': self._queue.qsize(),
+            'high_watermark': self.high_watermark,
+            'maxsize': self.maxsize,
+            'latency': self.latency.to_dict(),
+            'send_latency': self.send_latency.to_dict(),
+        }
+        
+    def stop(self):
+        """TX görevini durdur (kuyrukta kalan frame'ler gönderilmez)"""
+        if self._stopped:
+            return
+        self._stopped = True
+        if self._task is not None:
+            self._task.cancel()
+        if not self._queue.empty():
+            logger.warning(f"[{self.name}] Kapatılırken gönderilmemiş {self._queue.qsize()} CAN frame'i atıldı")
+        logger.debug(f"[{self.name}] Async CAN yazıcı durduruldu: {self.get_metrics()}")
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+Mikro-Benchmark'lar
+Sıcak yoldaki (hot path) bileşenlerin frame/s cinsinden ölçümü.
+"""
+
+import asyncio
+import logging
+import statistics
+import struct
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict
+
+import can
+import numpy as np
+
+from can_analytics import decode_frames
+from can_firewall import CANFirewall
+from can_gateway import CANGateway
+from can_whitelist import CANWhitelist
+from defense_mechanisms import CANIDS
+from hotpath_logging import FrameTracer
+from payload_profiler import PAYLOAD_SCORE_SAMPLE, PayloadProfiler
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Karşılaştırma için eski (if-zinciri + format string) encode/decode implementasyonu
+def _legacy_encode(action: str, payload: Dict[str, Any]) -> bytes:
+    if action == 'RemoteStartTransaction':
+        cp_id = payload.get('cp_id', 1) & 0xFF
+        connector_id = payload.get('connector_id', 1) & 0xFF
+        transaction_id = payload.get('transaction_id', 0) & 0xFFFFFFFF
+        return struct.pack('<BBBI', cp_id, connector_id, 0x01, transaction_id) + b'\x00'
+    elif action == 'RemoteStopTransaction':
+        return struct.pack('<IB', payload.get('transaction_id', 0), 0x00) + b'\x00' * 3
+    elif action == 'SetChargingProfile':
+        profile_id = payload.get('profile_id', 1) & 0xFFFF
+        max_current = int(payload.get('max_current', 16) * 10) & 0xFFFF
+        return struct.pack('<HH', profile_id, max_current) + b'\x00' * 4
+    elif action == 'MeterValues':
+        connector_id = payload.get('connector_id', 1) & 0xFF
+        energy = int(payload.get('energy', 0)) & 0xFFFFFFFF
+        timestamp = payload.get('timestamp', 0) & 0xFFFF
+        return struct.pack('<BIBH', connector_id, energy, 0x00, timestamp)
+    elif action == 'StatusNotification':
+        connector_id = payload.get('connector_id', 1) & 0xFF
+        status_map = {'Available': 0x01, 'Preparing': 0x02, 'Charging': 0x03,
+                      'SuspendedEVSE': 0x04, 'SuspendedEV': 0x05, 'Finishing': 0x06,
+                      'Reserved': 0x07, 'Unavailable': 0x08, 'Faulted': 0x09}
+        status = status_map.get(payload.get('status', 'Available'), 0x00) & 0xFF
+        return struct.pack('BB', connector_id, status) + b'\x00' * 6
+    return b'\x00' * 8
+
+
+def _legacy_decode(can_id: int, payload: bytes) -> Dict[str, Any]:
+    action = None
+    for act, cid in CANGateway.CAN_IDS.items():
+        if cid == can_id:
+            action = act
+            break
+    if action == 'MeterValues':
+        if len(payload) >= 8:
+            connector_id, energy, _, timestamp = struct.unpack('<BIBH', payload[:8])
+            return {'connector_id': connector_id, 'energy': energy, 'timestamp': timestamp}
+    elif action == 'StatusNotification':
+        if len(payload) >= 2:
+            connector_id, status_byte = struct.unpack('BB', payload[:2])
+            status_map = {0x01: 'Available', 0x02: 'Preparing', 0x03: 'Charging',
+                          0x04: 'SuspendedEVSE', 0x05: 'SuspendedEV', 0x06: 'Finishing',
+                          0x07: 'Reserved', 0x08: 'Unavailable', 0x09: 'Faulted'}
+            return {'connector_id': connector_id, 'status': status_map.get(status_byte, 'Unknown')}
+    return {}
+
+
+# 1 Mbit/s bus'ta 8 byte'lık standart frame: 108 bit (bit stuffing'siz) + 3 bit IFS
+BUS_1MBIT_FRAMES_PER_SECOND = 1_000_000 // 111
+
+
+class _LegacyIDS:
+    """Karşılaştırma için eski CANIDS frame başına analizi (sum() + statistics + list.pop(0))"""
+    
+    def __init__(self, normal_ids):
+        self.normal_ids = normal_ids
+        self.id_frequency = defaultdict(int)
+        self.id_timestamps = defaultdict(list)
+        self.id_intervals = defaultdict(list)
+        self.alarms = 0
+        
+    async def analyze(self, msg: can.Message):
+        can_id = msg.arbitration_id
+        timestamp = datetime.now()
+        self.id_frequency[can_id] += 1
+        if can_id in self.id_timestamps:
+            interval = (timestamp - self.id_timestamps[can_id][-1]).total_seconds()
+            self.id_intervals[can_id].append(interval)
+            if len(self.id_intervals[can_id]) > 50:
+                self.id_intervals[can_id].pop(0)
+        self.id_timestamps[can_id].append(timestamp)
+        if len(self.id_timestamps[can_id]) > 100:
+            self.id_timestamps[can_id].pop(0)
+            
+        if can_id not in self.normal_ids:
+            self.alarms += 1
+        if self.id_frequency[can_id] / sum(self.id_frequency.values()) > 0.5:
+            self.alarms += 1
+        if can_id in self.id_intervals and len(self.id_intervals[can_id]) > 10:
+            intervals = self.id_intervals[can_id]
+            mean_interval = statistics.mean(intervals)
+            std_interval = statistics.stdev(intervals)
+            if mean_interval > 0 and std_interval > 0 and abs(intervals[-1] - mean_interval) > 3 * std_interval:
+                self.alarms += 1
+
+
+def _measure(fn: Callable[[], None], frames_per_call: int, repeat: int = 5) -> float:
+    """Fonksiyonu tekrar tekrar çalıştır, en iyi denemenin frame/s değerini döndür"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return frames_per_call / best if best > 0 else 0.0
+
+
+def _report(name: str, before: float, after: float):
+    logger.info(f"  {name:<28} önce: {before:>12,.0f} frame/s   sonra: {after:>12,.0f} frame/s   "
+                f"(x{after / before if before else 0:.2f})")
+
+
+def benchmark_gateway_codecs(n: int = 100_000):
+    """CANGateway encode/decode: if-zinciri vs önceden derlenmiş codec tablosu"""
+    logger.info("\n=== CANGateway codec benchmark ===")
+    logger.info(f"Frame sayısı: {n}")
+    
+    meter = {'connector_id': 1, 'energy': 12345, 'timestamp': 42}
+    status = {'connector_id': 1, 'status': 'Charging'}
+    meter_frame = _legacy_encode('MeterValues', meter)
+    status_frame = _legacy_encode('StatusNotification', status)
+    
+    codecs = CANGateway.CODECS_BY_ACTION
+    meter_codec = codecs['MeterValues']
+    status_codec = codecs['StatusNotification']
+    by_id = CANGateway.CODECS_BY_ID
+    assert meter_codec.encode(meter) == meter_frame
+    assert status_codec.encode(status) == status_frame
+    
+    def legacy_encode():
+        for _ in range(n // 2):
+            _legacy_encode('MeterValues', meter)
+            _legacy_encode('StatusNotification', status)
+            
+    def codec_encode():
+        for _ in range(n // 2):
+            codecs['MeterValues'].encode(meter)
+            codecs['StatusNotification'].encode(status)
+            
+    def legacy_decode():
+        for _ in range(n // 2):
+            _legacy_decode(0x300, meter_frame)
+            _legacy_decode(0x301, status_frame)
+            
+    def codec_decode():
+        for _ in range(n // 2):
+            by_id[0x300].decode(meter_frame)
+            by_id[0x301].decode(status_frame)
+            
+    _report("encode (MeterValues+Status)", _measure(legacy_encode, n), _measure(codec_encode, n))
+    _report("decode (0x300+0x301)", _measure(legacy_decode, n), _measure(codec_decode, n))
+
+
+def benchmark_gateway_batch(n: int = 100_000):
+    """CANGateway: mesaj başına ocpp_to_can/can_to_ocpp vs batch API"""
+    logger.info("\n=== CANGateway batch benchmark ===")
+    logger.info(f"Frame sayısı: {n}")
+    
+    gateway = CANGateway(whitelist_enabled=True)
+    messages = [('MeterValues', {'connector_id': 1, 'energy': i, 'timestamp': i & 0xFFFF}) for i in range(n)]
+    frames = gateway.ocpp_to_can_many(messages)
+    
+    # Per-frame INFO logları ölçümü domine etmesin
+    gateway_logger = logging.getLogger('can_gateway')
+    previous_level = gateway_logger.level
+    gateway_logger.setLevel(logging.WARNING)
+    try:
+        # Her iki taraf da sonuçları tutar (batch'in döndürdüğü liste gibi)
+        def single_encode():
+            return [gateway.ocpp_to_can(action, payload) for action, payload in messages]
+                
+        def batch_encode():
+            gateway.ocpp_to_can_many(messages)
+            
+        def single_decode():
+            return [gateway.can_to_ocpp(can_id, payload) for can_id, payload in frames]
+                
+        def batch_decode():
+            gateway.can_to_ocpp_many(frames)
+            
+        _report("ocpp_to_can → _many", _measure(single_encode, n), _measure(batch_encode, n))
+        _report("can_to_ocpp → _many", _measure(single_decode, n), _measure(batch_decode, n))
+    finally:
+        gateway_logger.setLevel(previous_level)
+
+
+def benchmark_whitelist(n: int = 100_000):
+    """Whitelist: frame başına set kontrolü vs tablo ile batch kontrol"""
+    logger.info("\n=== Whitelist benchmark ===")
+    logger.info(f"Frame sayısı: {n}")
+    
+    allowed = {0x200, 0x201, 0x210, 0x300, 0x301, 0x100}
+    whitelist = CANWhitelist(allowed, extended_ranges=[(0x18FF0000, 0x18FFFFFF)])
+    can_ids = [(0x200, 0x9FF, 0x301, 0x123)[i % 4] for i in range(n)]
+    id_array = np.array(can_ids, dtype=np.uint32)  # Ring buffer / FrameHistory'deki gibi hazır dizi
+    messages = [can.Message(arbitration_id=can_id, data=b'', is_extended_id=False) for can_id in can_ids]
+    
+    def per_id():
+        return [can_id in allowed for can_id in can_ids]
+        
+    def batch_ids():
+        return whitelist.check_batch(id_array)
+        
+    def per_message():
+        return [msg for msg in messages if msg.arbitration_id in allowed]
+        
+    def filter_messages():
+        return whitelist.filter_messages(messages)[0]
+        
+    # Gateway/firewall varsayılanı: extended aralık yok
+    default_whitelist = CANWhitelist(allowed)
+    
+    def filter_messages_default():
+        return default_whitelist.filter_messages(messages)[0]
+        
+    assert len(per_message()) == len(filter_messages()) == len(filter_messages_default()) == int(batch_ids().sum())
+    _report("set → check_batch (ID dizisi)", _measure(per_id, n), _measure(batch_ids, n))
+    _report("set → filter_messages", _measure(per_message, n), _measure(filter_messages_default, n))
+    _report("set → filter_messages (ext. aralık)", _measure(per_message, n), _measure(filter_messages, n))
+
+
+class _NullBus(can.BusABC):
+    """Gönderilen frame'leri atan bus (firewall iletim maliyetini soket olmadan ölçmek için)"""
+    
+    def __init__(self):
+        super().__init__(channel='null')
+        
+    def send(self, msg, timeout=None):
+        pass
+        
+    def _recv_internal(self, timeout):
+        return None, False
+
+
+def benchmark_firewall(n: int = 100_000):
+    """CAN firewall: frame başına iletim vs batch iletim (whitelist + token bucket + send)"""
+    logger.info("\n=== CAN firewall benchmark ===")
+    logger.info(f"Frame sayısı: {n}")
+    
+    firewall = CANFirewall(whitelist=CANWhitelist({0x200, 0x201, 0x300}), rate_limits={0x201: (1e9, 1e9)},
+                           buses=(_NullBus(), _NullBus()))
+    direction = firewall.directions[0]
+    messages = [can.Message(arbitration_id=(0x200, 0x201, 0x300)[i % 3], data=b'\x00' * 8,
+                            is_extended_id=False, timestamp=time.time()) for i in range(n)]
+    batches = [messages[i:i + firewall.batch_size] for i in range(0, n, firewall.batch_size)]
+    
+    def per_frame():
+        for msg in messages:
+            firewall._forward(direction, (msg,))
+            
+    def batched():
+        for batch in batches:
+            firewall._forward(direction, batch)
+            
+    try:
+        before = _measure(per_frame, n)
+        after = _measure(batched, n)
+    finally:
+        for bus_direction in firewall.directions:
+            bus_direction.source.shutdown()
+    assert direction.stats['blocked_whitelist'] == direction.stats['blocked_rate'] == 0
+    _report(f"_forward (1 → {firewall.batch_size} frame)", before, after)
+    logger.info(f"  Frame başına işlem: {1e6 / after:.2f} µs; 1 Mbit/s bus yükünde "
+                f"(~{BUS_1MBIT_FRAMES_PER_SECOND:,} frame/s) CPU payı: %{100 * BUS_1MBIT_FRAMES_PER_SECOND / after:.1f}")
+
+
+def benchmark_vectorized_decode(n: int = 100_000):
+    """Kayıtlı 0x300/0x301 frame'leri: can_to_ocpp döngüsü vs NumPy vektörize decode"""
+    logger.info("\n=== Vektörize decode benchmark ===")
+    logger.info(f"Frame sayısı: {n}")
+    
+    rng = np.random.default_rng(0)
+    can_ids = rng.choice(np.array([0x300, 0x301], dtype=np.uint32), size=n, p=[0.9, 0.1])
+    data = rng.integers(0, 256, size=(n, 8), dtype=np.uint8)
+    frames = [(int(can_id), bytes(row)) for can_id, row in zip(can_ids, data)]
+    
+    gateway = CANGateway()
+    
+    def per_frame():
+        return [gateway.can_to_ocpp(can_id, payload) for can_id, payload in frames]
+    
+    def vectorized():
+        return decode_frames(data, can_ids)
+    
+    columns = vectorized()['MeterValues']
+    first = int(columns['index'][0])
+    assert gateway.can_to_ocpp(*frames[first])['energy'] == int(columns['energy'][0])
+    
+    _report("can_to_ocpp → decode_frames", _measure(per_frame, n), _measure(vectorized, n))
+
+
+def benchmark_hot_path_logging(n: int = 100_000):
+    """Frame başına log: eager f-string logger.info vs FrameTracer (lazy + guard + rate limit)"""
+    logger.info("\n=== Hot path logging benchmark ===")
+    logger.info(f"Frame sayısı: {n}")
+    
+    bench_logger = logging.getLogger('benchmark.hotpath')
+    bench_logger.propagate = False
+    bench_logger.addHandler(logging.NullHandler())
+    tracer = FrameTracer(bench_logger, "CAN mesajı alındı: ID=0x%x, Data=%s",
+                         level=logging.INFO, sample_every=1, max_per_second=20)
+    can_id, payload = 0x300, bytes(range(8))
+    
+    def eager():
+        for _ in range(n):
+            bench_logger.info(f"CAN mesajı alındı: ID={hex(can_id)}, Data={payload.hex()}")
+            
+    def traced():
+        for _ in range(n):
+            tracer(can_id, payload)
+            
+    try:
+        bench_logger.setLevel(logging.WARNING)
+        _report("INFO kapalı", _measure(eager, n), _measure(traced, n))
+        bench_logger.setLevel(logging.INFO)
+        _report("INFO açık (20 satır/s)", _measure(eager, n), _measure(traced, n))
+    finally:
+        bench_logger.setLevel(logging.NOTSET)
+
+
+def benchmark_ids_throughput(n: int = 100_000, id_count: int = 64):
+    """CANIDS frame başına analiz: eski O(ID + pencere) vs O(1) kayan pencere istatistikleri"""
+    logger.info("\n=== CAN-IDS throughput benchmark ===")
+    logger.info(f"Frame sayısı: {n}, farklı CAN ID: {id_count}")
+    
+    can_ids = [0x100 + i for i in range(id_count)]
+    frames = [can.Message(arbitration_id=can_ids[i % id_count], data=bytes(8), is_extended_id=False)
+              for i in range(n)]
+    ids = CANIDS()
+    ids.normal_ids.update(can_ids)  # Dedektör aynı kümeyi referansla tutar
+    legacy = _LegacyIDS(set(can_ids))
+    
+    async def run(analyze):
+        for msg in frames:
+            await analyze(msg)
+            
+    # Jitter kaynaklı aralık alarmları ölçümü domine etmesin
+    logging.disable(logging.WARNING)
+    try:
+        before = _measure(lambda: asyncio.run(run(legacy.analyze)), n, repeat=3)
+        after = _measure(lambda: asyncio.run(run(ids._analyze_message)), n, repeat=3)
+    finally:
+        logging.disable(logging.NOTSET)
+        
+    _report("_analyze_message", before, after)
+    logger.info(f"  1 Mbit/s bus yükü: ~{BUS_1MBIT_FRAMES_PER_SECOND:,} frame/s → "
+                f"önce x{before / BUS_1MBIT_FRAMES_PER_SECOND:.2f}, sonra x{after / BUS_1MBIT_FRAMES_PER_SECOND:.2f} kapasite")
+
+
+def benchmark_payload_profiler(n: int = 100_000, id_count: int = 64):
+    """Payload profili: eğitim/skorlama hızı ve CANIDS'e inline maliyeti"""
+    logger.info("\n=== Payload profiler benchmark ===")
+    logger.info(f"Frame sayısı: {n}, farklı CAN ID: {id_count}")
+    
+    can_ids = [0x100 + i for i in range(id_count)]
+    payloads = [struct.pack('<BBHI', i & 0xFF, 0x10, i % 50, 0) for i in range(n)]
+    pairs = [(can_ids[i % id_count], payloads[i]) for i in range(n)]
+    
+    profiler = PayloadProfiler(sample_every=1)
+    train_rate = _measure(lambda: [profiler.train(can_id, data) for can_id, data in pairs], n, repeat=1)
+    profiler.finish_training()
+    score_rate = _measure(lambda: [profiler.score(can_id, data) for can_id, data in pairs], n, repeat=3)
+    logger.info(f"  {'train':<28} {train_rate:>12,.0f} frame/s")
+    logger.info(f"  {'score (her frame)':<28} {score_rate:>12,.0f} frame/s   (anomali: {profiler.anomalies})")
+    profiler.sample_every = PAYLOAD_SCORE_SAMPLE
+    sampled_rate = _measure(lambda: [profiler.score(can_id, data) for can_id, data in pairs], n, repeat=3)
+    logger.info(f"  {f'score (1/{PAYLOAD_SCORE_SAMPLE} örnek)':<28} {sampled_rate:>12,.0f} frame/s")
+    
+    frames = [can.Message(arbitration_id=can_id, data=data, is_extended_id=False) for can_id, data in pairs]
+    without = CANIDS(payload_training_frames=0)
+    with_profile = CANIDS(payload_training_frames=n // 10)
+    for ids in (without, with_profile):
+        ids.normal_ids.update(can_ids)
+        
+    async def run(analyze):
+        for msg in frames:
+            await analyze(msg)
+            
+    logging.disable(logging.WARNING)
+    try:
+        before = _measure(lambda: asyncio.run(run(without._analyze_message)), n, repeat=3)
+        after = _measure(lambda: asyncio.run(run(with_profile._analyze_message)), n, repeat=3)
+    finally:
+        logging.disable(logging.NOTSET)
+        
+    _report("_analyze_message (+payload)", before, after)
+    logger.info(f"  1 Mbit/s bus yükü: ~{BUS_1MBIT_FRAMES_PER_SECOND:,} frame/s → "
+                f"payload profili ile x{after / BUS_1MBIT_FRAMES_PER_SECOND:.2f} kapasite")
+
+
+def main():
+    """Ana fonksiyon"""
+    import sys
+    
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    command = sys.argv[1] if len(sys.argv) > 1 else '--all'
+    
+    benchmarks = {
+        '--gateway': [benchmark_gateway_codecs, benchmark_gateway_batch, benchmark_whitelist,
+                      benchmark_firewall],
+        '--analytics': [benchmark_vectorized_decode],
+        '--logging': [benchmark_hot_path_logging],
+        '--ids': [benchmark_ids_throughput, benchmark_payload_profiler],
+    }
+    
+    if command == '--all':
+        for group in benchmarks.values():
+            for benchmark in group:
+                benchmark(n)
+    elif command in benchmarks:
+        for benchmark in benchmarks[command]:
+            benchmark(n)
+    else:
+        logger.info("Kullanım:")
+        logger.info("  python benchmark.py --gateway [N]   # CANGateway codec ve batch benchmark'ları")
+        logger.info("  python benchmark.py --analytics [N] # NumPy vektörize decode benchmark")
+        logger.info("  python benchmark.py --logging [N]   # Hot path logging benchmark")
+        logger.info("  python benchmark.py --ids [N]       # CAN-IDS frame/s kapasitesi (1 Mbit/s bus'a göre)")
+        logger.info("  python benchmark.py --all [N]       # Tüm benchmark'lar")
+
+
+if __name__ == "__main__":
+    main()
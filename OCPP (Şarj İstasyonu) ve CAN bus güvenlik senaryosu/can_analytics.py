@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Offline CAN Frame Analizi
+Kaydedilmiş 0x300/0x301 frame dizilerini NumPy ile vektörize olarak çözer.
+"""
+
+import logging
+from typing import Dict
+
+import numpy as np
+
+from can_gateway import CAN_IDS, CODECS_BY_ACTION, FRAME_SIZE, STATUS_NAMES
+
+logger = logging.getLogger(__name__)
+
+METER_VALUES_ID = CAN_IDS['MeterValues']
+STATUS_NOTIFICATION_ID = CAN_IDS['StatusNotification']
+
+# '<BIBH' düzeninin birebir karşılığı: [connector_id, energy (Wh), reserved, timestamp]
+METER_VALUES_DTYPE = np.dtype([
+    ('connector_id', 'u1'),
+    ('energy', '<u4'),
+    ('reserved', 'u1'),
+    ('timestamp', '<u2'),
+])
+
+# 'BB' düzeni + 6 byte dolgu: [connector_id, status]
+STATUS_NOTIFICATION_DTYPE = np.dtype([
+    ('connector_id', 'u1'),
+    ('status', 'u1'),
+    ('padding', 'V6'),
+])
+
+assert METER_VALUES_DTYPE.itemsize == CODECS_BY_ACTION['MeterValues'].struct.size == FRAME_SIZE
+assert STATUS_NOTIFICATION_DTYPE.itemsize == CODECS_BY_ACTION['StatusNotification'].struct.size == FRAME_SIZE
+
+# Status kodu → OCPP durum adı (bilinmeyen kodlar 'Unknown')
+STATUS_NAME_TABLE = np.array(['Unknown'] * 256, dtype=object)
+for _code, _name in STATUS_NAMES.items():
+    STATUS_NAME_TABLE[_code] = _name
+
+
+def _validate(data: np.ndarray, can_ids: np.ndarray):
+    """Girdi dizilerinin şeklini ve tipini kontrol et"""
+    if data.dtype != np.uint8 or data.ndim != 2 or data.shape[1] != FRAME_SIZE:
+        raise ValueError(f"data (N, {FRAME_SIZE}) uint8 olmalı, gelen: {data.shape} {data.dtype}")
+    if can_ids.ndim != 1 or can_ids.shape[0] != data.shape[0]:
+        raise ValueError(f"can_ids (N,) olmalı, gelen: {can_ids.shape} (N={data.shape[0]})")
+
+
+def _records(data: np.ndarray, can_ids: np.ndarray, can_id: int, dtype: np.dtype):
+    """Verilen CAN ID'ye ait satırları seç ve structured dtype olarak yorumla"""
+    index = np.flatnonzero(can_ids == can_id)
+    if index.size == data.shape[0]:
+        rows = np.ascontiguousarray(data)  # Tamamı aynı ID: blok zaten contiguous ise kopya yok
+    else:
+        rows = data[index]  # Fancy indexing zaten C-contiguous kopya üretir
+    return index, rows.view(dtype).reshape(-1)
+
+
+def decode_meter_values(data: np.ndarray, can_ids: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    0x300 (MeterValues) frame'lerini kolon dizilerine çöz
+    
+    Args:
+        data: (N, 8) uint8 payload bloğu
+        can_ids: (N,) arbitration ID dizisi
+        
+    Returns:
+        'index' (girdideki satır no), 'connector_id', 'energy', 'timestamp' dizileri
+    """
+    _validate(data, can_ids)
+    index, records = _records(data, can_ids, METER_VALUES_ID, METER_VALUES_DTYPE)
+    return {
+        'index': index,
+        'connector_id': records['connector_id'],
+        'energy': records['energy'],
+        'timestamp': records['timestamp'],
+    }
+
+
+def decode_status_notifications(data: np.ndarray, can_ids: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    0x301 (StatusNotification) frame'lerini kolon dizilerine çöz
+    
+    Args:
+        data: (N, 8) uint8 payload bloğu
+        can_ids: (N,) arbitration ID dizisi
+        
+    Returns:
+        'index' (girdideki satır no), 'connector_id', 'status_code' dizileri
+    """
+    _validate(data, can_ids)
+    index, records = _records(data, can_ids, STATUS_NOTIFICATION_ID, STATUS_NOTIFICATION_DTYPE)
+    return {
+        'index': index,
+        'connector_id': records['connector_id'],
+        'status_code': records['status'],
+    }
+
+
+def decode_frames(data: np.ndarray, can_ids: np.ndarray) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Kaydedilmiş frame bloğundaki tüm MeterValues ve StatusNotification frame'lerini çöz
+    
+    Args:
+        data: (N, 8) uint8 payload bloğu
+        can_ids: (N,) arbitration ID dizisi
+        
+    Returns:
+        {'MeterValues': {...}, 'StatusNotification': {...}} kolon dizileri
+    """
+    result = {
+        'MeterValues': decode_meter_values(data, can_ids),
+        'StatusNotification': decode_status_notifications(data, can_ids),
+    }
+    logger.debug(f"Vektörize decode: {data.shape[0]} frame, "
+                 f"{result['MeterValues']['index'].size} MeterValues, "
+                 f"{result['StatusNotification']['index'].size} StatusNotification")
+    return result
+
+
+def status_names(status_codes: np.ndarray) -> np.ndarray:
+    """Status kodu dizisini OCPP durum adlarına çevir (ör. 3 → 'Charging')"""
+    return STATUS_NAME_TABLE[status_codes]
@@ -6,13 +6,18 @@ CP'den gelen CAN mesajlarını dinler ve charger modülü davranışını simül
 
 import asyncio
 import logging
-import struct
 import can
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Any, Dict, Optional
+from can_constants import MALICIOUS_CAN_ID, can_filters_for
+from can_gateway import CODECS_BY_ACTION
+from async_can import AsyncCANReader
+from can_hub import CANHub
+from hotpath_logging import FrameTracer, ASYNC_LOGGING_ENABLED, setup_async_logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
+_trace_rx = FrameTracer(logger, "CAN mesajı alındı: ID=0x%x, Data=%s")
 
 
 class ChargerModule:
@@ -65,23 +70,58 @@ class ChargerModule:
 class CANBusSimulator:
     """CAN bus simülatörü - charger modüllerini yönetir"""
     
-    def __init__(self, can_bus: str = 'vcan0'):
+    def __init__(self, can_bus: str = 'vcan0', hub: Optional[CANHub] = None, dbc: Optional[str] = None):
+        """
+        Args:
+            can_bus: CAN bus adı
+            hub: Paylaşılan CAN hub
+            dbc: Frame düzenleri için DBC dosyası (None ise yerleşik düzenler; CP ile aynı olmalı)
+        """
         self.can_bus_name = can_bus
         self.can_bus = None
+        self.hub = hub  # Verilirse kendi soketi yerine paylaşılan hub kullanılır
+        self.can_reader: Optional[AsyncCANReader] = None
         self.chargers: Dict[int, ChargerModule] = {}
         self.running = False
         
+        # Codec'ler CP ile aynı kaynaktan: DBC verilirse ondan, DBC'de olmayan action'lar yerleşik düzende
+        codecs: Dict[str, Any] = dict(CODECS_BY_ACTION)
+        if dbc:
+            from dbc_mapping import load_codecs
+            
+            codecs.update((codec.action, codec) for codec in load_codecs(dbc))
+        # CAN ID → (codec, handler) tablosu bir kez kurulur; handler'lar çözülmüş alanları alır
+        self._handlers = {
+            codecs[action].can_id: (codecs[action].decode, handler)
+            for action, handler in (('RemoteStartTransaction', self._handle_start_transaction),
+                                    ('RemoteStopTransaction', self._handle_stop_transaction),
+                                    ('SetChargingProfile', self._handle_set_charging_profile))
+        }
+        self._meter_codec = codecs['MeterValues']
+        self._status_codec = codecs['StatusNotification']
+        # Charger yalnızca komut frame'lerini ve malicious frame'i tüketir
+        self.consumed_can_ids = (*self._handlers, MALICIOUS_CAN_ID)
+        
     async def start(self):
         """CAN bus simülatörünü başlat"""
         try:
-            self.can_bus = can.interface.Bus(self.can_bus_name, bustype='socketcan')
+            if self.hub:
+                # Hub aboneliği hem okuyucu hem bus (send/shutdown) arayüzünü sunar
+                self.can_reader = self.hub.subscribe('CANBusSimulator', can_ids=self.consumed_can_ids)
+                self.can_bus = self.can_reader
+            else:
+                self.can_bus = can.interface.Bus(self.can_bus_name, bustype='socketcan',
+                                                 can_filters=can_filters_for(self.consumed_can_ids))
             logger.info(f"CAN Bus Simülatörü başlatıldı: {self.can_bus_name}")
             self.running = True
             
             # Varsayılan charger modülü
             self.chargers[1] = ChargerModule(connector_id=1)
             
-            # CAN mesajlarını dinle
+            # CAN mesajlarını dinle (Notifier + sınırlı kuyruk, event loop bloklanmaz)
+            if not self.hub:
+                self.can_reader = AsyncCANReader(self.can_bus, name='CANBusSimulator')
+                self.can_reader.start()
             asyncio.create_task(self._listen_can_messages())
             
             # Periyodik enerji güncellemesi
@@ -100,12 +140,10 @@ class CANBusSimulator:
         
         while self.running:
             try:
-                msg = self.can_bus.recv(timeout=0.1)
-                if msg:
-                    await self._handle_can_message(msg)
-            except can.CanError as e:
-                if self.running:
-                    logger.error(f"CAN hata: {e}")
+                msg = await self.can_reader.recv()
+                if msg is None:
+                    break
+                await self._handle_can_message(msg)
             except Exception as e:
                 if self.running:
                     logger.error(f"CAN dinleme hatası: {e}")
@@ -115,22 +153,18 @@ class CANBusSimulator:
         can_id = msg.arbitration_id
         payload = msg.data
         
-        logger.info(f"CAN mesajı alındı: ID={hex(can_id)}, Data={payload.hex()}")
-        
-        # RemoteStartTransaction (0x200)
-        if can_id == 0x200:
-            await self._handle_start_transaction(payload)
-        
-        # RemoteStopTransaction (0x201)
-        elif can_id == 0x201:
-            await self._handle_stop_transaction(payload)
+        _trace_rx(can_id, payload)
         
-        # SetChargingProfile (0x210)
-        elif can_id == 0x210:
-            await self._handle_set_charging_profile(payload)
+        # RemoteStartTransaction (0x200), RemoteStopTransaction (0x201), SetChargingProfile (0x210)
+        entry = self._handlers.get(can_id)
+        if entry is not None:
+            decode, handler = entry
+            fields = decode(payload)
+            if fields:
+                await handler(fields)
         
         # Malicious frame (0x9FF) - Compromised firmware simülasyonu
-        elif can_id == 0x9FF:
+        elif can_id == MALICIOUS_CAN_ID:
             logger.warning("⚠️ MALICIOUS CAN FRAME TESPİT EDİLDİ (0x9FF)!")
             logger.warning("Charger modülü hatalı davranış moduna geçiyor...")
             for charger in self.chargers.values():
@@ -138,69 +172,66 @@ class CANBusSimulator:
         
         # Diğer mesajlar
         else:
-            logger.debug(f"İşlenmeyen CAN ID: {hex(can_id)}")
+            logger.debug("İşlenmeyen CAN ID: 0x%x", can_id)
     
-    async def _handle_start_transaction(self, payload: bytes):
+    async def _handle_start_transaction(self, fields: Dict[str, Any]):
         """RemoteStartTransaction mesajını işle"""
-        if len(payload) >= 3:
-            cp_id, connector_id, start_cmd = struct.unpack('BBB', payload[:3])
-            
-            if connector_id not in self.chargers:
-                self.chargers[connector_id] = ChargerModule(connector_id=connector_id)
-            
-            charger = self.chargers[connector_id]
-            transaction_id = len(self.chargers) + 1
-            charger.start_charging(transaction_id)
-            
-            # StatusNotification gönder (Charging)
-            await self._send_status_notification(connector_id, 'Charging')
+        # Transaction ID CP'nin ConnectorStore'undan gelir (snapshot restore sonrası da aynı ID'ler)
+        connector_id = fields['connector_id']
+        transaction_id = fields['transaction_id']
+        
+        if connector_id not in self.chargers:
+            self.chargers[connector_id] = ChargerModule(connector_id=connector_id)
             
-            logger.info(f"Transaction başlatıldı: Connector {connector_id}, Transaction {transaction_id}")
+        charger = self.chargers[connector_id]
+        charger.start_charging(transaction_id)
+        
+        # StatusNotification gönder (Charging)
+        await self._send_status_notification(connector_id, 'Charging')
+        
+        logger.info(f"Transaction başlatıldı: Connector {connector_id}, Transaction {transaction_id}")
     
-    async def _handle_stop_transaction(self, payload: bytes):
+    async def _handle_stop_transaction(self, fields: Dict[str, Any]):
         """RemoteStopTransaction mesajını işle"""
-        if len(payload) >= 4:
-            tx_id = struct.unpack('<I', payload[:4])[0]
-            
-            # Transaction ID'ye göre charger bul
-            for charger in self.chargers.values():
-                if charger.transaction_id == tx_id:
-                    charger.stop_charging()
-                    await self._send_status_notification(charger.connector_id, 'Available')
-                    await self._send_meter_values(charger.connector_id, charger.energy_wh)
-                    break
+        tx_id = fields['transaction_id']
+        
+        # Transaction ID'ye göre charger bul
+        for charger in self.chargers.values():
+            if charger.transaction_id == tx_id:
+                charger.stop_charging()
+                await self._send_status_notification(charger.connector_id, 'Available')
+                await self._send_meter_values(charger.connector_id, charger.energy_wh)
+                break
     
-    async def _handle_set_charging_profile(self, payload: bytes):
+    async def _handle_set_charging_profile(self, fields: Dict[str, Any]):
         """SetChargingProfile mesajını işle"""
-        if len(payload) >= 4:
-            profile_id, max_current_raw = struct.unpack('<HH', payload[:4])
-            max_current = max_current_raw / 10.0  # 0.1A resolution
-            
-            # Tüm charger'lara uygula (veya profile_id'ye göre)
-            for charger in self.chargers.values():
-                charger.set_max_current(max_current)
+        profile_id = fields['profile_id']
+        max_current = fields['max_current']  # Codec 0.1A çözünürlüğü fiziksel değere (A) çevirir
+        
+        # Tüm charger'lara uygula (veya profile_id'ye göre)
+        for charger in self.chargers.values():
+            charger.set_max_current(max_current)
             
-            logger.info(f"Charging profile ayarlandı: Profile {profile_id}, Max Current {max_current} A")
+        logger.info(f"Charging profile ayarlandı: Profile {profile_id}, Max Current {max_current} A")
     
     async def _send_meter_values(self, connector_id: int, energy_wh: int):
         """MeterValues mesajını CAN'a gönder (CAN ID 0x300)"""
         timestamp = int(datetime.now().timestamp()) % 0xFFFF
-        payload = struct.pack('<BIBH', connector_id, energy_wh, timestamp)
+        payload = self._meter_codec.encode({
+            'connector_id': connector_id,
+            'energy': energy_wh,
+            'timestamp': timestamp
+        })
         
-        msg = can.Message(arbitration_id=0x300, data=payload, is_extended_id=False)
+        msg = can.Message(arbitration_id=self._meter_codec.can_id, data=payload, is_extended_id=False)
         self.can_bus.send(msg)
         logger.info(f"MeterValues gönderildi: Connector {connector_id}, Energy {energy_wh} Wh")
     
     async def _send_status_notification(self, connector_id: int, status: str):
         """StatusNotification mesajını CAN'a gönder (CAN ID 0x301)"""
-        status_map = {'Available': 0x01, 'Preparing': 0x02, 'Charging': 0x03,
-                     'SuspendedEVSE': 0x04, 'SuspendedEV': 0x05, 'Finishing': 0x06,
-                     'Reserved': 0x07, 'Unavailable': 0x08, 'Faulted': 0x09}
-        status_byte = status_map.get(status, 0x00)
+        payload = self._status_codec.encode({'connector_id': connector_id, 'status': status})
         
-        payload = struct.pack('BB', connector_id, status_byte) + b'\x00' * 6
-        
-        msg = can.Message(arbitration_id=0x301, data=payload, is_extended_id=False)
+        msg = can.Message(arbitration_id=self._status_codec.can_id, data=payload, is_extended_id=False)
         self.can_bus.send(msg)
         logger.info(f"StatusNotification gönderildi: Connector {connector_id}, Status {status}")
     
@@ -217,6 +248,8 @@ class CANBusSimulator:
     def stop(self):
         """CAN bus simülatörünü durdur"""
         self.running = False
+        if self.can_reader:
+            self.can_reader.stop()
         if self.can_bus:
             self.can_bus.shutdown()
         logger.info("CAN Bus Simülatörü durduruldu")
@@ -226,12 +259,16 @@ async def main():
     """Ana fonksiyon"""
     import sys
     
-    can_bus = sys.argv[1] if len(sys.argv) > 1 else 'vcan0'
+    # Kullanım: python can_bus_simulator.py [vcan0] [--dbc=ocpp_can.dbc]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    can_bus = args[0] if args else 'vcan0'
+    dbc = next((arg.split('=', 1)[1] for arg in sys.argv if arg.startswith('--dbc=')), None)
     
     logger.info("CAN Bus ve Charger Modülü Simülatörü")
     logger.info(f"CAN Bus: {can_bus}")
+    logger.info(f"DBC: {dbc or 'yerleşik frame düzenleri'}")
     
-    simulator = CANBusSimulator(can_bus=can_bus)
+    simulator = CANBusSimulator(can_bus=can_bus, dbc=dbc)
     
     try:
         await simulator.start()
@@ -249,5 +286,11 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # CAN_ASYNC_LOGGING=1: log I/O'su event loop yerine QueueListener thread'inde yapılır
+    listener = setup_async_logging() if ASYNC_LOGGING_ENABLED else None
+    try:
+        asyncio.run(main())
+    finally:
+        if listener:
+            listener.stop()
 
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Paylaşılan CAN Sabitleri
+ID maskeleri ve kernel filtre yardımcısı; gateway, whitelist, hub ve
+simülatörler bu modülü import eder (bağımlılığı olmayan ortak taban).
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+# Standart (11 bit) ve extended (29 bit) ID için tam eşleşme maskeleri
+STANDARD_ID_MASK = 0x7FF
+EXTENDED_ID_MASK = 0x1FFFFFFF
+
+# Saldırı senaryosundaki zararlı frame ID'si (simülatör üretir, IDS tanır)
+MALICIOUS_CAN_ID = 0x9FF
+
+
+def can_filters_for(can_ids: Optional[Iterable[int]]) -> Optional[List[Dict[str, Any]]]:
+    """
+    Tüketilen CAN ID'lerden python-can `can_filters` listesi oluştur
+    
+    SocketCAN'de bu filtreler kernel'de uygulanır; eşleşmeyen frame'ler
+    kullanıcı alanına hiç kopyalanmaz ve okuyucuyu uyandırmaz.
+    
+    Args:
+        can_ids: Tüketilen CAN ID'ler; None ise "tüm frame'ler" modu
+        
+    Returns:
+        Tam eşleşme filtreleri, tüm frame'ler modunda None
+    """
+    if can_ids is None:
+        return None
+    return [
+        {'can_id': can_id, 'can_mask': EXTENDED_ID_MASK, 'extended': True} if can_id > STANDARD_ID_MASK
+        else {'can_id': can_id, 'can_mask': STANDARD_ID_MASK, 'extended': False}
+        for can_id in sorted(set(can_ids))
+    ]
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Satır İçi CAN Firewall
+İki CAN arayüzü arasında (ör. vcan0 ↔ vcan1) köprü kurar: frame'ler batch
+halinde okunur, whitelist ve ID başına token bucket hız sınırından geçenler
+karşı arayüze iletilir. İletim gecikmesi histogramda tutulur.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import can
+
+from alarm_store import AlarmStore
+from can_whitelist import CANWhitelist
+from hotpath_logging import ASYNC_LOGGING_ENABLED, setup_async_logging
+from ids_detectors import NORMAL_CAN_IDS
+from latency_histogram import LatencyHistogram
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Okuma başına en fazla frame (CANHub ile aynı)
+DEFAULT_BATCH_SIZE = 64
+# SocketCAN extended frame bayrağı: alarm anahtarında extended frame'i aynı değerli standart ID'den ayırır
+CAN_EFF_FLAG = 0x80000000
+
+
+class TokenBucket:
+    """Saniyede `rate` frame, en fazla `burst` frame'lik patlama"""
+    
+    __slots__ = ('rate', 'burst', 'tokens', 'last_ns')
+    
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate * 1e-9  # ns başına token
+        self.burst = burst
+        self.tokens = burst
+        self.last_ns = time.monotonic_ns()
+        
+    def take(self, now_ns: int) -> bool:
+        """Bir token harca; bucket boşsa False"""
+        tokens = self.tokens + (now_ns - self.last_ns) * self.rate
+        if tokens > self.burst:
+            tokens = self.burst
+        self.last_ns = now_ns
+        if tokens >= 1.0:
+            self.tokens = tokens - 1.0
+            return True
+        self.tokens = tokens
+        return False
+
+
+class FirewallDirection:
+    """Tek yönlü köprü (giriş bus'ı → çıkış bus'ı) ve istatistikleri"""
+    
+    def __init__(self, name: str, source: can.BusABC, target: can.BusABC,
+                 rate_limits: Dict[int, Tuple[float, float]], default_rate: Optional[Tuple[float, float]]):
+        self.name = name
+        self.source = source
+        self.target = target
+        self.rate_limits = rate_limits
+        self.default_rate = default_rate
+        self.buckets: Dict[int, Optional[TokenBucket]] = {}
+        self.latency = LatencyHistogram()
+        self.stats = {
+            'frames_read': 0,
+            'forwarded': 0,
+            'blocked_whitelist': 0,
+            'blocked_rate': 0,
+            'error_frames': 0,
+            'send_errors': 0,
+            'batches': 0,
+        }
+        
+    def bucket_for(self, can_id: int) -> Optional[TokenBucket]:
+        """ID'nin token bucket'ı (sınırsız ID için None; ilk frame'de bir kez kurulur)"""
+        limit = self.rate_limits.get(can_id, self.default_rate)
+        bucket = self.buckets[can_id] = TokenBucket(*limit) if limit else None
+        return bucket
+
+
+class CANFirewall:
+    """
+    İki CAN arayüzü arasında whitelist + hız sınırı uygulayan köprü
+    
+    Her yön için giriş soketi event loop'ta `add_reader` ile izlenir (fileno
+    desteklemeyen bus'larda Notifier); okunabilir olduğunda en fazla
+    `batch_size` frame bir seferde okunur, tek whitelist tablosuyla süzülür,
+    token bucket'tan geçenler karşı sokete yazılır. Whitelist
+    `whitelist.swap()` ile çalışırken değiştirilebilir (batch ortasında
+    bölünmez).
+    
+    Gecikme: frame'in okuma zaman damgasından (SocketCAN'de kernel alım
+    zamanı) karşı sokete yazılmasına kadar geçen süre.
+    
+    Örnek:
+        firewall = CANFirewall('vcan0', 'vcan1', rate_limits={0x200: (100, 20)})
+        firewall.start()
+    """
+    
+    def __init__(self, left: str = 'vcan0', right: str = 'vcan1', whitelist: Optional[CANWhitelist] = None,
+                 rate_limits: Optional[Dict[int, Tuple[float, float]]] = None,
+                 default_rate: Optional[Tuple[float, float]] = None, bustype: str = 'socketcan',
+                 batch_size: int = DEFAULT_BATCH_SIZE, buses: Optional[Tuple[can.BusABC, can.BusABC]] = None):
+        """
+        Args:
+            left: Birinci arayüz (ör. şarj istasyonu tarafı)
+            right: İkinci arayüz (ör. araç/güç elektroniği tarafı)
+            whitelist: İzin verilen ID'ler (None ise NORMAL_CAN_IDS)
+            rate_limits: ID başına (frame/s, burst) sınırları
+            default_rate: Listede olmayan ID'ler için (frame/s, burst); None = sınırsız
+            bustype: python-can arayüzü
+            batch_size: Okuma başına en fazla frame
+            buses: Önceden açılmış (sol, sağ) bus'lar (test için)
+        """
+        self.left = left
+        self.right = right
+        self.whitelist = whitelist or CANWhitelist(NORMAL_CAN_IDS)
+        self.batch_size = batch_size
+        left_bus, right_bus = buses or (can.interface.Bus(left, bustype=bustype),
+                                        can.interface.Bus(right, bustype=bustype))
+        rate_limits = dict(rate_limits or {})
+        self.directions = [
+            FirewallDirection(f"{left}→{right}", left_bus, right_bus, rate_limits, default_rate),
+            FirewallDirection(f"{right}→{left}", right_bus, left_bus, rate_limits, default_rate),
+        ]
+        self.alarms = AlarmStore()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._readers: List[int] = []
+        self._notifiers: List[can.Notifier] = []
+        self.running = False
+        
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Her iki yönü izlemeye başla (çalışan event loop içinden çağrılmalı)"""
+        self._loop = loop or asyncio.get_running_loop()
+        for direction in self.directions:
+            try:
+                fd = direction.source.fileno()
+            except NotImplementedError:
+                fd = -1
+            if fd >= 0:
+                self._loop.add_reader(fd, self._drain, direction)
+                self._readers.append(fd)
+            else:
+                self._notifiers.append(can.Notifier(direction.source, [lambda msg, d=direction: self._forward(d, (msg,))],
+                                                    loop=self._loop))
+        self.running = True
+        logger.info(f"CAN firewall başlatıldı: {self.left} ↔ {self.right} "
+                    f"(whitelist: {[hex(i) for i in self.whitelist]}, batch: {self.batch_size})")
+                    
+    def _drain(self, direction: FirewallDirection):
+        """Giriş soketi okunabilir - en fazla batch_size frame oku ve ilet"""
+        frames = []
+        recv = direction.source.recv
+        try:
+            for _ in range(self.batch_size):
+                msg = recv(timeout=0)
+                if msg is None:
+                    break
+                frames.append(msg)
+        except can.CanError as e:
+            logger.error(f"[{direction.name}] okuma hatası: {e}")
+        if frames:
+            self._forward(direction, frames)
+            
+    def _forward(self, direction: FirewallDirection, frames):
+        """Batch'i whitelist ve hız sınırından geçir, izinli frame'leri karşıya yaz"""
+        stats = direction.stats
+        stats['frames_read'] += len(frames)
+        stats['batches'] += 1
+        
+        data_frames = [msg for msg in frames if not msg.is_error_frame]
+        stats['error_frames'] += len(frames) - len(data_frames)
+        passed, blocked_count = self.whitelist.filter_messages(data_frames)
+        if blocked_count:
+            # Alarmlar filtrenin aynı kuralıyla (extended bayrağı dahil) seçilen frame'lere
+            blocked = self.whitelist.blocked_messages(data_frames)
+            stats['blocked_whitelist'] += len(blocked)
+            for msg in blocked:
+                self._block('FIREWALL_WHITELIST', msg, direction)
+                    
+        buckets = direction.buckets
+        send = direction.target.send
+        record = direction.latency.record
+        now_ns = time.monotonic_ns()
+        forwarded = 0
+        for msg in passed:
+            can_id = msg.arbitration_id
+            bucket = buckets[can_id] if can_id in buckets else direction.bucket_for(can_id)
+            if bucket is not None and not bucket.take(now_ns):
+                stats['blocked_rate'] += 1
+                self._block('FIREWALL_RATE_LIMIT', msg, direction)
+                continue
+            try:
+                send(msg, timeout=0)
+            except can.CanError as e:
+                stats['send_errors'] += 1
+                logger.error(f"[{direction.name}] gönderme hatası: {e}")
+                continue
+            forwarded += 1
+            record(time.time_ns() - int(msg.timestamp * 1e9))
+        stats['forwarded'] += forwarded
+        
+    def _block(self, alarm_type: str, msg: can.Message, direction: FirewallDirection):
+        """Bloklanan frame'i alarm deposuna yaz (tekrarlar bastırılır)"""
+        if msg.is_extended_id:
+            alarm_id = msg.arbitration_id | CAN_EFF_FLAG
+            message = f"[{direction.name}] {hex(msg.arbitration_id)} (extended) bloklandı"
+        else:
+            alarm_id = msg.arbitration_id
+            message = f"[{direction.name}] {hex(msg.arbitration_id)} bloklandı"
+        suppressed = self.alarms.record(alarm_type, alarm_id, message, time.monotonic_ns())
+        if suppressed is not None:
+            repeated = f" (+{suppressed} tekrar bastırıldı)" if suppressed else ""
+            logger.warning(f"🛡️ {alarm_type}: {message}{repeated}")
+            
+    def get_stats(self) -> Dict[str, Any]:
+        """Yön başına sayaçlar ve iletim gecikmesi yüzdelikleri"""
+        return {
+            'directions': {
+                direction.name: {**direction.stats, 'latency': direction.latency.to_dict()}
+                for direction in self.directions
+            },
+            'alarms': self.alarms.get_statistics(limit=10),
+        }
+        
+    def stop(self):
+        """Köprüyü durdur ve soketleri kapat"""
+        if not self.running:
+            return
+        self.running = False
+        for fd in self._readers:
+            self._loop.remove_reader(fd)
+        for notifier in self._notifiers:
+            notifier.stop()
+        for direction in self.directions:
+            direction.source.shutdown()
+        logger.info(f"CAN firewall durduruldu: {self.get_stats()['directions']}")
+
+
+def parse_rate_limits(specs: Iterable[str]) -> Dict[int, Tuple[float, float]]:
+    """'0x200:100:20' biçimindeki (ID:frame/s:burst) tanımları çözümle"""
+    limits = {}
+    for spec in specs:
+        can_id, rate, burst = spec.split(':')
+        limits[int(can_id, 0)] = (float(rate), float(burst))
+    return limits
+
+
+async def main():
+    """Ana fonksiyon"""
+    import sys
+    
+    options: Dict[str, List[str]] = {}
+    for arg in sys.argv[1:]:
+        if arg.startswith('--') and '=' in arg:
+            key, value = arg[2:].split('=', 1)
+            options.setdefault(key, []).append(value)
+    interfaces = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    left, right = (interfaces + ['vcan0', 'vcan1'][len(interfaces):])[:2]
+    
+    allowed = [int(i, 0) for value in options.get('allow', []) for i in value.split(',')] or NORMAL_CAN_IDS
+    default_rate = parse_rate_limits([f"0:{options['default-rate'][0]}"])[0] if 'default-rate' in options else None
+    firewall = CANFirewall(left, right, whitelist=CANWhitelist(allowed),
+                           rate_limits=parse_rate_limits(options.get('rate', [])), default_rate=default_rate)
+    try:
+        firewall.start()
+        while firewall.running:
+            await asyncio.sleep(10)
+            for name, stats in firewall.get_stats()['directions'].items():
+                latency = stats['latency']
+                logger.info(f"[{name}] iletilen: {stats['forwarded']}, whitelist: {stats['blocked_whitelist']}, "
+                            f"hız sınırı: {stats['blocked_rate']}, gecikme p50/p99: "
+                            f"{latency['p50_ns'] / 1000:.0f}/{latency['p99_ns'] / 1000:.0f} µs")
+    finally:
+        firewall.stop()
+
+
+if __name__ == "__main__":
+    # Kullanım: python can_firewall.py vcan0 vcan1 [--allow=0x200,0x201] [--rate=0x200:100:20] [--default-rate=1000:100]
+    listener = setup_async_logging() if ASYNC_LOGGING_ENABLED else None
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Kapatılıyor...")
+    finally:
+        if listener:
+            listener.stop()
@@ -6,37 +6,189 @@ OCPP mesajlarını CAN frame'lerine dönüştürür.
 
 import logging
 import struct
-from typing import Optional, Dict, Any
+from types import MappingProxyType
+from typing import Optional, Dict, Any, Callable, Iterable, List, Tuple
+from can_whitelist import CANWhitelist
+from hotpath_logging import FrameTracer
 
 logger = logging.getLogger(__name__)
+_trace_encode = FrameTracer(logger, "OCPP → CAN: %s → CAN ID 0x%x, Payload: %s")
+
+# Klasik CAN frame payload uzunluğu
+FRAME_SIZE = 8
+
+# OCPP connector durumu ↔ CAN status byte (0x301) - değiştirilemez, modül yüklenirken bir kez kurulur
+STATUS_CODES = MappingProxyType({
+    'Available': 0x01, 'Preparing': 0x02, 'Charging': 0x03,
+    'SuspendedEVSE': 0x04, 'SuspendedEV': 0x05, 'Finishing': 0x06,
+    'Reserved': 0x07, 'Unavailable': 0x08, 'Faulted': 0x09,
+})
+STATUS_NAMES = MappingProxyType({code: name for name, code in STATUS_CODES.items()})
+
+
+class FrameCodec:
+    """Tek bir CAN ID için önceden derlenmiş struct codec'i
+    
+    Frame düzeni sınıf yüklenirken bir kez `struct.Struct` olarak derlenir.
+    Encode yönünde düzen 8 byte'a sıfır pad'lenir; böylece tek bir `pack`
+    çağrısı hazır CAN payload'ını üretir (ayrıca sıfır dolgu eklenip kopyalanmaz).
+    Kendi tamponunu yöneten çağıranlar `encode_into` ile doğrudan
+    bytearray/memoryview içine yazabilir. Decode, `unpack_from` ile
+    bytes/bytearray/memoryview üzerinden dilimleme kopyası olmadan okur.
+    
+    `encode` ve `decode` kurulumda closure olarak bağlanır; çağrı başına
+    attribute lookup ve method binding maliyeti oluşmaz.
+    """
+    
+    def __init__(self, action: str, can_id: int, fmt: str,
+                 to_fields: Callable[[Dict[str, Any]], Tuple],
+                 from_fields: Optional[Callable[[Tuple], Dict[str, Any]]] = None):
+        """
+        Args:
+            action: OCPP action adı
+            can_id: CAN arbitration ID
+            fmt: struct format string'i (en fazla 8 byte)
+            to_fields: OCPP payload dict'ini struct alanlarına çeviren fonksiyon
+            from_fields: struct alanlarını OCPP payload dict'ine çeviren fonksiyon
+                (None ise bu yön desteklenmez ve boş dict döner)
+        """
+        self.action = action
+        self.can_id = can_id
+        self.layout = struct.Struct(fmt)
+        if self.layout.size > FRAME_SIZE:
+            raise ValueError(f"{action}: frame düzeni {self.layout.size} byte, en fazla {FRAME_SIZE}")
+        padding = FRAME_SIZE - self.layout.size
+        self.struct = struct.Struct(fmt + f'{padding}x') if padding else self.layout
+        self.to_fields = to_fields
+        self.from_fields = from_fields
+        
+        pack = self.struct.pack
+        pack_into = self.struct.pack_into
+        unpack_from = self.layout.unpack_from
+        min_size = self.layout.size
+        
+        def encode(payload: Dict[str, Any]) -> bytes:
+            """Payload'ı 8 byte'lık CAN payload'ına dönüştür"""
+            return pack(*to_fields(payload))
+        
+        def encode_into(buffer, payload: Dict[str, Any], offset: int = 0):
+            """Payload'ı verilen tampona (bytearray/memoryview) doğrudan yaz"""
+            pack_into(buffer, offset, *to_fields(payload))
+        
+        def decode(payload) -> Dict[str, Any]:
+            """CAN payload'ını OCPP payload dict'ine dönüştür"""
+            if from_fields is None or len(payload) < min_size:
+                return {}
+            return from_fields(unpack_from(payload))
+        
+        self.encode = encode
+        self.encode_into = encode_into
+        self.decode = decode
+
+
+def _build_codecs() -> Tuple[FrameCodec, ...]:
+    """Frame düzenlerini bir kez derle (belgede belirtilen örnek ID'ler)"""
+    status_codes = STATUS_CODES
+    status_names = STATUS_NAMES
+    
+    return (
+        # CAN ID 0x200: [cp_id (1 byte), connector_id (1 byte), start_cmd (1 byte), tx_id (4 bytes)]
+        FrameCodec('RemoteStartTransaction', 0x200, '<BBBI',
+                   lambda p: (p.get('cp_id', 1) & 0xFF,
+                              p.get('connector_id', 1) & 0xFF,
+                              0x01,  # Start command
+                              p.get('transaction_id', 0) & 0xFFFFFFFF),  # CP'nin atadığı transaction ID
+                   lambda f: {'cp_id': f[0], 'connector_id': f[1], 'start_cmd': f[2], 'transaction_id': f[3]}),
+        
+        # CAN ID 0x201: [tx_id (4 bytes), stop_cmd (1 byte)]
+        FrameCodec('RemoteStopTransaction', 0x201, '<IB',
+                   lambda p: (p.get('transaction_id', 0),
+                              0x00),  # Stop command
+                   lambda f: {'transaction_id': f[0], 'stop_cmd': f[1]}),
+        
+        # CAN ID 0x210: [profile_id (2 bytes), max_current (2 bytes)]
+        FrameCodec('SetChargingProfile', 0x210, '<HH',
+                   lambda p: (p.get('profile_id', 1) & 0xFFFF,
+                              int(p.get('max_current', 16) * 10) & 0xFFFF),  # 0.1A resolution
+                   lambda f: {'profile_id': f[0], 'max_current': f[1] / 10.0}),
+        
+        # CAN ID 0x300: [connector_id (1 byte), energy (4 bytes, Wh), reserved (1 byte), timestamp (2 bytes)]
+        FrameCodec('MeterValues', 0x300, '<BIBH',
+                   lambda p: (p.get('connector_id', 1) & 0xFF,
+                              int(p.get('energy', 0)) & 0xFFFFFFFF,
+                              0x00,
+                              p.get('timestamp', 0) & 0xFFFF),
+                   lambda f: {'connector_id': f[0], 'energy': f[1], 'timestamp': f[3]}),
+        
+        # CAN ID 0x301: [connector_id (1 byte), status (1 byte)]
+        FrameCodec('StatusNotification', 0x301, 'BB',
+                   lambda p: (p.get('connector_id', 1) & 0xFF,
+                              status_codes.get(p.get('status', 'Available'), 0x00) & 0xFF),
+                   lambda f: {'connector_id': f[0], 'status': status_names.get(f[1], 'Unknown')}),
+        
+        # CAN ID 0x100: [cp_id (1 byte), model_len (1 byte), model (max 6 bytes)]
+        FrameCodec('BootNotification', 0x100, 'BB6s',
+                   lambda p: _boot_fields(p.get('cp_id', 1), p.get('model', 'TEST'))),
+    )
+
+
+def _boot_fields(cp_id: int, model: str) -> Tuple:
+    """BootNotification alanları: model adı en fazla 6 byte (struct '6s' ile sıfır doldurulur)"""
+    model_bytes = model.encode('ascii')[:6]
+    return (cp_id & 0xFF, len(model_bytes) & 0xFF, model_bytes)
+
+
+# İleri (action → codec/CAN ID) ve ters (CAN ID → codec/action) tablolar.
+# Tümü salt okunur; CANGateway, CANBusSimulator ve ChargePointSimulator bu tabloları paylaşır.
+CODECS_BY_ACTION = MappingProxyType({codec.action: codec for codec in _build_codecs()})
+CODECS_BY_ID = MappingProxyType({codec.can_id: codec for codec in CODECS_BY_ACTION.values()})
+CAN_IDS = MappingProxyType({action: codec.can_id for action, codec in CODECS_BY_ACTION.items()})
+CAN_ID_TO_ACTION = MappingProxyType({can_id: codec.action for can_id, codec in CODECS_BY_ID.items()})
 
 
 class CANGateway:
     """OCPP mesajlarını CAN frame'lerine dönüştüren gateway"""
     
+    # Codec registry - modül yüklenirken bir kez derlenir, iki yönlü dict dispatch
+    CODECS_BY_ACTION = CODECS_BY_ACTION
+    CODECS_BY_ID = CODECS_BY_ID
+    
     # CAN ID mapping (belgede belirtilen örnek ID'ler)
-    CAN_IDS = {
-        'RemoteStartTransaction': 0x200,
-        'RemoteStopTransaction': 0x201,
-        'SetChargingProfile': 0x210,
-        'MeterValues': 0x300,
-        'StatusNotification': 0x301,
-        'BootNotification': 0x100,
-    }
+    CAN_IDS = CAN_IDS
     
-    def __init__(self, whitelist_enabled: bool = False):
+    def __init__(self, whitelist_enabled: bool = False, codecs: Optional[Iterable[FrameCodec]] = None):
         """
         Args:
             whitelist_enabled: Gateway filtreleme aktif mi?
+            codecs: Yerleşik düzenlerin yerine geçecek codec'ler (ör. DBC'den derlenmiş);
+                yalnızca verilen action'lar değişir, diğerleri yerleşik kalır
         """
+        if codecs is not None:
+            by_action = dict(CODECS_BY_ACTION)
+            by_action.update((codec.action, codec) for codec in codecs)
+            by_id = {codec.can_id: codec for codec in by_action.values()}
+            if len(by_id) != len(by_action):
+                raise ValueError("Codec tablosunda aynı CAN ID birden fazla action'a atanmış")
+            self.CODECS_BY_ACTION = MappingProxyType(by_action)
+            self.CODECS_BY_ID = MappingProxyType(by_id)
+            self.CAN_IDS = MappingProxyType({action: codec.can_id for action, codec in by_action.items()})
+            
         self.whitelist_enabled = whitelist_enabled
-        self.allowed_can_ids = set(self.CAN_IDS.values()) if whitelist_enabled else None
+        # Değişmez tablo + hot-swap; varsayılan: codec tablosundaki ID'ler
+        self.whitelist = CANWhitelist(self.CAN_IDS.values())
         self.stats = {
             'messages_processed': 0,
             'messages_blocked': 0,
-            'messages_sent': 0
+            'messages_sent': 0,
+            'frames_unknown': 0,
+            'frames_blocked': 0
         }
         
+    @property
+    def allowed_can_ids(self):
+        """Aktif whitelist tablosu (`in` ve iterasyon destekler)"""
+        return self.whitelist.table
+        
     def ocpp_to_can(self, action: str, payload: Dict[str, Any]) -> Optional[tuple]:
         """
         OCPP mesajını CAN frame'ine dönüştür
@@ -46,22 +198,23 @@ class CANGateway:
         """
         self.stats['messages_processed'] += 1
         
-        if action not in self.CAN_IDS:
+        codec = self.CODECS_BY_ACTION.get(action)
+        if codec is None:
             logger.warning(f"Bilinmeyen OCPP action: {action}")
             return None
         
-        can_id = self.CAN_IDS[action]
+        can_id = codec.can_id
         
         # Whitelist kontrolü
-        if self.whitelist_enabled and can_id not in self.allowed_can_ids:
+        if self.whitelist_enabled and can_id not in self.whitelist.table:
             logger.warning(f"CAN ID {hex(can_id)} whitelist'te değil, bloklandı!")
             self.stats['messages_blocked'] += 1
             return None
         
         try:
-            payload_bytes = self._encode_payload(action, payload)
+            payload_bytes = codec.encode(payload)
             self.stats['messages_sent'] += 1
-            logger.info(f"OCPP → CAN: {action} → CAN ID {hex(can_id)}, Payload: {payload_bytes.hex()}")
+            _trace_encode(action, can_id, payload_bytes)
             return (can_id, payload_bytes)
         except Exception as e:
             logger.error(f"Payload encoding hatası: {e}")
@@ -69,51 +222,10 @@ class CANGateway:
     
     def _encode_payload(self, action: str, payload: Dict[str, Any]) -> bytes:
         """OCPP payload'ını CAN frame payload'ına dönüştür"""
-        
-        if action == 'RemoteStartTransaction':
-            # CAN ID 0x200: [cp_id (1 byte), connector_id (1 byte), start_cmd (1 byte)]
-            cp_id = payload.get('cp_id', 1) & 0xFF
-            connector_id = payload.get('connector_id', 1) & 0xFF
-            start_cmd = 0x01  # Start command
-            return struct.pack('BBB', cp_id, connector_id, start_cmd) + b'\x00' * 5
-        
-        elif action == 'RemoteStopTransaction':
-            # CAN ID 0x201: [tx_id (4 bytes), stop_cmd (1 byte)]
-            tx_id = payload.get('transaction_id', 0)
-            stop_cmd = 0x00  # Stop command
-            return struct.pack('<IB', tx_id, stop_cmd) + b'\x00' * 3
-        
-        elif action == 'SetChargingProfile':
-            # CAN ID 0x210: [profile_id (2 bytes), max_current (2 bytes)]
-            profile_id = payload.get('profile_id', 1) & 0xFFFF
-            max_current = int(payload.get('max_current', 16) * 10) & 0xFFFF  # 0.1A resolution
-            return struct.pack('<HH', profile_id, max_current) + b'\x00' * 4
-        
-        elif action == 'MeterValues':
-            # CAN ID 0x300: [connector_id (1 byte), energy (4 bytes, Wh), timestamp (2 bytes)]
-            connector_id = payload.get('connector_id', 1) & 0xFF
-            energy = int(payload.get('energy', 0)) & 0xFFFFFFFF
-            timestamp = payload.get('timestamp', 0) & 0xFFFF
-            return struct.pack('<BIBH', connector_id, energy, timestamp)
-        
-        elif action == 'StatusNotification':
-            # CAN ID 0x301: [connector_id (1 byte), status (1 byte)]
-            connector_id = payload.get('connector_id', 1) & 0xFF
-            status_map = {'Available': 0x01, 'Preparing': 0x02, 'Charging': 0x03, 
-                         'SuspendedEVSE': 0x04, 'SuspendedEV': 0x05, 'Finishing': 0x06,
-                         'Reserved': 0x07, 'Unavailable': 0x08, 'Faulted': 0x09}
-            status = status_map.get(payload.get('status', 'Available'), 0x00) & 0xFF
-            return struct.pack('BB', connector_id, status) + b'\x00' * 6
-        
-        elif action == 'BootNotification':
-            # CAN ID 0x100: [cp_id (1 byte), model_len (1 byte), model (max 6 bytes)]
-            cp_id = payload.get('cp_id', 1) & 0xFF
-            model = payload.get('model', 'TEST').encode('ascii')[:6]
-            model_len = len(model) & 0xFF
-            return struct.pack('BB', cp_id, model_len) + model.ljust(6, b'\x00')
-        
-        else:
-            return b'\x00' * 8
+        codec = self.CODECS_BY_ACTION.get(action)
+        if codec is None:
+            return b'\x00' * FRAME_SIZE
+        return codec.encode(payload)
     
     def can_to_ocpp(self, can_id: int, payload: bytes) -> Optional[Dict[str, Any]]:
         """
@@ -122,66 +234,168 @@ class CANGateway:
         Returns:
             OCPP payload dict veya None
         """
-        try:
-            # CAN ID'den action'ı bul
-            action = None
-            for act, cid in self.CAN_IDS.items():
-                if cid == can_id:
-                    action = act
-                    break
-            
-            if not action:
-                logger.warning(f"Bilinmeyen CAN ID: {hex(can_id)}")
-                return None
+        # Hızlı yol: bilinmeyen ID'ler loglama/try kurulumundan önce reddedilir
+        codec = self.CODECS_BY_ID.get(can_id)
+        if codec is None:
+            self.stats['frames_unknown'] += 1
+            return None
             
-            return self._decode_payload(action, payload)
+        try:
+            return codec.decode(payload)
         except Exception as e:
             logger.error(f"CAN → OCPP decode hatası: {e}")
             return None
     
     def _decode_payload(self, action: str, payload: bytes) -> Dict[str, Any]:
         """CAN frame payload'ını OCPP payload'ına dönüştür"""
+        codec = self.CODECS_BY_ACTION.get(action)
+        if codec is None:
+            return {}
+        return codec.decode(payload)
+        
+    def ocpp_to_can_many(self, messages: Iterable[Tuple[str, Dict[str, Any]]]) -> List[Tuple[int, bytes]]:
+        """
+        Birden fazla OCPP mesajını tek geçişte CAN frame'lerine dönüştür
+        
+        Kayıtlı trafik tekrarı ve burst boşaltma için: istatistikler batch
+        başına bir kez güncellenir ve tek bir özet log satırı yazılır.
+        Bilinmeyen, whitelist'e takılan veya encode edilemeyen mesajlar
+        atlanır ve yalnızca sayaçlara yansır.
         
-        if action == 'MeterValues':
-            # CAN ID 0x300: [connector_id, energy, timestamp]
-            if len(payload) >= 8:
-                connector_id, energy, timestamp = struct.unpack('<BIBH', payload[:8])
-                return {
-                    'connector_id': connector_id,
-                    'energy': energy,
-                    'timestamp': timestamp
-                }
-        
-        elif action == 'StatusNotification':
-            # CAN ID 0x301: [connector_id, status]
-            if len(payload) >= 2:
-                connector_id, status_byte = struct.unpack('BB', payload[:2])
-                status_map = {0x01: 'Available', 0x02: 'Preparing', 0x03: 'Charging',
-                             0x04: 'SuspendedEVSE', 0x05: 'SuspendedEV', 0x06: 'Finishing',
-                             0x07: 'Reserved', 0x08: 'Unavailable', 0x09: 'Faulted'}
-                status = status_map.get(status_byte, 'Unknown')
-                return {
-                    'connector_id': connector_id,
-                    'status': status
-                }
-        
-        return {}
+        Args:
+            messages: (action, payload) tuple'larından oluşan liste veya iterator
+            
+        Returns:
+            Başarılı dönüşümler için (can_id, payload_bytes) listesi (girdi sırasıyla)
+        """
+        get_codec = self.CODECS_BY_ACTION.get
+        allowed = self.whitelist.table if self.whitelist_enabled else None  # Batch boyunca aynı tablo
+        frames: List[Tuple[int, bytes]] = []
+        append = frames.append
+        blocked = unknown = failed = 0
+        
+        for action, payload in messages:
+            codec = get_codec(action)
+            if codec is None:
+                unknown += 1
+                continue
+            can_id = codec.can_id
+            if allowed is not None and can_id not in allowed:
+                blocked += 1
+                continue
+            try:
+                append((can_id, codec.encode(payload)))
+            except Exception:
+                failed += 1
+        
+        processed = len(frames) + blocked + unknown + failed
+        stats = self.stats
+        stats['messages_processed'] += processed
+        stats['messages_blocked'] += blocked
+        stats['messages_sent'] += len(frames)
+        
+        if blocked or unknown or failed:
+            logger.warning(f"OCPP → CAN batch: {processed} mesaj, {len(frames)} gönderildi, "
+                           f"{blocked} bloklandı, {unknown} bilinmeyen action, {failed} encoding hatası")
+        elif logger.isEnabledFor(logging.INFO):
+            logger.info(f"OCPP → CAN batch: {processed} mesaj, {len(frames)} gönderildi")
+        return frames
+        
+    def can_to_ocpp_many(self, frames: Iterable[Tuple[int, bytes]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Birden fazla CAN frame'ini tek geçişte OCPP payload'larına dönüştür (ters yön)
+        
+        Sonuç listesi girdiyle hizalıdır (can_to_ocpp'nin dönüşüyle aynı):
+        çözülemeyen frame'ler için None döner; ara (can_id, dict) tuple'ları
+        üretilmez.
+        
+        Args:
+            frames: (can_id, payload_bytes) tuple'larından oluşan liste veya iterator
+            
+        Returns:
+            Her frame için OCPP payload dict'i veya None
+        """
+        get_codec = self.CODECS_BY_ID.get
+        decoded: List[Optional[Dict[str, Any]]] = []
+        append = decoded.append
+        unknown = failed = 0
+        
+        for can_id, payload in frames:
+            codec = get_codec(can_id)
+            if codec is None:
+                unknown += 1
+                append(None)
+                continue
+            try:
+                append(codec.decode(payload))
+            except Exception:
+                failed += 1
+                append(None)
+        
+        total = len(decoded)
+        self.stats['frames_unknown'] += unknown
+        
+        if failed:
+            logger.warning(f"CAN → OCPP batch: {total} frame, {total - unknown - failed} çözüldü, "
+                           f"{unknown} bilinmeyen ID, {failed} decode hatası")
+        elif logger.isEnabledFor(logging.INFO):
+            logger.info(f"CAN → OCPP batch: {total} frame, {total - unknown} çözüldü, {unknown} bilinmeyen ID")
+        return decoded
     
+    @classmethod
+    def from_dbc(cls, dbc_path: str, whitelist_enabled: bool = False, use_cache: bool = True) -> 'CANGateway':
+        """
+        Frame düzenleri DBC dosyasından derlenen gateway oluştur
+        
+        Args:
+            dbc_path: DBC dosya yolu (mesaj adları = OCPP action, sinyal adları = payload anahtarları)
+            whitelist_enabled: Gateway filtreleme aktif mi?
+            use_cache: Ayrıştırılmış DBC pickle önbelleği kullanılsın mı?
+        """
+        from dbc_mapping import load_codecs
+        
+        return cls(whitelist_enabled=whitelist_enabled, codecs=load_codecs(dbc_path, use_cache=use_cache))
+        
     def get_stats(self) -> Dict[str, int]:
         """Gateway istatistiklerini döndür"""
         return self.stats.copy()
     
-    def enable_whitelist(self, allowed_ids: set = None):
-        """Whitelist filtrelemeyi aktif et"""
+    def enable_whitelist(self, allowed_ids: set = None, extended_ranges: Iterable[Tuple[int, int]] = ()):
+        """
+        Whitelist filtrelemeyi aktif et (çalışırken çağrılabilir: tablo atomik değişir)
+        
+        Args:
+            allowed_ids: İzin verilen CAN ID'ler (None ise codec tablosundaki ID'ler)
+            extended_ranges: İzin verilen 29 bit ID aralıkları (kapalı [başlangıç, bitiş])
+        """
+        self.whitelist.swap(allowed_ids or self.CAN_IDS.values(), extended_ranges)
         self.whitelist_enabled = True
-        if allowed_ids:
-            self.allowed_can_ids = allowed_ids
-        else:
-            self.allowed_can_ids = set(self.CAN_IDS.values())
-        logger.info(f"Whitelist aktif edildi: {[hex(id) for id in self.allowed_can_ids]}")
+        logger.info(f"Whitelist aktif edildi: {[hex(id) for id in self.whitelist]}")
     
     def disable_whitelist(self):
         """Whitelist filtrelemeyi kapat"""
         self.whitelist_enabled = False
         logger.info("Whitelist kapatıldı")
+        
+    def can_filters(self) -> Optional[List[Dict[str, Any]]]:
+        """Whitelist'e karşılık gelen kernel CAN filtreleri (whitelist kapalıysa None = tüm frame'ler)"""
+        return self.whitelist.can_filters() if self.whitelist_enabled else None
+        
+    def filter_frames(self, messages: List) -> List:
+        """
+        Ham CAN frame batch'ini whitelist'ten geçir (CAN yolu, tek vektörel kontrol)
+        
+        Args:
+            messages: can.Message listesi
+            
+        Returns:
+            İzinli frame'ler (girdi sırasıyla); whitelist kapalıysa girdi aynen
+        """
+        if not self.whitelist_enabled:
+            return messages
+        passed, blocked = self.whitelist.filter_messages(messages)
+        if blocked:
+            self.stats['frames_blocked'] += blocked
+            logger.warning(f"CAN batch: {len(messages)} frame, {blocked} whitelist dışı frame bloklandı")
+        return passed
 
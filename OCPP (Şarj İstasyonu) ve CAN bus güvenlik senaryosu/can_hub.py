@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+CAN Hub - Tek Soket Fan-out
+Aynı süreçte çalışan bileşenler (CP, charger simülatörü, CAN-IDS) için tek bir
+CAN soketi açar, frame'leri toplu okur ve abonelere ID filtreli ring buffer'lar
+üzerinden dağıtır.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional
+
+import can
+
+from can_constants import can_filters_for
+from hotpath_logging import ASYNC_LOGGING_ENABLED, setup_async_logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Soket okunabilir olduğunda tek seferde okunacak en fazla frame
+DEFAULT_BATCH_SIZE = 64
+# Abone başına ring buffer kapasitesi (frame)
+DEFAULT_SUBSCRIBER_BUFFER = 1024
+
+
+class HubSubscriber:
+    """
+    CANHub abonesi - ID filtreli ring buffer
+    
+    AsyncCANReader ile aynı okuma arayüzünü (recv, recv_nowait, get_metrics,
+    stop) ve bileşenlerin kullandığı bus arayüzünü (send, shutdown) sunar;
+    böylece bir bileşen kendi soketi yerine hub aboneliğiyle çalışabilir.
+    Buffer dolduğunda en eski frame atılır (deque maxlen).
+    """
+    
+    def __init__(self, hub: 'CANHub', name: str, can_ids: Optional[Iterable[int]] = None,
+                 maxsize: int = DEFAULT_SUBSCRIBER_BUFFER):
+        """
+        Args:
+            hub: Frame'leri dağıtan hub
+            name: Abone adı (log ve metrikler için)
+            can_ids: Alınacak CAN ID'ler (None ise tüm frame'ler)
+            maxsize: Ring buffer kapasitesi
+        """
+        self.hub = hub
+        self.name = name
+        self.can_ids = frozenset(can_ids) if can_ids is not None else None
+        self.maxsize = maxsize
+        self._buffer: deque = deque(maxlen=maxsize)
+        self._event = asyncio.Event()
+        self._stopped = False
+        
+        # Backpressure metrikleri
+        self.received = 0
+        self.dropped = 0
+        self.high_watermark = 0
+        
+    def _push(self, msg: can.Message):
+        """Hub tarafından çağrılır - frame'i buffer'a ekle (uyandırma batch sonunda)"""
+        buffer = self._buffer
+        if len(buffer) == self.maxsize:
+            self.dropped += 1
+        buffer.append(msg)
+        self.received += 1
+        if len(buffer) > self.high_watermark:
+            self.high_watermark = len(buffer)
+            
+    def _wakeup(self):
+        self._event.set()
+        
+    async def recv(self) -> Optional[can.Message]:
+        """Sıradaki frame'i bekle; abonelik kapandıysa None döner"""
+        while not self._buffer:
+            if self._stopped:
+                return None
+            self._event.clear()
+            await self._event.wait()
+        return self._buffer.popleft()
+        
+    def recv_nowait(self) -> Optional[can.Message]:
+        """Buffer'da bekleyen frame varsa döndür, yoksa None"""
+        return self._buffer.popleft() if self._buffer else None
+        
+    def recv_batch(self, max_frames: int = DEFAULT_BATCH_SIZE) -> List[can.Message]:
+        """Buffer'da bekleyen frame'leri (en fazla max_frames) tek seferde al"""
+        buffer = self._buffer
+        return [buffer.popleft() for _ in range(min(max_frames, len(buffer)))]
+        
+    def send(self, msg: can.Message, timeout: Optional[float] = None):
+        """Frame'i hub soketi üzerinden gönder (diğer abonelere de yerel olarak iletilir)"""
+        self.hub.send(msg, timeout=timeout, sender=self)
+        
+    def get_metrics(self) -> Dict[str, Any]:
+        """Backpressure metrikleri"""
+        return {
+            'received': self.received,
+            'dropped': self.dropped,
+            'queue_depth': len(self._buffer),
+            'high_watermark': self.high_watermark,
+            'maxsize': self.maxsize,
+            'can_ids': sorted(self.can_ids) if self.can_ids is not None else 'all',
+        }
+        
+    def stop(self):
+        """Aboneliği kapat ve bekleyen recv() çağrılarını uyandır"""
+        if self._stopped:
+            return
+        self._stopped = True
+        self.hub.unsubscribe(self)
+        self._event.set()
+        
+    def shutdown(self):
+        """Bus arayüzü uyumluluğu - soket hub'a ait olduğu için yalnızca aboneliği kapatır"""
+        self.stop()
+
+
+class CANHub:
+    """
+    Tek CAN soketini paylaşan fan-out hub
+    
+    SocketCAN soketi `loop.add_reader` ile izlenir; soket okunabilir olduğunda
+    `recv(timeout=0)` ile en fazla `batch_size` frame okunur ve abonelere
+    CAN ID indeksi üzerinden dağıtılır (abone yalnızca filtresindeki ID'leri
+    görür). fileno() desteklemeyen bus'larda can.Notifier thread'i kullanılır.
+    
+    Bir abonenin gönderdiği frame soket tarafından aynı sokete geri
+    verilmediği için hub bu frame'i diğer abonelere yerel olarak iletir.
+    
+    Kernel filtreleri: hub soketine abonelerin ID kümelerinin birleşimi
+    `can_filters` olarak uygulanır, hiçbir abonenin istemediği frame'ler
+    kernel'de elenir. "Tüm frame'ler" modu: `all_frames=True` verilirse ya da
+    `can_ids=None` ile abone olan biri varsa (ör. CAN-IDS) filtre kaldırılır.
+    
+    Örnek:
+        hub = CANHub('vcan0')
+        hub.start()
+        simulator = CANBusSimulator(hub=hub)
+        ids = CANIDS(hub=hub)
+    """
+    
+    def __init__(self, channel: str = 'vcan0', bustype: str = 'socketcan',
+                 batch_size: int = DEFAULT_BATCH_SIZE, bus: Optional[can.BusABC] = None,
+                 all_frames: bool = False):
+        """
+        Args:
+            channel: CAN kanal adı
+            bustype: python-can arayüzü
+            batch_size: Okuma başına en fazla frame
+            bus: Önceden açılmış bus (verilirse channel/bustype kullanılmaz)
+            all_frames: Kernel filtresi uygulama, tüm frame'leri oku
+        """
+        self.channel = channel
+        self.bus = bus or can.interface.Bus(channel, bustype=bustype)
+        self.batch_size = batch_size
+        self.all_frames = all_frames
+        self.kernel_filter_ids: Optional[frozenset] = None  # None = tüm frame'ler
+        self.subscribers: List[HubSubscriber] = []
+        self._by_id: Dict[int, List[HubSubscriber]] = {}
+        self._wildcard: List[HubSubscriber] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._fd = -1
+        self._notifier: Optional[can.Notifier] = None
+        self.running = False
+        
+        self.stats = {
+            'frames_read': 0,
+            'frames_sent': 0,
+            'batches': 0,
+            'deliveries': 0,
+            'errors': 0,
+        }
+        
+    def subscribe(self, name: str, can_ids: Optional[Iterable[int]] = None,
+                  maxsize: int = DEFAULT_SUBSCRIBER_BUFFER) -> HubSubscriber:
+        """
+        Yeni abone oluştur
+        
+        Args:
+            name: Abone adı
+            can_ids: Alınacak CAN ID'ler (None ise tüm frame'ler)
+            maxsize: Ring buffer kapasitesi
+        """
+        subscriber = HubSubscriber(self, name, can_ids, maxsize)
+        self.subscribers.append(subscriber)
+        self._rebuild_index()
+        logger.info(f"CAN Hub abonesi eklendi: {name} "
+                    f"(ID'ler: {[hex(i) for i in sorted(subscriber.can_ids)] if subscriber.can_ids is not None else 'tümü'})")
+        return subscriber
+        
+    def unsubscribe(self, subscriber: HubSubscriber):
+        """Aboneyi çıkar"""
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+            self._rebuild_index()
+            
+    def _rebuild_index(self):
+        """CAN ID → abone listesi indeksini yeniden kur (abone ekleme/çıkarmada)"""
+        by_id: Dict[int, List[HubSubscriber]] = {}
+        wildcard = []
+        for subscriber in self.subscribers:
+            if subscriber.can_ids is None:
+                wildcard.append(subscriber)
+            else:
+                for can_id in subscriber.can_ids:
+                    by_id.setdefault(can_id, []).append(subscriber)
+        # Her ID listesine tüm-frame aboneleri de eklenir; dağıtımda tek arama yeterli
+        for subscribers in by_id.values():
+            subscribers.extend(wildcard)
+        self._by_id = by_id
+        self._wildcard = wildcard
+        self._apply_kernel_filters()
+        
+    def _apply_kernel_filters(self):
+        """Abonelerin ID birleşimini soket filtresi olarak uygula (değiştiyse)"""
+        if self.all_frames or self._wildcard or not self.subscribers:
+            filter_ids = None
+        else:
+            filter_ids = frozenset(self._by_id)
+        if filter_ids == self.kernel_filter_ids:
+            return
+        self.kernel_filter_ids = filter_ids
+        self.bus.set_filters(can_filters_for(filter_ids))
+        description = [hex(i) for i in sorted(filter_ids)] if filter_ids is not None else "tüm frame'ler"
+        logger.info(f"CAN Hub kernel filtresi: {description}")
+        
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Soketi izlemeye başla (çalışan event loop içinden çağrılmalı)"""
+        self._loop = loop or asyncio.get_running_loop()
+        try:
+            self._fd = self.bus.fileno()
+        except NotImplementedError:
+            self._fd = -1
+            
+        if self._fd >= 0:
+            self._loop.add_reader(self._fd, self._drain)
+        else:
+            self._notifier = can.Notifier(self.bus, [self._on_frame], loop=self._loop)
+        self.running = True
+        logger.info(f"CAN Hub başlatıldı: {self.channel} (batch: {self.batch_size})")
+        
+    def _drain(self):
+        """Soket okunabilir - en fazla batch_size frame oku ve dağıt"""
+        frames = []
+        recv = self.bus.recv
+        try:
+            for _ in range(self.batch_size):
+                msg = recv(timeout=0)
+                if msg is None:
+                    break
+                frames.append(msg)
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"CAN Hub okuma hatası: {e}")
+        if frames:
+            self._dispatch(frames)
+            
+    def _on_frame(self, msg: can.Message):
+        """Notifier callback'i (fileno desteklemeyen bus'lar)"""
+        self._dispatch((msg,))
+        
+    def _dispatch(self, frames, sender: Optional[HubSubscriber] = None):
+        """Frame'leri ilgili abonelerin buffer'larına ekle, batch sonunda bir kez uyandır"""
+        by_id = self._by_id
+        wildcard = self._wildcard
+        touched = set()
+        deliveries = 0
+        for msg in frames:
+            for subscriber in by_id.get(msg.arbitration_id, wildcard):
+                if subscriber is not sender:
+                    subscriber._push(msg)
+                    touched.add(subscriber)
+                    deliveries += 1
+        for subscriber in touched:
+            subscriber._wakeup()
+            
+        if sender is None:
+            self.stats['frames_read'] += len(frames)
+            self.stats['batches'] += 1
+        self.stats['deliveries'] += deliveries
+        
+    def send(self, msg: can.Message, timeout: Optional[float] = None,
+             sender: Optional[HubSubscriber] = None):
+        """
+        Frame'i paylaşılan soket üzerinden gönder
+        
+        Args:
+            msg: Gönderilecek frame
+            timeout: python-can send timeout
+            sender: Gönderen abone (frame ona geri iletilmez)
+        """
+        self.bus.send(msg, timeout=timeout)
+        self.stats['frames_sent'] += 1
+        # Soket kendi gönderdiğini geri vermez; aynı süreçteki diğer abonelere yerel ilet
+        self._dispatch((msg,), sender=sender)
+        
+    def get_stats(self) -> Dict[str, Any]:
+        """Hub ve abone istatistikleri"""
+        return {
+            **self.stats,
+            'subscribers': {subscriber.name: subscriber.get_metrics() for subscriber in self.subscribers},
+        }
+        
+    def stop(self):
+        """Hub'ı durdur, aboneleri kapat ve soketi serbest bırak"""
+        if not self.running:
+            return
+        self.running = False
+        if self._fd >= 0 and self._loop:
+            self._loop.remove_reader(self._fd)
+        if self._notifier:
+            self._notifier.stop()
+        for subscriber in list(self.subscribers):
+            subscriber.stop()
+        self.bus.shutdown()
+        logger.info(f"CAN Hub durduruldu: {self.stats}")
+
+
+async def main():
+    """Charger simülatörü ve CAN-IDS'i tek soket üzerinden aynı süreçte çalıştır"""
+    import sys
+    from can_bus_simulator import CANBusSimulator
+    from defense_mechanisms import CANIDS
+    
+    can_bus = sys.argv[1] if len(sys.argv) > 1 else 'vcan0'
+    
+    logger.info("CAN Hub - charger simülatörü + CAN-IDS (tek soket)")
+    logger.info(f"CAN Bus: {can_bus}")
+    
+    hub = CANHub(can_bus)
+    hub.start()
+    simulator = CANBusSimulator(can_bus=can_bus, hub=hub)
+    ids = CANIDS(can_bus=can_bus, hub=hub)
+    
+    try:
+        await simulator.start()
+        await ids.start()
+        
+        while hub.running:
+            await asyncio.sleep(10)
+            logger.info(f"CAN Hub istatistikleri: {hub.get_stats()}")
+    finally:
+        simulator.stop()
+        ids.stop()
+        hub.stop()
+
+
+if __name__ == "__main__":
+    # CAN_ASYNC_LOGGING=1: log I/O'su event loop yerine QueueListener thread'inde yapılır
+    listener = setup_async_logging() if ASYNC_LOGGING_ENABLED else None
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Kapatılıyor...")
+    finally:
+        if listener:
+            listener.stop()
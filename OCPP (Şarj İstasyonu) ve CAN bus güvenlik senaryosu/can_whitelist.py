@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+CAN ID Whitelist Motoru
+11 bit standart ID'ler için 2048 girişli arama tablosu, 29 bit extended ID'ler
+için sıralı aralık listesi. Tablo değişmezdir; whitelist değişikliği yeni
+tablonun tek referans atamasıyla yayınlanmasıdır (kilitsiz hot-swap).
+"""
+
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from can_constants import EXTENDED_ID_MASK, STANDARD_ID_MASK, can_filters_for
+
+STANDARD_ID_COUNT = STANDARD_ID_MASK + 1
+
+
+def _merge_ranges(ranges: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Kapalı [başlangıç, bitiş] aralıklarını sırala ve çakışan/bitişikleri birleştir"""
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if not 0 <= start <= end <= EXTENDED_ID_MASK:
+            raise ValueError(f"Geçersiz extended ID aralığı: {hex(start)}-{hex(end)}")
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _subtract_ids(ranges: Iterable[Tuple[int, int]], can_ids: Iterable[int]) -> List[Tuple[int, int]]:
+    """Sıralı, birleştirilmiş aralıklardan tekil ID'leri çıkar (içine düşen aralık ID etrafında bölünür)"""
+    result: List[Tuple[int, int]] = []
+    holes = sorted(set(can_ids))
+    for start, end in ranges:
+        for can_id in holes[bisect_left(holes, start):bisect_right(holes, end)]:
+            if can_id > start:
+                result.append((start, can_id - 1))
+            start = can_id + 1
+        if start <= end:
+            result.append((start, end))
+    return result
+
+
+def _range_filters(start: int, end: int) -> List[Dict[str, Any]]:
+    """Extended ID aralığını en az sayıda (id, maske) önek filtresiyle kapla"""
+    filters = []
+    while start <= end:
+        size = start & -start if start else 1 << 29
+        while size > end - start + 1:
+            size >>= 1
+        filters.append({'can_id': start, 'can_mask': EXTENDED_ID_MASK & ~(size - 1), 'extended': True})
+        start += size
+    return filters
+
+
+class WhitelistTable:
+    """
+    Değişmez whitelist tablosu
+    
+    Standart ID'ler 2048 byte'lık (ID başına bir byte) arama tablosundadır;
+    batch kontrolde tablo NumPy ile tek seferde indekslenir. Tekil kontrolde
+    CPython'da en ucuz yol C seviyesindeki küme üyeliği olduğu için aynı
+    ID'lerin frozenset kopyası da tutulur. Extended ID'ler birleştirilmiş
+    sıralı aralıklardır (tekil ID = tek elemanlı aralık); kontrol ikili aramadır.
+    """
+    
+    __slots__ = ('standard', '_standard_set', 'ranges', '_starts', '_ends', '_starts_array', '_ends_array')
+    
+    def __init__(self, standard_ids: Iterable[int] = (), extended_ranges: Iterable[Tuple[int, int]] = ()):
+        """
+        Args:
+            standard_ids: İzin verilen 11 bit ID'ler
+            extended_ranges: İzin verilen 29 bit ID aralıkları (kapalı [başlangıç, bitiş])
+        """
+        self.standard = np.zeros(STANDARD_ID_COUNT, dtype=np.uint8)
+        for can_id in standard_ids:
+            if not 0 <= can_id <= STANDARD_ID_MASK:
+                raise ValueError(f"Geçersiz standart CAN ID: {hex(can_id)}")
+            self.standard[can_id] = 1
+        self.standard.flags.writeable = False
+        self._standard_set = frozenset(np.flatnonzero(self.standard).tolist())
+        self.ranges: Tuple[Tuple[int, int], ...] = tuple(_merge_ranges(extended_ranges))
+        self._starts = [start for start, _ in self.ranges]
+        self._ends = [end for _, end in self.ranges]
+        self._starts_array = np.array(self._starts, dtype=np.uint32)
+        self._ends_array = np.array(self._ends, dtype=np.uint32)
+        
+    @classmethod
+    def from_ids(cls, can_ids: Iterable[int], extended_ranges: Iterable[Tuple[int, int]] = ()) -> 'WhitelistTable':
+        """Düz ID listesinden tablo (0x7FF üstü ID'ler extended kabul edilir, can_filters_for ile aynı kural)"""
+        standard, extended = [], list(extended_ranges)
+        for can_id in can_ids:
+            if can_id > STANDARD_ID_MASK:
+                extended.append((can_id, can_id))
+            else:
+                standard.append(can_id)
+        return cls(standard, extended)
+        
+    def allows(self, can_id: int, extended: Optional[bool] = None) -> bool:
+        """
+        Tek ID kontrolü
+        
+        Args:
+            can_id: Arbitration ID
+            extended: Frame extended mı? (None: ID 0x7FF üstüyse extended)
+        """
+        if extended is None:
+            extended = can_id > STANDARD_ID_MASK
+        if not extended:
+            return can_id in self._standard_set
+        index = bisect_right(self._starts, can_id) - 1
+        return index >= 0 and can_id <= self._ends[index]
+        
+    def __contains__(self, can_id: int) -> bool:
+        # Frame yolundaki `in` kontrolü: standart ID'de tek küme üyeliği
+        if can_id <= STANDARD_ID_MASK:
+            return can_id in self._standard_set
+        index = bisect_right(self._starts, can_id) - 1
+        return index >= 0 and can_id <= self._ends[index]
+        
+    def __iter__(self):
+        """Standart ID'ler ve extended aralıkların başlangıçları (loglama için)"""
+        yield from sorted(self._standard_set)
+        yield from self._starts
+        
+    def check_batch(self, can_ids: Sequence[int], extended: Optional[Sequence[bool]] = None) -> np.ndarray:
+        """
+        Bir batch ID'yi tek seferde kontrol et
+        
+        Args:
+            can_ids: Arbitration ID'ler (liste veya uint32 dizisi)
+            extended: Frame başına extended bayrağı (None: ID 0x7FF üstüyse extended)
+            
+        Returns:
+            Girdiyle hizalı bool dizisi (True = izinli)
+        """
+        ids = np.asarray(can_ids, dtype=np.uint32)
+        if extended is None:
+            is_extended = ids > STANDARD_ID_MASK
+            standard = ~is_extended
+        else:
+            is_extended = np.asarray(extended, dtype=bool)
+            standard = ~is_extended & (ids <= STANDARD_ID_MASK)
+        # Maskesiz tam dizi indeksleme (aralık dışı ID'ler kırpılır, sonra maskelenir)
+        allowed = self.standard[np.minimum(ids, STANDARD_ID_MASK)].view(bool) & standard
+        
+        if self.ranges and is_extended.any():
+            extended_ids = ids[is_extended]
+            index = np.searchsorted(self._starts_array, extended_ids, side='right') - 1
+            valid = index >= 0
+            hit = np.zeros(extended_ids.shape, dtype=bool)
+            hit[valid] = extended_ids[valid] <= self._ends_array[index[valid]]
+            allowed[is_extended] = hit
+        return allowed
+        
+    def can_filters(self) -> List[Dict[str, Any]]:
+        """Tabloya karşılık gelen kernel CAN filtreleri (aralıklar önek maskelerine bölünür)"""
+        filters = can_filters_for(self._standard_set) or []
+        for start, end in self.ranges:
+            filters.extend(_range_filters(start, end))
+        return filters
+
+
+class CANWhitelist:
+    """
+    Hot-swap destekli whitelist
+    
+    Okuyucular `table` referansını alıp kullanır; `swap`/`add`/`remove` yeni
+    bir WhitelistTable kurup tek atamayla yayınlar. Kilit yoktur: bir batch
+    boyunca aynı tabloyu kullanmak isteyen çağıran `table`'ı bir kez okur.
+    
+    Örnek:
+        whitelist = CANWhitelist({0x200, 0x201}, extended_ranges=[(0x18FF0000, 0x18FFFFFF)])
+        if msg.arbitration_id in whitelist: ...
+        mask = whitelist.table.check_batch(ids)
+        whitelist.swap({0x200, 0x300})
+    """
+    
+    def __init__(self, can_ids: Iterable[int] = (), extended_ranges: Iterable[Tuple[int, int]] = ()):
+        self.table = WhitelistTable.from_ids(can_ids, extended_ranges)
+        self.swaps = 0
+        
+    def swap(self, can_ids: Iterable[int], extended_ranges: Iterable[Tuple[int, int]] = ()) -> WhitelistTable:
+        """Whitelist'i atomik olarak değiştir (yeni tablo tamamen kurulduktan sonra yayınlanır)"""
+        table = WhitelistTable.from_ids(can_ids, extended_ranges)
+        self.table = table
+        self.swaps += 1
+        return table
+        
+    def add(self, *can_ids: int):
+        """ID ekle (copy-on-write)"""
+        table = self.table
+        self.swap([*table._standard_set, *can_ids], table.ranges)
+        
+    def remove(self, *can_ids: int):
+        """ID çıkar (copy-on-write; 0x7FF üstü ID birleştirilmiş bir aralıktaysa aralık ID etrafında bölünür)"""
+        table = self.table
+        removed = set(can_ids)
+        self.swap(table._standard_set - removed,
+                  _subtract_ids(table.ranges, (can_id for can_id in removed if can_id > STANDARD_ID_MASK)))
+                  
+    def allows(self, can_id: int, extended: Optional[bool] = None) -> bool:
+        return self.table.allows(can_id, extended)
+        
+    def __contains__(self, can_id: int) -> bool:
+        return can_id in self.table
+        
+    def __iter__(self):
+        return iter(self.table)
+        
+    def check_batch(self, can_ids: Sequence[int], extended: Optional[Sequence[bool]] = None) -> np.ndarray:
+        return self.table.check_batch(can_ids, extended)
+        
+    def filter_messages(self, messages: Sequence) -> Tuple[list, int]:
+        """
+        can.Message batch'ini whitelist'ten geçir
+        
+        Batch boyunca tek tablo kullanılır (ortada yapılan swap batch'i bölmez).
+        Mesaj nesnelerinden ID çıkarmak zaten frame başına Python işi olduğu
+        için burada skaler arama yapılır; ID'ler hazır bir dizideyse (ring
+        buffer, FrameHistory) `check_batch` kullanılmalıdır.
+        
+        Returns:
+            (izinli mesajlar - girdi sırasıyla, bloklanan sayısı)
+        """
+        table = self.table
+        standard = table._standard_set
+        if table.ranges:
+            allows = table.allows
+            passed = [msg for msg in messages
+                      if (allows(msg.arbitration_id, True) if msg.is_extended_id else msg.arbitration_id in standard)]
+        else:
+            # Extended aralık yok (varsayılan whitelist): küme üyeliği, bayrağa yalnızca eşleşen frame'de bakılır
+            passed = [msg for msg in messages if msg.arbitration_id in standard and not msg.is_extended_id]
+        return passed, len(messages) - len(passed)
+        
+    def blocked_messages(self, messages: Sequence) -> list:
+        """
+        `filter_messages`'ın bloklayacağı mesajlar (aynı kuralın tersi)
+        
+        İzinli standart ID ile aynı değerdeki extended frame de bloklanır.
+        Alarm üretecek çağıranlar için; bloklanan sayısı sıfırsa çağrılmamalıdır.
+        
+        Returns:
+            Bloklanan mesajlar - girdi sırasıyla
+        """
+        table = self.table
+        standard = table._standard_set
+        if table.ranges:
+            allows = table.allows
+            return [msg for msg in messages
+                    if not (allows(msg.arbitration_id, True) if msg.is_extended_id else msg.arbitration_id in standard)]
+        return [msg for msg in messages if msg.arbitration_id not in standard or msg.is_extended_id]
+        
+    def can_filters(self) -> List[Dict[str, Any]]:
+        return self.table.can_filters()
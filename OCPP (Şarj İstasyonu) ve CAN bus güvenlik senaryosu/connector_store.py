@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Connector / Transaction Deposu
+Charge Point'in connector durumlarını `__slots__` kayıtlarında tutar.
+Transaction ID'leri tekil ve monoton artan bir sayaçtan üretilir; kayıtlar
+connector ID'sine ve transaction ID'sine göre O(1) bulunur. İstenirse durum
+yeniden başlatmada geri yüklenmek üzere diske sabit boyutlu ikili anlık
+görüntü olarak yazılır.
+"""
+
+import logging
+import os
+import struct
+from typing import Dict, Optional, Tuple
+
+from can_gateway import STATUS_CODES, STATUS_NAMES
+
+logger = logging.getLogger(__name__)
+
+# Anlık görüntü: başlık (magic, sürüm, sonraki transaction ID, kayıt sayısı) + connector başına kayıt
+SNAPSHOT_MAGIC = b'CPST'
+SNAPSHOT_VERSION = 1
+_HEADER = struct.Struct('<4sBIH')
+# connector_id, durum kodu (CAN StatusNotification kodu), transaction_id (0 = yok), enerji (Wh), id_tag
+_ID_TAG_SIZE = 20  # OCPP IdToken: CiString20
+_RECORD = struct.Struct(f'<HBIQ{_ID_TAG_SIZE}s')
+# CAN RemoteStopTransaction frame'inde transaction ID 4 byte
+MAX_TRANSACTION_ID = 0xFFFFFFFF
+
+
+class ConnectorState:
+    """Tek connector'ün durumu ve (varsa) süren transaction'ı"""
+    
+    __slots__ = ('connector_id', 'status', 'transaction_id', 'id_tag', 'energy')
+    
+    def __init__(self, connector_id: int, status: str = 'Available', transaction_id: Optional[int] = None,
+                 id_tag: Optional[str] = None, energy: int = 0):
+        self.connector_id = connector_id
+        self.status = status
+        self.transaction_id = transaction_id
+        self.id_tag = id_tag
+        self.energy = energy
+        
+    def __repr__(self) -> str:
+        return (f"ConnectorState({self.connector_id}, {self.status}, "
+                f"transaction={self.transaction_id}, energy={self.energy})")
+
+
+class ConnectorStore:
+    """
+    Connector ve transaction durumu deposu
+    
+    `connectors` connector ID → kayıt, transaction indeksi transaction ID →
+    kayıt eşlemesidir; ikisi de dict olduğundan RemoteStopTransaction araması
+    connector sayısından bağımsızdır. Transaction ID'leri 1'den başlayıp artar
+    ve 32 bit sınırına kadar tekrar kullanılmaz; anlık görüntü varsa sayaç
+    oradan devam eder.
+    
+    Anlık görüntü transaction başlangıç/bitişinde ve `save()` ile yazılır
+    (geçici dosya + `os.replace`, yarım yazılmış dosya bırakmaz). Sayaç
+    örnekleri her seferinde diske yazılmaz; enerji değeri son kayıttaki
+    haliyle geri gelir ve charger'ın ilk MeterValues frame'inde güncellenir.
+    
+    Örnek:
+        store = ConnectorStore(2, snapshot_path='CP_001.state')
+        transaction_id = store.start_transaction(1, 'TAG')
+        connector = store.stop_transaction(transaction_id)
+    """
+    
+    def __init__(self, connectors: int = 1, snapshot_path: Optional[str] = None):
+        """
+        Args:
+            connectors: Connector sayısı (ID'ler 1..N)
+            snapshot_path: Anlık görüntü dosyası (None ise durum yalnızca bellekte)
+        """
+        self.snapshot_path = snapshot_path
+        self.connectors: Dict[int, ConnectorState] = {connector_id: ConnectorState(connector_id)
+                                                      for connector_id in range(1, connectors + 1)}
+        self._by_transaction: Dict[int, ConnectorState] = {}
+        self._next_transaction_id = 1
+        if snapshot_path and os.path.exists(snapshot_path):
+            self._load(snapshot_path)
+            
+    def connector(self, connector_id: int) -> Optional[ConnectorState]:
+        """Connector kaydı (tanımsız connector için None)"""
+        return self.connectors.get(connector_id)
+        
+    def by_transaction(self, transaction_id: int) -> Optional[ConnectorState]:
+        """Transaction'ın sürdüğü connector (O(1); bilinmeyen ID için None)"""
+        return self._by_transaction.get(transaction_id)
+        
+    @property
+    def active_transactions(self) -> int:
+        return len(self._by_transaction)
+        
+    def next_transaction_id(self) -> int:
+        """Tekil, monoton artan transaction ID üret"""
+        transaction_id = self._next_transaction_id
+        # 32 bit sınırına gelinirse başa dön; hâlâ süren bir ID atlanır
+        self._next_transaction_id = transaction_id % MAX_TRANSACTION_ID + 1
+        while self._next_transaction_id in self._by_transaction:
+            self._next_transaction_id = self._next_transaction_id % MAX_TRANSACTION_ID + 1
+        return transaction_id
+        
+    def start_transaction(self, connector_id: int, id_tag: Optional[str] = None,
+                          status: str = 'Charging') -> Optional[int]:
+        """
+        Connector'de transaction başlat
+        
+        Returns:
+            Yeni transaction ID; connector tanımsız veya zaten transaction sürüyorsa None
+        """
+        connector = self.connectors.get(connector_id)
+        if connector is None or connector.transaction_id is not None:
+            return None
+        transaction_id = self.next_transaction_id()
+        connector.transaction_id = transaction_id
+        connector.id_tag = id_tag
+        connector.status = status
+        self._by_transaction[transaction_id] = connector
+        self._save_if_enabled()
+        return transaction_id
+        
+    def stop_transaction(self, transaction_id: int, status: str = 'Available') -> Optional[ConnectorState]:
+        """
+        Transaction'ı bitir
+        
+        Returns:
+            Transaction'ın sürdüğü connector; bilinmeyen ID için None
+        """
+        connector = self._by_transaction.pop(transaction_id, None)
+        if connector is None:
+            return None
+        connector.transaction_id = None
+        connector.id_tag = None
+        connector.status = status
+        self._save_if_enabled()
+        return connector
+        
+    def _save_if_enabled(self):
+        if self.snapshot_path:
+            self.save()
+            
+    def save(self, path: Optional[str] = None):
+        """Anlık görüntüyü atomik olarak yaz"""
+        path = path or self.snapshot_path
+        if not path:
+            return
+        records = [_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, self._next_transaction_id, len(self.connectors))]
+        for connector in self.connectors.values():
+            records.append(_RECORD.pack(connector.connector_id, STATUS_CODES.get(connector.status, 0),
+                                        connector.transaction_id or 0, connector.energy,
+                                        (connector.id_tag or '').encode()[:_ID_TAG_SIZE]))
+        temporary = f"{path}.tmp"
+        try:
+            with open(temporary, 'wb') as f:
+                f.write(b''.join(records))
+            os.replace(temporary, path)
+        except OSError as e:
+            logger.error(f"Connector anlık görüntüsü yazılamadı ({path}): {e}")
+            
+    def _load(self, path: str):
+        """Anlık görüntüyü geri yükle (bozuk/uyumsuz dosya yok sayılır)"""
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            magic, version, next_transaction_id, count = _HEADER.unpack_from(data)
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                raise ValueError(f"tanınmayan biçim ({magic!r}, sürüm {version})")
+            records = [_RECORD.unpack_from(data, _HEADER.size + index * _RECORD.size) for index in range(count)]
+        except (OSError, struct.error, ValueError) as e:
+            logger.warning(f"Connector anlık görüntüsü yüklenemedi ({path}), boş durumla başlanıyor: {e}")
+            return
+            
+        self._next_transaction_id = next_transaction_id or 1
+        restored, skipped = self._restore(records)
+        logger.info(f"Connector anlık görüntüsü yüklendi ({path}): {restored} connector, "
+                    f"{self.active_transactions} süren transaction, sonraki transaction ID "
+                    f"{self._next_transaction_id}" + (f" ({skipped} tanımsız connector atlandı)" if skipped else ""))
+                    
+    def _restore(self, records) -> Tuple[int, int]:
+        restored = skipped = 0
+        for connector_id, status_code, transaction_id, energy, id_tag in records:
+            connector = self.connectors.get(connector_id)
+            if connector is None:
+                # Connector sayısı azaltılmış; o connector'deki transaction geri gelmez
+                skipped += 1
+                continue
+            connector.status = STATUS_NAMES.get(status_code, 'Available')
+            connector.energy = energy
+            if transaction_id:
+                connector.transaction_id = transaction_id
+                connector.id_tag = id_tag.rstrip(b'\x00').decode(errors='replace') or None
+                self._by_transaction[transaction_id] = connector
+            restored += 1
+        return restored, skipped
@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+"""
+Charge Point Filo Simülatörü (CSMS Yük Testi)
+Tek asyncio sürecinde binlerce ChargePointSimulator çalıştırır; her CP
+senaryodaki zamanlamayla Boot/Status/MeterValues/Heartbeat gönderir. Yük
+birden fazla sürece bölünebilir, sonuçlar ortak bir CSV/JSON özetinde toplanır.
+"""
+
+import asyncio
+import csv
+import json
+import logging
+import multiprocessing as mp
+import os
+import queue
+import random
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import websockets
+from ocpp.v16 import call
+
+from cp_simulator import OCPP_STATUS, ChargePointSimulator, meter_value_entry
+from hotpath_logging import ASYNC_LOGGING_ENABLED, setup_async_logging
+from latency_histogram import OCPP_LATENCY_BUCKETS, LatencyHistogram
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Aynı anda devam eden en fazla WebSocket el sıkışması (CSMS'i bağlantı fırtınasından korur)
+DEFAULT_CONNECT_CONCURRENCY = 200
+# İlerleme logu aralığı (saniye)
+PROGRESS_INTERVAL = 10.0
+# CSV özet sütunları (işlem başına bir satır)
+CSV_FIELDS = ('finished', 'label', 'charge_points', 'action', 'sent', 'ok', 'call_errors', 'timeouts',
+              'failed', 'mean_ms', 'p50_ms', 'p99_ms', 'max_ms')
+# Status senaryosunda connector'ların döndüğü durumlar
+STATUS_CYCLE = ('Preparing', 'Charging', 'Finishing', 'Available')
+
+
+class FleetScript:
+    """CP başına zamanlama senaryosu (tüm süreler saniye)"""
+    
+    FIELDS = ('connectors', 'heartbeat_interval', 'meter_interval', 'status_interval', 'ramp_up',
+              'reconnect_delay', 'charge_power', 'call_timeout')
+              
+    def __init__(self, connectors: int = 2, heartbeat_interval: float = 300.0, meter_interval: float = 60.0,
+                 status_interval: float = 0.0, ramp_up: float = 60.0, reconnect_delay: float = 5.0,
+                 charge_power: float = 7400.0, call_timeout: float = 30.0):
+        """
+        Args:
+            connectors: CP başına connector sayısı
+            heartbeat_interval: Heartbeat aralığı (0 = gönderme)
+            meter_interval: Connector başına MeterValues aralığı (0 = gönderme)
+            status_interval: Connector durum değişimi aralığı (0 = yalnızca açılışta)
+            ramp_up: Tüm CP'lerin bağlanmasının yayılacağı süre
+            reconnect_delay: Bağlantı koptuğunda ortalama yeniden bağlanma gecikmesi
+            charge_power: Enerji sayacının artış hızı (W)
+            call_timeout: OCPP çağrı yanıt zaman aşımı
+        """
+        self.connectors = connectors
+        self.heartbeat_interval = heartbeat_interval
+        self.meter_interval = meter_interval
+        self.status_interval = status_interval
+        self.ramp_up = ramp_up
+        self.reconnect_delay = reconnect_delay
+        self.charge_power = charge_power
+        self.call_timeout = call_timeout
+        
+    @classmethod
+    def from_dict(cls, values: Dict[str, Any]) -> 'FleetScript':
+        """JSON senaryo dosyası / CLI seçeneklerinden (bilinmeyen anahtarlar hata)"""
+        unknown = set(values) - set(cls.FIELDS)
+        if unknown:
+            raise ValueError(f"Bilinmeyen senaryo alanları: {sorted(unknown)}")
+        script = cls()
+        for field, value in values.items():
+            setattr(script, field, type(getattr(script, field))(value))
+        return script
+        
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+class CallStats:
+    """Tek OCPP işlemi (veya bağlantı) için sayaçlar ve gidiş-dönüş gecikmesi"""
+    
+    __slots__ = ('sent', 'ok', 'call_errors', 'timeouts', 'failed', 'latency')
+    
+    def __init__(self):
+        self.sent = 0
+        self.ok = 0
+        self.call_errors = 0  # CSMS CALLERROR döndü
+        self.timeouts = 0
+        self.failed = 0  # Bağlantı hatası vb.
+        self.latency = LatencyHistogram(OCPP_LATENCY_BUCKETS)
+        
+    def merge(self, other: 'CallStats'):
+        for field in ('sent', 'ok', 'call_errors', 'timeouts', 'failed'):
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        self.latency.merge(other.latency)
+        
+    def to_dict(self) -> Dict[str, Any]:
+        latency = self.latency
+        return {
+            'sent': self.sent,
+            'ok': self.ok,
+            'call_errors': self.call_errors,
+            'timeouts': self.timeouts,
+            'failed': self.failed,
+            'mean_ms': round(latency.total_ns / latency.count / 1e6, 3) if latency.count else 0,
+            # Yüzdelikler kova üst sınırıdır; gözlenen en büyük değerle sınırlanır
+            'p50_ms': round(latency.percentile(50) / 1e6, 3),
+            'p99_ms': round(latency.percentile(99) / 1e6, 3),
+            'max_ms': round(latency.max_ns / 1e6, 3),
+        }
+
+
+class FleetStats:
+    """Filo (veya shard) sonuçları - süreçler arası taşınabilir ve birleştirilebilir"""
+    
+    def __init__(self, charge_points: int = 0):
+        self.charge_points = charge_points
+        self.calls: Dict[str, CallStats] = {}
+        self.active = 0
+        self.peak_active = 0
+        self.disconnects = 0
+        
+    def action(self, name: str) -> CallStats:
+        stats = self.calls.get(name)
+        if stats is None:
+            stats = self.calls[name] = CallStats()
+        return stats
+        
+    def connected(self):
+        self.active += 1
+        if self.active > self.peak_active:
+            self.peak_active = self.active
+            
+    def disconnected(self):
+        self.active -= 1
+        self.disconnects += 1
+        
+    def merge(self, other: 'FleetStats'):
+        """Başka bir shard'ın sonuçlarını ekle (tepe değerleri eşzamanlı kabul edilip toplanır)"""
+        self.charge_points += other.charge_points
+        self.active += other.active
+        self.peak_active += other.peak_active
+        self.disconnects += other.disconnects
+        for name, stats in other.calls.items():
+            self.action(name).merge(stats)
+            
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'charge_points': self.charge_points,
+            'active_connections': self.active,
+            'peak_connections': self.peak_active,
+            'disconnects': self.disconnects,
+            'calls': {name: stats.to_dict() for name, stats in sorted(self.calls.items())},
+        }
+        
+    def rows(self, label: str) -> List[Dict[str, Any]]:
+        """CSV özet satırları (işlem başına bir satır)"""
+        finished = datetime.utcnow().isoformat()
+        return [{'finished': finished, 'label': label, 'charge_points': self.charge_points, 'action': name,
+                 **stats.to_dict()} for name, stats in sorted(self.calls.items())]
+
+
+class ChargePointFleet:
+    """
+    Tek event loop'ta çalışan CP filosu
+    
+    Her CP kendi WebSocket bağlantısı ve ChargePointSimulator nesnesiyle (CAN'sız
+    mod) çalışır; senaryo zamanlayıcıları CP başına tek bir görevde tutulur.
+    Zamanlayıcılar CP başına rastgele fazla başlar, bağlantılar `ramp_up`
+    süresine yayılır; böylece CSMS senkronize patlamalar yerine gerçekçi,
+    düzgün bir yük görür. Bağlantı koparsa CP gecikmeli olarak yeniden bağlanıp
+    yeniden BootNotification gönderir.
+    
+    WebSocket sıkıştırması kapalıdır: permessage-deflate bağlantı başına zlib
+    durumu tutar ve 10k bağlantıda belleğin büyük kısmını oluşturur.
+    
+    Örnek:
+        fleet = ChargePointFleet('ws://localhost:9000', count=1000, script=FleetScript(connectors=2))
+        stats = await fleet.run(duration=600)
+    """
+    
+    def __init__(self, csms_url: str, count: int, script: Optional[FleetScript] = None, first_index: int = 1,
+                 id_prefix: str = 'FLEET', connect_concurrency: int = DEFAULT_CONNECT_CONCURRENCY,
+                 label: str = 'fleet'):
+        """
+        Args:
+            csms_url: CSMS WebSocket adresi
+            count: Bu süreçteki CP sayısı
+            script: Zamanlama senaryosu
+            first_index: İlk CP numarası (CP ID'leri {id_prefix}_{numara})
+            id_prefix: CP ID öneki
+            connect_concurrency: Eşzamanlı el sıkışma sınırı
+            label: Log ve özetlerde shard adı
+        """
+        self.csms_url = csms_url.rstrip('/')
+        self.count = count
+        self.script = script or FleetScript()
+        self.first_index = first_index
+        self.id_prefix = id_prefix
+        self.label = label
+        self.stats = FleetStats(count)
+        self._connect_slots = asyncio.Semaphore(connect_concurrency)
+        self._random = random.Random(first_index)
+        self.running = False
+        
+    async def run(self, duration: float = 0.0) -> FleetStats:
+        """
+        Filoyu çalıştır
+        
+        Args:
+            duration: Çalışma süresi (saniye; 0 = iptal edilene kadar)
+        """
+        self.running = True
+        tasks = [asyncio.create_task(self._run_charge_point(self.first_index + offset,
+                                                            offset * self.script.ramp_up / self.count))
+                 for offset in range(self.count)]
+        progress = asyncio.create_task(self._log_progress())
+        logger.info(f"[{self.label}] {self.count} CP başlatılıyor ({self.id_prefix}_{self.first_index:05d}..), "
+                    f"senaryo: {self.script.to_dict()}")
+        try:
+            if duration:
+                await asyncio.sleep(duration)
+            else:
+                await asyncio.gather(*tasks)
+        finally:
+            self.running = False
+            progress.cancel()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, progress, return_exceptions=True)
+        return self.stats
+        
+    async def _run_charge_point(self, index: int, start_delay: float):
+        """Tek CP'nin yaşam döngüsü: bağlan, senaryoyu çalıştır, koparsa yeniden bağlan"""
+        cp_id = f"{self.id_prefix}_{index:05d}"
+        script = self.script
+        await asyncio.sleep(start_delay)
+        while self.running:
+            connect = self.stats.action('Connect')
+            connect.sent += 1
+            started = time.perf_counter_ns()
+            try:
+                async with self._connect_slots:
+                    ws = await websockets.connect(f"{self.csms_url}/{cp_id}", subprotocols=['ocpp1.6'],
+                                                  compression=None, open_timeout=script.call_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                connect.failed += 1
+                logger.debug(f"[{cp_id}] bağlantı hatası: {e}")
+            else:
+                connect.ok += 1
+                connect.latency.record(time.perf_counter_ns() - started)
+                await self._session(cp_id, ws)
+            if self.running:
+                await asyncio.sleep(script.reconnect_delay * self._random.uniform(0.5, 1.5))
+                
+    async def _session(self, cp_id: str, ws):
+        """Tek bağlantı süresince OCPP alım döngüsü ve senaryo"""
+        cp = ChargePointSimulator(cp_id, ws, can_bus=None, connectors=self.script.connectors)
+        cp._response_timeout = self.script.call_timeout
+        self.stats.connected()
+        receiver = asyncio.create_task(cp.start())
+        scenario = asyncio.create_task(self._scenario(cp))
+        try:
+            # Bağlantı koparsa alım döngüsü biter; yanıt beklenen çağrılar zaman aşımını beklemez
+            await asyncio.wait((receiver, scenario), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            receiver.cancel()
+            scenario.cancel()
+            await asyncio.gather(receiver, scenario, return_exceptions=True)
+            cp.stop()
+            self.stats.disconnected()
+            await ws.close()
+            
+    async def _call(self, action: str, request) -> bool:
+        """OCPP çağrısını zamanla ve sonucunu say"""
+        stats = self.stats.action(action)
+        stats.sent += 1
+        started = time.perf_counter_ns()
+        try:
+            response = await request
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            return False
+        except websockets.ConnectionClosed:
+            stats.failed += 1
+            raise
+        except Exception as e:
+            stats.failed += 1
+            logger.debug(f"{action} hatası: {e}")
+            return False
+        if response is None:
+            stats.call_errors += 1
+            return False
+        stats.ok += 1
+        stats.latency.record(time.perf_counter_ns() - started)
+        return True
+        
+    async def _scenario(self, cp: ChargePointSimulator):
+        """Boot + connector durumları, ardından periyodik Heartbeat/MeterValues/Status"""
+        script = self.script
+        if not await self._call('BootNotification', cp.send_boot_notification()):
+            return
+        for connector_id, connector in cp.connectors.items():
+            await self._call('StatusNotification', self._status_request(cp, connector_id, connector.status))
+            
+        # Zamanlayıcılar: (sonraki zaman, aralık, işlem); ilk çalışma rastgele fazda
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        timers = [[now + interval * self._random.random(), interval, action]
+                  for interval, action in ((script.heartbeat_interval, self._heartbeat),
+                                           (script.meter_interval, self._meter_values),
+                                           (script.status_interval, self._next_status))
+                  if interval > 0]
+        if not timers:
+            await asyncio.Future()  # Yalnızca bağlantıyı açık tut
+        while self.running:
+            timer = min(timers, key=lambda entry: entry[0])
+            delay = timer[0] - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            timer[0] += timer[1]
+            await timer[2](cp)
+            
+    def _status_request(self, cp: ChargePointSimulator, connector_id: int, status: str):
+        return cp.outbox.call(call.StatusNotification(connector_id=connector_id, error_code='NoError',
+                                                      status=OCPP_STATUS[status]))
+                                               
+    async def _heartbeat(self, cp: ChargePointSimulator):
+        await self._call('Heartbeat', cp.send_heartbeat())
+        
+    async def _meter_values(self, cp: ChargePointSimulator):
+        # Yük üretimi için sayaç her örnekte senaryodaki güçle artar
+        increment = int(self.script.charge_power * self.script.meter_interval / 3600)
+        for connector_id, connector in cp.connectors.items():
+            connector.energy += increment
+            await self._call('MeterValues', cp.outbox.call(call.MeterValues(
+                connector_id=connector_id, meter_value=[meter_value_entry(connector.energy)])))
+                
+    async def _next_status(self, cp: ChargePointSimulator):
+        for connector_id, connector in cp.connectors.items():
+            current = connector.status
+            status = STATUS_CYCLE[(STATUS_CYCLE.index(current) + 1) % len(STATUS_CYCLE)] \
+                if current in STATUS_CYCLE else STATUS_CYCLE[0]
+            connector.status = status
+            await self._call('StatusNotification', self._status_request(cp, connector_id, status))
+            
+    async def _log_progress(self):
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            stats = self.stats
+            calls = ', '.join(f"{name}: {s.ok}/{s.sent} p99={s.latency.percentile(99) / 1e6:.0f}ms"
+                              for name, s in sorted(stats.calls.items()))
+            logger.info(f"[{self.label}] aktif bağlantı: {stats.active}/{self.count}, "
+                        f"kopma: {stats.disconnects}, {calls}")
+
+
+def shard_range(count: int, shard: int, shards: int) -> Tuple[int, int]:
+    """CP'leri shard'lara dengeli böl: (ilk CP numarası, CP sayısı)"""
+    base, extra = divmod(count, shards)
+    first = shard * base + min(shard, extra)
+    return first + 1, base + (1 if shard < extra else 0)
+
+
+def raise_fd_limit():
+    """Açık dosya sınırını hard limite çıkar (CP başına bir soket)"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError) as e:
+            logger.warning(f"Dosya sınırı artırılamadı ({soft}): {e}")
+
+
+def _quiet_charge_point_logs(verbose: bool):
+    """CP başına loglar (BootNotification yanıtı, OCPP → CAN dönüşümü, bağlantı durumu, CALLERROR uyarıları)
+    yük testinde kapatılır; bunlar zaten FleetStats'te sayılır"""
+    if not verbose:
+        for name in ('cp_simulator', 'can_gateway', 'ocpp_outbox', 'ocpp'):
+            logging.getLogger(name).setLevel(logging.ERROR)
+
+
+def _shard_main(csms_url: str, shard: int, shards: int, count: int, first_index: int, script: Dict[str, Any],
+                id_prefix: str, duration: float, connect_concurrency: int, verbose: bool, results):
+    """Shard süreci: kendi CP aralığını çalıştır, sonuçları ana sürece gönder"""
+    _quiet_charge_point_logs(verbose)
+    raise_fd_limit()
+    first, shard_count = shard_range(count, shard, shards)
+    fleet = ChargePointFleet(csms_url, shard_count, FleetScript.from_dict(script),
+                             first_index=first_index + first - 1,
+                             id_prefix=id_prefix, connect_concurrency=connect_concurrency,
+                             label=f"shard {shard}/{shards}")
+    try:
+        asyncio.run(fleet.run(duration))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        results.put((shard, fleet.stats))
+
+
+def run_sharded(csms_url: str, count: int, script: FleetScript, processes: int, first_index: int = 1,
+                id_prefix: str = 'FLEET', duration: float = 0.0,
+                connect_concurrency: int = DEFAULT_CONNECT_CONCURRENCY,
+                verbose: bool = False) -> Dict[int, FleetStats]:
+    """
+    Filoyu `processes` sürece böl ve shard sonuçlarını topla
+    
+    Ctrl+C tüm süreçlere gider; her shard kendi sonucunu gönderip çıkar.
+    
+    Args:
+        first_index: Filonun ilk CP numarası (süreçler ardışık aralıklar alır)
+        
+    Returns:
+        shard → FleetStats
+    """
+    ctx = mp.get_context('spawn')
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_shard_main, name=f"fleet-shard-{shard}", daemon=True,
+                           args=(csms_url, shard, processes, count, first_index, script.to_dict(), id_prefix, duration,
+                                 connect_concurrency, verbose, results))
+               for shard in range(processes)]
+    for worker in workers:
+        worker.start()
+    collected: Dict[int, FleetStats] = {}
+    while len(collected) < processes:
+        try:
+            shard, stats = results.get(timeout=1.0)
+            collected[shard] = stats
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                break
+        except KeyboardInterrupt:
+            continue
+    for worker in workers:
+        worker.join(timeout=5)
+    missing = set(range(processes)) - set(collected)
+    if missing:
+        logger.error(f"Sonuç göndermeyen shard'lar: {sorted(missing)}")
+    return collected
+
+
+def write_summary(path: str, label: str, total: FleetStats, shards: Dict[int, FleetStats],
+                  script: FleetScript, csms_url: str):
+    """
+    Özeti yaz
+    
+    `.csv`: satırlar dosyanın sonuna eklenir (ayrı makinelerde/başlatmalarda
+    çalışan shard'lar aynı dosyada birleşir; başlık yalnızca yeni dosyaya
+    yazılır). Diğer uzantılar: tek JSON belgesi (toplam + shard başına).
+    """
+    if path.endswith('.csv'):
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        with open(path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            if new_file:
+                writer.writeheader()
+            writer.writerows(total.rows(label))
+    else:
+        summary = {
+            'finished': datetime.utcnow().isoformat(),
+            'label': label,
+            'csms_url': csms_url,
+            'script': script.to_dict(),
+            'total': total.to_dict(),
+            'shards': {str(shard): stats.to_dict() for shard, stats in sorted(shards.items())},
+        }
+        with open(path, 'w') as f:
+            json.dump(summary, f, indent=2)
+    logger.info(f"Özet yazıldı: {path}")
+
+
+def main():
+    """Ana fonksiyon"""
+    import sys
+    
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:] if arg.startswith('--') and '=' in arg)
+    positional = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    csms_url = positional[0] if positional else "ws://localhost:9000"
+    count = int(options.pop('count', 100))
+    processes = int(options.pop('processes', 1))
+    shard, shards = map(int, options.pop('shard', '0/1').split('/'))
+    id_prefix = options.pop('prefix', 'FLEET')
+    duration = float(options.pop('duration', 0))
+    connect_concurrency = int(options.pop('connect-concurrency', DEFAULT_CONNECT_CONCURRENCY))
+    output = options.pop('output', None)
+    verbose = '--verbose' in sys.argv
+    
+    script_values = {}
+    if 'script' in options:
+        with open(options.pop('script')) as f:
+            script_values.update(json.load(f))
+    script_values.update({key.replace('-', '_'): value for key, value in options.items()})
+    script = FleetScript.from_dict(script_values)
+    
+    # --shard=i/n: ayrı başlatmalar (ör. farklı makineler) için toplam filonun i. dilimi;
+    # --processes=N: bu dilim ayrıca N sürece bölünür
+    first, shard_count = shard_range(count, shard, shards)
+    label = f"{id_prefix} {shard}/{shards}"
+    logger.info(f"CP filosu: {shard_count} CP ({first}..{first + shard_count - 1}), {processes} süreç, "
+                f"CSMS: {csms_url}")
+                
+    _quiet_charge_point_logs(verbose)
+    if processes > 1:
+        results = run_sharded(csms_url, shard_count, script, processes, first_index=first, id_prefix=id_prefix,
+                              duration=duration, connect_concurrency=connect_concurrency, verbose=verbose)
+    else:
+        raise_fd_limit()
+        fleet = ChargePointFleet(csms_url, shard_count, script, first_index=first, id_prefix=id_prefix,
+                                 connect_concurrency=connect_concurrency, label=label)
+        try:
+            asyncio.run(fleet.run(duration))
+        except KeyboardInterrupt:
+            logger.info("Filo durduruluyor...")
+        results = {shard: fleet.stats}
+        
+    total = FleetStats()
+    for stats in results.values():
+        total.merge(stats)
+    for name, stats in total.to_dict()['calls'].items():
+        logger.info(f"  {name:<20} gönderilen: {stats['sent']}, başarılı: {stats['ok']}, "
+                    f"CALLERROR: {stats['call_errors']}, zaman aşımı: {stats['timeouts']}, hata: {stats['failed']}, "
+                    f"p50/p99: {stats['p50_ms']:.1f}/{stats['p99_ms']:.1f} ms")
+    if output:
+        write_summary(output, label, total, results, script, csms_url)
+
+
+if __name__ == "__main__":
+    # Kullanım: python cp_fleet.py ws://localhost:9000 --count=10000 --processes=4 --connectors=2
+    #           [--meter-interval=60] [--heartbeat-interval=300] [--status-interval=0] [--ramp-up=60]
+    #           [--script=senaryo.json] [--duration=600] [--shard=0/2] [--output=sonuc.csv] [--verbose]
+    listener = setup_async_logging() if ASYNC_LOGGING_ENABLED else None
+    try:
+        main()
+    finally:
+        if listener:
+            listener.stop()
@@ -13,37 +13,134 @@ from ocpp.v16.enums import Action, RegistrationStatus, ChargePointStatus
 from ocpp.routing import on
 from ocpp.v16 import call_result, call
 import can
+from types import MappingProxyType
+from typing import Optional
+from can_constants import MALICIOUS_CAN_ID, STANDARD_ID_MASK, can_filters_for
 from can_gateway import CANGateway
+from async_can import AsyncCANReader, AsyncCANWriter
+from can_hub import CANHub
+from connector_store import ConnectorStore
+from hotpath_logging import FrameTracer, ASYNC_LOGGING_ENABLED, setup_async_logging
+from meter_coalescer import DEFAULT_METER_WINDOW, MeterValueCoalescer
+from ocpp_outbox import DEFAULT_MAX_IN_FLIGHT, OCPPOutbox
+
+# Bağlantı koptuğunda yeniden bağlanma gecikmesi (saniye)
+RECONNECT_DELAY = 5.0
+
+# OCPP durum adı → ChargePointStatus enum (ör. 'Charging' → ChargePointStatus.charging)
+OCPP_STATUS = MappingProxyType({status.value: status for status in ChargePointStatus})
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
+_trace_rx = FrameTracer(logger, "[%s] CAN mesajı alındı: ID=0x%x, Data=%s")
+_trace_tx = FrameTracer(logger, "[%s] CAN mesajı gönderildi: ID=0x%x, Data=%s")
+
+
+def meter_value_entry(energy: int, timestamp: Optional[str] = None) -> dict:
+    """Tek enerji okuması için OCPP `meter_value` öğesi"""
+    return {
+        'timestamp': timestamp or datetime.utcnow().isoformat(),
+        'sampledValue': [{
+            'value': str(energy),
+            'context': 'Sample.Periodic',
+            'format': 'Raw',
+            'measurand': 'Energy.Active.Import.Register',
+            'unit': 'Wh'
+        }]
+    }
 
 
 class ChargePointSimulator(CP):
     """Charge Point simülatörü - OCPP ve CAN entegrasyonu"""
     
-    def __init__(self, id: str, connection, can_bus: str = 'vcan0', compromised: bool = False):
+    def __init__(self, id: str, connection, can_bus: Optional[str] = 'vcan0', compromised: bool = False,
+                 dbc: Optional[str] = None, hub: Optional[CANHub] = None, connectors: int = 1,
+                 meter_window: float = DEFAULT_METER_WINDOW, offline_path: Optional[str] = None,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, state_path: Optional[str] = None):
+        """
+        Args:
+            id: Charge Point ID
+            connection: CSMS WebSocket bağlantısı
+            can_bus: CAN arayüzü (None ve hub yoksa yalnızca OCPP; filo/yük testi modu)
+            compromised: Firmware compromise simülasyonu
+            dbc: Frame düzenleri için DBC dosyası
+            hub: Paylaşılan CANHub
+            connectors: Connector sayısı (ID'ler 1..N)
+            meter_window: MeterValues birleştirme penceresi (saniye; 0 = her örnek ayrı çağrı)
+            offline_path: Bağlantı yokken işlem mesajlarının yazılacağı tampon dosyası
+            max_in_flight: Giden çağrı hattındaki eşzamanlı gönderici sayısı
+            state_path: Connector/transaction anlık görüntü dosyası (yeniden başlatmada geri yüklenir)
+        """
         super().__init__(id, connection)
         self.id = id
         self.can_bus_name = can_bus
         self.can_bus = None
-        self.gateway = CANGateway(whitelist_enabled=False)
-        self.connectors = {1: {'status': 'Available', 'transaction_id': None, 'energy': 0}}
+        self.hub = hub  # Verilirse kendi soketi yerine paylaşılan hub kullanılır
+        self.can_reader: Optional[AsyncCANReader] = None
+        # OCPP handler'ları CAN'a doğrudan yazmaz; tek TX görevi sınırlı kuyruktan yazar
+        self.can_writer: Optional[AsyncCANWriter] = None
+        # Donanım varyantına göre frame düzeni DBC'den yüklenebilir
+        self.gateway = CANGateway.from_dbc(dbc) if dbc else CANGateway(whitelist_enabled=False)
+        self._meter_values_id = self.gateway.CAN_IDS['MeterValues']
+        self._status_notification_id = self.gateway.CAN_IDS['StatusNotification']
+        # CP yalnızca charger'dan gelen frame'leri tüketir (kendi 0x200/0x201/0x210 gönderimleri hariç)
+        self.consumed_can_ids = (self._meter_values_id, self._status_notification_id)
+        # Connector/transaction durumu; transaction ID'ye göre O(1) indeksli
+        self.store = ConnectorStore(connectors, snapshot_path=state_path)
+        self.connectors = self.store.connectors
+        # CSMS'e giden çağrılar öncelik şeritli hattan; bağlantı yokken offline tampona
+        self.outbox = OCPPOutbox(self, max_in_flight=max_in_flight, offline_path=offline_path)
+        # 0x300 örnekleri connector başına birleştirilip arka planda gönderilir
+        self.meter_coalescer = MeterValueCoalescer(self._send_meter_values, window=meter_window, name=id)
         self.compromised = compromised  # Firmware compromise simülasyonu
         self.running = False
         
     async def start(self):
-        """CP'yi başlat - CAN bus bağlantısını kur"""
+        """
+        CP'yi başlat - CAN bus bağlantısını kur ve OCPP mesajlarını dinle
+        
+        Bağlantı kopunca döner (ConnectionClosed); `reconnect` sonrası tekrar
+        çağrılabilir, CAN tarafı yalnızca ilk çağrıda kurulur.
+        """
+        if not self.running:
+            self._start_can()
+            self.running = True
+        self.outbox.set_online()
+        try:
+            # OCPP mesajlarını dinle
+            await super().start()
+        except Exception:
+            # Bağlantı koptu: giden çağrılar bağlantı gelene kadar offline tampona/kuyruğa
+            self.outbox.set_offline()
+            raise
+            
+    def reconnect(self, connection):
+        """Yeni CSMS bağlantısını kullan (ardından start() tekrar çağrılır)"""
+        self._connection = connection
+        # start() görevi çalışmadan gönderilen BootNotification'ın reddedilmemesi için
+        self.outbox.set_online()
+        
+    def _start_can(self):
+        """CAN bus bağlantısını ve dinleyiciyi kur (hub yoksa ve can_bus None ise CAN'sız mod)"""
+        if not self.hub and self.can_bus_name is None:
+            return
         try:
-            self.can_bus = can.interface.Bus(self.can_bus_name, bustype='socketcan')
+            if self.hub:
+                # Hub aboneliği hem okuyucu hem bus (send/shutdown) arayüzünü sunar
+                self.can_reader = self.hub.subscribe(self.id, can_ids=self.consumed_can_ids)
+                self.can_bus = self.can_reader
+            else:
+                self.can_bus = can.interface.Bus(self.can_bus_name, bustype='socketcan',
+                                                 can_filters=can_filters_for(self.consumed_can_ids))
             logger.info(f"[{self.id}] CAN bus bağlantısı kuruldu: {self.can_bus_name}")
-            self.running = True
             
-            # CAN mesajlarını dinle
+            # CAN mesajlarını dinle (Notifier + sınırlı kuyruk, event loop bloklanmaz)
+            if not self.hub:
+                self.can_reader = AsyncCANReader(self.can_bus, name=self.id)
+                self.can_reader.start()
+            self.can_writer = AsyncCANWriter(self.can_bus, name=self.id)
+            self.can_writer.start()
             asyncio.create_task(self._listen_can_messages())
-            
-            # OCPP mesajlarını dinle
-            await super().start()
         except Exception as e:
             logger.error(f"[{self.id}] CAN bus bağlantı hatası: {e}")
             logger.info("vcan0 oluşturulmuş mu kontrol edin: sudo ./setup_vcan.sh")
@@ -55,13 +152,10 @@ class ChargePointSimulator(CP):
         
         while self.running:
             try:
-                # CAN mesajını al (non-blocking)
-                msg = self.can_bus.recv(timeout=0.1)
-                if msg:
-                    await self._handle_can_message(msg)
-            except can.CanError as e:
-                if self.running:
-                    logger.error(f"[{self.id}] CAN hata: {e}")
+                msg = await self.can_reader.recv()
+                if msg is None:
+                    break
+                await self._handle_can_message(msg)
             except Exception as e:
                 if self.running:
                     logger.error(f"[{self.id}] CAN dinleme hatası: {e}")
@@ -71,65 +165,72 @@ class ChargePointSimulator(CP):
         can_id = msg.arbitration_id
         payload = msg.data
         
-        logger.info(f"[{self.id}] CAN mesajı alındı: ID={hex(can_id)}, Data={payload.hex()}")
+        _trace_rx(self.id, can_id, payload)
         
         # MeterValues mesajı (0x300) - charger modülünden gelir
-        if can_id == 0x300:
+        if can_id == self._meter_values_id:
             ocpp_payload = self.gateway.can_to_ocpp(can_id, payload)
             if ocpp_payload:
                 connector_id = ocpp_payload.get('connector_id', 1)
                 energy = ocpp_payload.get('energy', 0)
-                self.connectors[connector_id]['energy'] = energy
+                connector = self.store.connector(connector_id)
+                if connector is None:
+                    logger.warning(f"[{self.id}] Tanımsız connector için MeterValues: {connector_id}")
+                    return
+                connector.energy = energy
                 
-                # CSMS'e MeterValues gönder
-                await self._send_meter_values(connector_id, energy)
+                # CSMS'e MeterValues gönder (pencere sonunda, CAN döngüsünü bekletmeden)
+                self.meter_coalescer.add(connector_id, meter_value_entry(energy))
         
         # StatusNotification mesajı (0x301)
-        elif can_id == 0x301:
+        elif can_id == self._status_notification_id:
             ocpp_payload = self.gateway.can_to_ocpp(can_id, payload)
             if ocpp_payload:
                 connector_id = ocpp_payload.get('connector_id', 1)
                 status = ocpp_payload.get('status', 'Available')
-                self.connectors[connector_id]['status'] = status
+                connector = self.store.connector(connector_id)
+                if connector is None:
+                    logger.warning(f"[{self.id}] Tanımsız connector için StatusNotification: {connector_id}")
+                    return
+                connector.status = status
                 
                 # CSMS'e StatusNotification gönder
                 await self._send_status_notification(connector_id, status)
     
-    async def _send_can_message(self, can_id: int, payload: bytes):
-        """CAN bus üzerine mesaj gönder"""
-        try:
-            msg = can.Message(arbitration_id=can_id, data=payload, is_extended_id=False)
-            self.can_bus.send(msg)
-            logger.info(f"[{self.id}] CAN mesajı gönderildi: ID={hex(can_id)}, Data={payload.hex()}")
-        except Exception as e:
-            logger.error(f"[{self.id}] CAN gönderme hatası: {e}")
+    def _send_can_message(self, can_id: int, payload: bytes) -> bool:
+        """
+        CAN frame'ini TX kuyruğuna koy (beklemez, gönderimi TX görevi yapar)
+        
+        Returns:
+            Kuyruğa alındıysa (veya CAN'sız modda) True; TX kuyruğu doluysa False
+        """
+        if self.can_writer is None:
+            return True
+        # 0x7FF üstü ID 11 bit'e sığmaz: extended gönderilir (can_filters_for ile aynı kural)
+        msg = can.Message(arbitration_id=can_id, data=payload, is_extended_id=can_id > STANDARD_ID_MASK)
+        if not self.can_writer.send_nowait(msg):
+            return False
+        _trace_tx(self.id, can_id, payload)
+        return True
     
-    async def _send_meter_values(self, connector_id: int, energy: int):
-        """CSMS'e MeterValues gönder"""
-        try:
-            meter_value = [{
-                'timestamp': datetime.utcnow().isoformat(),
-                'sampledValue': [{
-                    'value': str(energy),
-                    'context': 'Sample.Periodic',
-                    'format': 'Raw',
-                    'measurand': 'Energy.Active.Import.Register',
-                    'unit': 'Wh'
-                }]
-            }]
-            
-            await self.call(call.MeterValues(
-                connector_id=connector_id,
-                meter_value=meter_value
-            ))
-        except Exception as e:
-            logger.error(f"[{self.id}] MeterValues gönderme hatası: {e}")
+    async def _send_meter_values(self, connector_id: int, meter_value: list):
+        """
+        CSMS'e MeterValues gönder (MeterValueCoalescer tarafından çağrılır)
+        
+        Args:
+            connector_id: Connector
+            meter_value: Birleştirilmiş `meter_value` öğeleri (örnek başına bir öğe)
+        """
+        await self.outbox.call(call.MeterValues(
+            connector_id=connector_id,
+            meter_value=meter_value
+        ))
     
     async def _send_status_notification(self, connector_id: int, status: str):
         """CSMS'e StatusNotification gönder"""
         try:
-            status_enum = ChargePointStatus[status] if hasattr(ChargePointStatus, status) else ChargePointStatus.available
-            await self.call(call.StatusNotification(
+            status_enum = OCPP_STATUS.get(status, ChargePointStatus.available)
+            await self.outbox.call(call.StatusNotification(
                 connector_id=connector_id,
                 error_code='NoError',
                 status=status_enum
@@ -144,26 +245,38 @@ class ChargePointSimulator(CP):
         """RemoteStartTransaction mesajını işle ve CAN'a gönder"""
         logger.info(f"[{self.id}] RemoteStartTransaction alındı - Connector: {connector_id}, Tag: {id_tag}")
         
+        connector = self.store.connector(connector_id)
+        if connector is None or connector.transaction_id is not None:
+            logger.warning(f"[{self.id}] RemoteStartTransaction reddedildi: connector {connector_id} "
+                           f"{'tanımsız' if connector is None else 'meşgul'}")
+            return call_result.RemoteStartTransaction(status='Rejected')
+            
+        # Transaction ID CP'de atanır (tekil, monoton artan) ve 0x200 frame'inde charger'a iletilir
+        previous_status = connector.status
+        transaction_id = self.store.start_transaction(connector_id, id_tag)
+        
         # OCPP → CAN dönüşümü
         can_frame = self.gateway.ocpp_to_can('RemoteStartTransaction', {
             'cp_id': int(self.id.split('_')[-1]) if '_' in self.id else 1,
-            'connector_id': connector_id
+            'connector_id': connector_id,
+            'transaction_id': transaction_id
         })
         
         if can_frame:
             can_id, payload = can_frame
-            asyncio.create_task(self._send_can_message(can_id, payload))
+            if not self._send_can_message(can_id, payload):
+                # Charger komutu almayacak: transaction geri alınır, CSMS'e bildirilir
+                self.store.stop_transaction(transaction_id, status=previous_status)
+                logger.warning(f"[{self.id}] RemoteStartTransaction reddedildi: CAN TX kuyruğu dolu")
+                return call_result.RemoteStartTransaction(status='Rejected')
             
             # Compromised firmware simülasyonu
             if self.compromised:
-                logger.warning(f"[{self.id}] ⚠️ COMPROMISED: Ek CAN frame gönderiliyor (0x9FF)")
+                logger.warning(f"[{self.id}] ⚠️ COMPROMISED: Ek CAN frame gönderiliyor ({hex(MALICIOUS_CAN_ID)})")
                 malicious_payload = b'\xFF' * 8
-                asyncio.create_task(self._send_can_message(0x9FF, malicious_payload))
+                self._send_can_message(MALICIOUS_CAN_ID, malicious_payload)
         
-        # Transaction başlat
-        transaction_id = len(self.connectors) + 1
-        self.connectors[connector_id]['transaction_id'] = transaction_id
-        self.connectors[connector_id]['status'] = 'Charging'
+        logger.info(f"[{self.id}] Transaction başlatıldı - Connector: {connector_id}, Transaction: {transaction_id}")
         
         return call_result.RemoteStartTransaction(status='Accepted')
     
@@ -172,6 +285,11 @@ class ChargePointSimulator(CP):
         """RemoteStopTransaction mesajını işle ve CAN'a gönder"""
         logger.info(f"[{self.id}] RemoteStopTransaction alındı - Transaction: {transaction_id}")
         
+        # Transaction ID indeksinden O(1); bilinmeyen transaction için charger'a komut gönderilmez
+        if self.store.by_transaction(transaction_id) is None:
+            logger.warning(f"[{self.id}] RemoteStopTransaction reddedildi: bilinmeyen transaction {transaction_id}")
+            return call_result.RemoteStopTransaction(status='Rejected')
+            
         # OCPP → CAN dönüşümü
         can_frame = self.gateway.ocpp_to_can('RemoteStopTransaction', {
             'transaction_id': transaction_id
@@ -179,14 +297,11 @@ class ChargePointSimulator(CP):
         
         if can_frame:
             can_id, payload = can_frame
-            asyncio.create_task(self._send_can_message(can_id, payload))
+            if not self._send_can_message(can_id, payload):
+                logger.warning(f"[{self.id}] RemoteStopTransaction reddedildi: CAN TX kuyruğu dolu")
+                return call_result.RemoteStopTransaction(status='Rejected')
         
-        # Transaction durdur
-        for conn_id, conn in self.connectors.items():
-            if conn['transaction_id'] == transaction_id:
-                conn['transaction_id'] = None
-                conn['status'] = 'Available'
-                break
+        self.store.stop_transaction(transaction_id)
         
         return call_result.RemoteStopTransaction(status='Accepted')
     
@@ -211,7 +326,9 @@ class ChargePointSimulator(CP):
         
         if can_frame:
             can_id, payload = can_frame
-            asyncio.create_task(self._send_can_message(can_id, payload))
+            if not self._send_can_message(can_id, payload):
+                logger.warning(f"[{self.id}] SetChargingProfile reddedildi: CAN TX kuyruğu dolu")
+                return call_result.SetChargingProfile(status='Rejected')
         
         return call_result.SetChargingProfile(status='Accepted')
     
@@ -219,7 +336,7 @@ class ChargePointSimulator(CP):
         """CSMS'e BootNotification gönder"""
         logger.info(f"[{self.id}] BootNotification gönderiliyor...")
         
-        response = await self.call(call.BootNotification(
+        response = await self.outbox.call(call.BootNotification(
             charge_point_model="Simulator",
             charge_point_vendor="TestVendor"
         ))
@@ -234,13 +351,24 @@ class ChargePointSimulator(CP):
         
         if can_frame:
             can_id, payload = can_frame
-            await self._send_can_message(can_id, payload)
+            self._send_can_message(can_id, payload)
         
         return response
     
+    async def send_heartbeat(self):
+        """CSMS'e Heartbeat gönder"""
+        return await self.outbox.call(call.Heartbeat())
+        
     def stop(self):
         """CP'yi durdur"""
         self.running = False
+        self.meter_coalescer.close()
+        self.outbox.close()
+        self.store.save()  # Son enerji değerleri (snapshot yoksa işlem yapmaz)
+        if self.can_reader:
+            self.can_reader.stop()
+        if self.can_writer:
+            self.can_writer.stop()
         if self.can_bus:
             self.can_bus.shutdown()
         logger.info(f"[{self.id}] Charge Point durduruldu")
@@ -253,37 +381,74 @@ async def main():
     cp_id = sys.argv[1] if len(sys.argv) > 1 else "CP001"
     csms_url = sys.argv[2] if len(sys.argv) > 2 else "ws://localhost:9000"
     compromised = '--compromised' in sys.argv
+    dbc = next((arg.split('=', 1)[1] for arg in sys.argv if arg.startswith('--dbc=')), None)
+    connectors = next((int(arg.split('=', 1)[1]) for arg in sys.argv if arg.startswith('--connectors=')), 1)
+    meter_window = next((float(arg.split('=', 1)[1]) for arg in sys.argv if arg.startswith('--meter-window=')),
+                        DEFAULT_METER_WINDOW)
+    offline_path = next((arg.split('=', 1)[1] for arg in sys.argv if arg.startswith('--offline-buffer=')), None)
+    max_in_flight = next((int(arg.split('=', 1)[1]) for arg in sys.argv if arg.startswith('--max-in-flight=')),
+                         DEFAULT_MAX_IN_FLIGHT)
+    state_path = next((arg.split('=', 1)[1] for arg in sys.argv if arg.startswith('--state=')), None)
     
     logger.info(f"Charge Point Simülatörü başlatılıyor...")
     logger.info(f"CP ID: {cp_id}")
     logger.info(f"CSMS URL: {csms_url}")
     logger.info(f"Compromised mode: {compromised}")
+    logger.info(f"DBC: {dbc or 'yerleşik frame düzenleri'}")
+    logger.info(f"Connector sayısı: {connectors}")
+    logger.info(f"MeterValues penceresi: {meter_window} sn")
+    logger.info(f"Offline tampon: {offline_path or 'yok (bellekte bekletilir)'}")
+    logger.info(f"Connector durum dosyası: {state_path or 'yok'}")
     
+    cp = None
     try:
-        async with websockets.connect(
-            f"{csms_url}/{cp_id}",
-            subprotocols=['ocpp1.6']
-        ) as ws:
-            cp = ChargePointSimulator(cp_id, ws, compromised=compromised)
-            
-            # BootNotification gönder
-            await asyncio.sleep(1)
-            await cp.send_boot_notification()
-            
-            # StatusNotification gönder
-            await cp._send_status_notification(1, 'Available')
-            
-            # CP'yi başlat
-            await cp.start()
-            
-    except KeyboardInterrupt:
+        while True:
+            try:
+                async with websockets.connect(
+                    f"{csms_url}/{cp_id}",
+                    subprotocols=['ocpp1.6']
+                ) as ws:
+                    if cp is None:
+                        cp = ChargePointSimulator(cp_id, ws, compromised=compromised, dbc=dbc,
+                                                  connectors=connectors, meter_window=meter_window,
+                                                  offline_path=offline_path, max_in_flight=max_in_flight,
+                                                  state_path=state_path)
+                    else:
+                        cp.reconnect(ws)
+                        
+                    # CP'yi başlat (OCPP yanıtları bu döngüden okunur)
+                    receiver = asyncio.create_task(cp.start())
+                    try:
+                        # BootNotification gönder
+                        await cp.send_boot_notification()
+                        
+                        # StatusNotification gönder (her connector için güncel durum)
+                        for connector_id, connector in cp.connectors.items():
+                            await cp._send_status_notification(connector_id, connector.status)
+                            
+                        await receiver
+                    finally:
+                        receiver.cancel()
+                        await asyncio.gather(receiver, return_exceptions=True)
+            except Exception as e:
+                if cp is not None and not cp.running:
+                    raise  # CAN tarafı kurulamadı
+                logger.error(f"Bağlantı hatası: {e}")
+                logger.info("CSMS simülatörünün çalıştığından emin olun: python csms_simulator.py")
+            logger.info(f"{RECONNECT_DELAY:.0f} sn sonra yeniden bağlanılıyor...")
+            await asyncio.sleep(RECONNECT_DELAY)
+    finally:
         logger.info("CP simülatörü kapatılıyor...")
-        cp.stop()
-    except Exception as e:
-        logger.error(f"Bağlantı hatası: {e}")
-        logger.info("CSMS simülatörünün çalıştığından emin olun: python csms_simulator.py")
+        if cp is not None:
+            cp.stop()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # CAN_ASYNC_LOGGING=1: log I/O'su event loop yerine QueueListener thread'inde yapılır
+    listener = setup_async_logging() if ASYNC_LOGGING_ENABLED else None
+    try:
+        asyncio.run(main())
+    finally:
+        if listener:
+            listener.stop()
 
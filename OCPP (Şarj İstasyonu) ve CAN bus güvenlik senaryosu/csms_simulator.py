@@ -55,7 +55,12 @@ class ChargePoint(CP):
         """StatusNotification mesajını işle"""
         logger.info(f"[{self.id}] StatusNotification - Connector {connector_id}: {status}")
         return call_result.StatusNotification()
-    
+
+    @on(Action.heartbeat)
+    def on_heartbeat(self, **kwargs):
+        """Heartbeat mesajını işle"""
+        return call_result.Heartbeat(current_time=datetime.utcnow().isoformat())
+
     @on(Action.meter_values)
     def on_meter_values(self, connector_id, meter_value, **kwargs):
         """MeterValues mesajını işle"""
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+DBC Tabanlı OCPP ↔ CAN Mapping
+Gateway frame düzenlerini bir DBC dosyasından yükler ve başlangıçta bir kez
+hızlı codec'lere derler. Farklı charger donanım varyantları kod değişikliği
+olmadan yalnızca DBC dosyası değiştirilerek desteklenir.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+
+import cantools
+
+from can_gateway import FRAME_SIZE, FrameCodec
+
+logger = logging.getLogger(__name__)
+
+# Ayrıştırılmış DBC önbelleği DBC dosyasının yanındaki __pycache__ altında tutulur
+CACHE_DIR_NAME = '__pycache__'
+_STRUCT_CODES = {8: 'B', 16: 'H', 32: 'I'}
+
+
+def _cache_path(dbc_path: str) -> str:
+    directory, name = os.path.split(os.path.abspath(dbc_path))
+    return os.path.join(directory, CACHE_DIR_NAME, f"{name}.cantools-{cantools.__version__}.pickle")
+
+
+def load_dbc(dbc_path: str, use_cache: bool = True) -> cantools.database.can.Database:
+    """
+    DBC dosyasını yükle (önbellekli)
+    
+    Ayrıştırılmış veritabanı pickle olarak saklanır; önbellek DBC içeriğinin
+    özeti (blake2b) ve cantools sürümü eşleştiği sürece kullanılır. Büyük
+    üretici DBC'lerinde açılışta saniyeler süren ayrıştırma böylece atlanır.
+    Önbellek yalnızca yerel, güvenilir dizinde tutulmalıdır (pickle).
+    
+    Args:
+        dbc_path: DBC dosya yolu
+        use_cache: Pickle önbelleği kullanılsın mı?
+    """
+    with open(dbc_path, 'rb') as f:
+        source = f.read()
+    digest = hashlib.blake2b(source, digest_size=16).hexdigest()
+    cache_path = _cache_path(dbc_path)
+    
+    if use_cache and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                cached = pickle.load(f)
+            if cached.get('digest') == digest:
+                logger.debug(f"DBC önbellekten yüklendi: {cache_path}")
+                return cached['database']
+        except Exception as e:
+            logger.warning(f"DBC önbelleği okunamadı, yeniden ayrıştırılıyor: {e}")
+            
+    database = cantools.database.load_string(source.decode('utf-8', errors='replace'),
+                                             database_format='dbc')
+                                             
+    if use_cache:
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'digest': digest, 'database': database}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"DBC önbelleği yazılamadı: {e}")
+            
+    return database
+
+
+def _signal_initial(signal) -> Any:
+    """Payload'da eksik sinyal için fiziksel başlangıç değeri (GenSigStartValue)"""
+    initial = getattr(signal, 'initial', None)
+    return 0 if initial is None else initial
+
+
+def _is_struct_compatible(message) -> bool:
+    """Tüm sinyaller byte hizalı, little-endian ve 8/16/32 bit ise struct ile derlenebilir"""
+    if message.is_multiplexed() or message.length > FRAME_SIZE:
+        return False
+    end = 0
+    for signal in sorted(message.signals, key=lambda s: s.start):
+        if (signal.byte_order != 'little_endian' or signal.start % 8
+                or signal.length not in _STRUCT_CODES or signal.start < end):
+            return False
+        if signal.is_float:
+            return False
+        end = signal.start + signal.length
+    return end <= FRAME_SIZE * 8
+
+
+def _choice_code(codes: Dict[str, int], value) -> int:
+    """Choice adı (ör. 'Charging') veya ham sayı → ham değer; bilinmeyen ad 0"""
+    if isinstance(value, str):
+        return codes.get(value, 0)
+    return int(value)
+
+
+def _compile_struct_codec(action: str, message) -> FrameCodec:
+    """Byte hizalı mesajı struct formatına ve üretilmiş (codegen) alan fonksiyonlarına derle"""
+    fmt = '<'
+    position = 0
+    encode_exprs = []
+    decode_items = []
+    namespace: Dict[str, Any] = {'_choice_code': _choice_code}
+    
+    for index, signal in enumerate(sorted(message.signals, key=lambda s: s.start)):
+        byte = signal.start // 8
+        if byte > position:
+            fmt += f'{byte - position}x'
+        code = _STRUCT_CODES[signal.length]
+        fmt += code.lower() if signal.is_signed else code
+        position = byte + signal.length // 8
+        
+        name = signal.name
+        value = f"p.get({name!r}, {_signal_initial(signal)!r})"
+        mask = (1 << signal.length) - 1
+        scaled = signal.scale != 1 or signal.offset != 0
+        field = f"f[{index}]"
+        
+        if signal.choices:
+            codes = {str(getattr(v, 'name', v)): k for k, v in signal.choices.items()}
+            names = {k: str(getattr(v, 'name', v)) for k, v in signal.choices.items()}
+            namespace[f'_codes{index}'] = codes
+            namespace[f'_names{index}'] = names
+            raw = f"_choice_code(_codes{index}, {value})"
+            physical = f"_names{index}.get({field}, 'Unknown')"
+        elif scaled:
+            raw = f"int(round(({value} - {signal.offset!r}) / {signal.scale!r}))"
+            physical = f"{field} * {signal.scale!r} + {signal.offset!r}"
+        else:
+            raw = f"int({value})"
+            physical = field
+            
+        encode_exprs.append(raw if signal.is_signed else f"{raw} & {mask}")
+        decode_items.append(f"{name!r}: {physical}")
+        
+    to_fields = eval(f"lambda p: ({', '.join(encode_exprs)},)", namespace)
+    from_fields = eval(f"lambda f: {{{', '.join(decode_items)}}}", namespace)
+    return FrameCodec(action, message.frame_id, fmt, to_fields, from_fields)
+
+
+class CantoolsFrameCodec:
+    """
+    Struct ile ifade edilemeyen mesajlar (bit alanları, big-endian, multiplex)
+    için cantools'un önceden derlenmiş bit codec'ini kullanan codec
+    
+    FrameCodec ile aynı arayüzü (action, can_id, encode, encode_into, decode) sunar.
+    """
+    
+    def __init__(self, action: str, message):
+        self.action = action
+        self.can_id = message.frame_id
+        self.message = message
+        defaults = {signal.name: _signal_initial(signal) for signal in message.signals}
+        encode_message = message.encode
+        decode_message = message.decode
+        min_size = message.length
+        
+        def encode(payload: Dict[str, Any]) -> bytes:
+            """Payload'ı 8 byte'lık CAN payload'ına dönüştür"""
+            data = dict(defaults)
+            data.update((key, payload[key]) for key in defaults.keys() & payload.keys())
+            return encode_message(data, strict=False, padding=False).ljust(FRAME_SIZE, b'\x00')
+            
+        def encode_into(buffer, payload: Dict[str, Any], offset: int = 0):
+            """Payload'ı verilen tampona (bytearray/memoryview) doğrudan yaz"""
+            buffer[offset:offset + FRAME_SIZE] = encode(payload)
+            
+        def decode(payload) -> Dict[str, Any]:
+            """CAN payload'ını OCPP payload dict'ine dönüştür"""
+            if len(payload) < min_size:
+                return {}
+            decoded = decode_message(bytes(payload[:min_size]), decode_choices=True)
+            return {key: str(value) if hasattr(value, 'name') else value
+                    for key, value in decoded.items()}
+                    
+        self.encode = encode
+        self.encode_into = encode_into
+        self.decode = decode
+
+
+def compile_codecs(database, actions: Optional[Tuple[str, ...]] = None) -> Tuple[Any, ...]:
+    """
+    DBC mesajlarını gateway codec'lerine derle
+    
+    Mesaj adı OCPP action adıyla eşleşir (ör. BO_ 768 MeterValues). Sinyal
+    adları OCPP payload anahtarlarıdır (connector_id, energy, ...). Byte
+    hizalı düzenler struct + codegen ile, diğerleri cantools codec'i ile
+    derlenir.
+    
+    Args:
+        database: cantools Database
+        actions: Yalnızca bu action'ları derle (None ise tüm mesajlar)
+    """
+    codecs = []
+    for message in database.messages:
+        if actions is not None and message.name not in actions:
+            continue
+        if _is_struct_compatible(message):
+            codecs.append(_compile_struct_codec(message.name, message))
+        else:
+            codecs.append(CantoolsFrameCodec(message.name, message))
+    logger.info(f"DBC codec'leri derlendi: " + ", ".join(f"{c.action}={hex(c.can_id)}" for c in codecs))
+    return tuple(codecs)
+
+
+def load_codecs(dbc_path: str, use_cache: bool = True) -> Tuple[Any, ...]:
+    """DBC dosyasını (önbellekli) yükle ve codec'lere derle"""
+    return compile_codecs(load_dbc(dbc_path, use_cache=use_cache))
+
+
+def signal_byte_positions(database, signals: Mapping[str, Iterable[str]]) -> Dict[int, Tuple[int, ...]]:
+    """
+    Verilen sinyallerin kapladığı byte pozisyonları (CAN ID → pozisyonlar)
+    
+    Payload profilinde sayaç/zaman damgası byte'larını skorlamadan çıkarmak
+    için kullanılır (ör. {'MeterValues': ('energy', 'timestamp')}). DBC'de
+    olmayan mesaj veya sinyal adları atlanır.
+    
+    Args:
+        database: cantools Database
+        signals: Mesaj adı → sinyal adları
+    """
+    positions: Dict[int, Tuple[int, ...]] = {}
+    for message_name, signal_names in signals.items():
+        try:
+            message = database.get_message_by_name(message_name)
+        except KeyError:
+            continue
+        covered = set()
+        for signal in message.signals:
+            if signal.name not in signal_names:
+                continue
+            first = signal.start // 8
+            if signal.byte_order == 'little_endian':
+                last = (signal.start + signal.length - 1) // 8
+            else:
+                # Big-endian: start MSB'dir, sinyal sonraki byte'lara doğru uzanır
+                last = first + (max(0, signal.length - signal.start % 8 - 1) + 7) // 8
+            covered.update(range(first, min(last, FRAME_SIZE - 1) + 1))
+        if covered:
+            positions[message.frame_id] = tuple(sorted(covered))
+    return positions
@@ -7,53 +7,110 @@ Gateway filtreleme ve CAN-IDS (Intrusion Detection System) implementasyonu.
 import asyncio
 import logging
 import can
-from collections import defaultdict, deque
-from datetime import datetime, timedelta
-from typing import Dict, List, Set, Optional
-import statistics
+from collections import defaultdict
+from typing import Dict, Iterable, List, Mapping, Set, Optional
+import time
+from alarm_store import AlarmStore
+from async_can import AsyncCANReader
+from can_hub import CANHub
+from can_constants import can_filters_for
+from frame_history import FrameHistory
+from ids_baseline import DEFAULT_BASELINE_SAVE_INTERVAL, apply_baseline, capture_baseline, load_baseline, save_baseline
+from ids_detectors import DetectorPipeline, FrameContext, IntervalStats, NORMAL_CAN_IDS
+from payload_profiler import (COUNTER_BYTES, COUNTER_SIGNALS, PAYLOAD_SCORE_SAMPLE, PAYLOAD_TRAINING_FRAMES,
+                              PayloadAnomalyDetector, PayloadProfiler)
+from stats_snapshot import DEFAULT_SNAPSHOT_INTERVAL, StatsSnapshot
+from hotpath_logging import ASYNC_LOGGING_ENABLED, setup_async_logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-
 class CANIDS:
     """CAN Intrusion Detection System - Anomali algılama"""
     
-    def __init__(self, can_bus: str = 'vcan0', window_size: int = 100):
+    def __init__(self, can_bus: str = 'vcan0', window_size: int = 100, hub: Optional[CANHub] = None,
+                 payload_training_frames: int = PAYLOAD_TRAINING_FRAMES, baseline_path: Optional[str] = None,
+                 baseline_save_interval: float = DEFAULT_BASELINE_SAVE_INTERVAL,
+                 payload_score_sample: int = PAYLOAD_SCORE_SAMPLE,
+                 payload_counter_bytes: Mapping[int, Iterable[int]] = COUNTER_BYTES):
         """
         Args:
             can_bus: CAN bus adı
             window_size: Analiz penceresi boyutu
+            hub: Paylaşılan CAN hub (verilirse kendi soketi yerine tüm frame'lere abone olunur)
+            payload_training_frames: Payload profili eğitim fazı (frame); 0 ise payload profilleme kapalı
+            baseline_path: Zamanlama baseline dosyası (.npy); varsa açılışta yüklenir, periyodik kaydedilir
+            baseline_save_interval: Baseline kayıt aralığı (saniye)
+            payload_score_sample: Eğitim sonrası ID başına her N. frame payload skorlanır (1: her frame)
+            payload_counter_bytes: CAN ID → payload skorlamasından çıkarılan sayaç/zaman damgası byte'ları
         """
         self.can_bus_name = can_bus
         self.can_bus = None
+        self.hub = hub
+        # IDS bilinmeyen ID'leri de görmelidir: tüm frame'ler modu (kernel filtresi yok)
+        self.consumed_can_ids = None
+        self.can_reader: Optional[AsyncCANReader] = None
         self.window_size = window_size
         
-        # İstatistikler
-        self.message_history: deque = deque(maxlen=window_size)
+        # İstatistikler - geçmiş önceden ayrılmış dizilerde (frame başına nesne yok)
+        self.message_history = FrameHistory(window_size)
         self.id_frequency: Dict[int, int] = defaultdict(int)
-        self.id_timestamps: Dict[int, List[datetime]] = defaultdict(list)
+        self.total_messages = 0  # id_frequency toplamı (frame başına sum() yerine)
+        self.baseline_frames = 0  # Baseline'dan ön bilgi olarak eklenen sahte frame sayısı
+        self.id_last_seen_ns: Dict[int, int] = {}  # Aralık hesabı için ID başına son monotonic ns
         
         # Normal davranış profili
-        self.normal_ids: Set[int] = {0x200, 0x201, 0x210, 0x300, 0x301, 0x100}
-        self.id_intervals: Dict[int, List[float]] = defaultdict(list)
+        self.normal_ids: Set[int] = set(NORMAL_CAN_IDS)
+        self.id_intervals: Dict[int, IntervalStats] = defaultdict(IntervalStats)
+        
+        # Anomali kontrolleri: sıralı dedektör pipeline'ı (pipeline.register ile genişletilebilir)
+        self.pipeline = DetectorPipeline.default(self.normal_ids)
+        self._context = FrameContext()
+        
+        # Payload profili: ilk frame'lerde baseline öğrenilir, sonra ID başına örneklenerek skorlanır
+        self.payload_profiler: Optional[PayloadProfiler] = None
+        if payload_training_frames > 0:
+            self.payload_profiler = PayloadProfiler(sample_every=payload_score_sample,
+                                                    counter_bytes=payload_counter_bytes)
+            self.pipeline.register(PayloadAnomalyDetector(self.payload_profiler, payload_training_frames))
         
-        # Alarm sayacı
-        self.alarms = []
+        # Alarmlar (tip, CAN ID) başına toplanır; flood'da bellek ve log satırı sınırlı kalır
+        self.alarms = AlarmStore()
         self.running = False
         
+        # Raporlama son yayınlanan değişmez snapshot'ı okur (canlı sayaçlar kopyalanmaz)
+        self.snapshot: Optional[StatsSnapshot] = None
+        self.snapshot_interval = DEFAULT_SNAPSHOT_INTERVAL
+        
+        # Öğrenilmiş zamanlama baseline'ı: açılışta yükle, IDS ilk frame'den itibaren silahlı
+        self.baseline_path = baseline_path
+        self.baseline_save_interval = baseline_save_interval
+        if baseline_path:
+            self.load_baseline(baseline_path)
+        
     async def start(self):
         """CAN-IDS'i başlat"""
         try:
-            self.can_bus = can.interface.Bus(self.can_bus_name, bustype='socketcan')
+            if self.hub:
+                self.can_reader = self.hub.subscribe('CAN-IDS', can_ids=self.consumed_can_ids)
+                self.can_bus = self.can_reader
+            else:
+                self.can_bus = can.interface.Bus(self.can_bus_name, bustype='socketcan',
+                                                 can_filters=can_filters_for(self.consumed_can_ids))
             logger.info(f"CAN-IDS başlatıldı: {self.can_bus_name}")
             self.running = True
             
-            # CAN mesajlarını dinle
+            # CAN mesajlarını dinle (Notifier + sınırlı kuyruk, event loop bloklanmaz)
+            if not self.hub:
+                self.can_reader = AsyncCANReader(self.can_bus, name='CAN-IDS')
+                self.can_reader.start()
             asyncio.create_task(self._monitor_can_bus())
             
             # Periyodik analiz
+            asyncio.create_task(self._refresh_snapshots())
             asyncio.create_task(self._periodic_analysis())
+            if self.baseline_path:
+                asyncio.create_task(self._periodic_baseline_save())
             
         except Exception as e:
             logger.error(f"CAN bus bağlantı hatası: {e}")
@@ -65,127 +122,161 @@ class CANIDS:
         
         while self.running:
             try:
-                msg = self.can_bus.recv(timeout=0.1)
-                if msg:
-                    await self._analyze_message(msg)
-            except can.CanError as e:
-                if self.running:
-                    logger.error(f"CAN hata: {e}")
+                msg = await self.can_reader.recv()
+                if msg is None:
+                    break
+                await self._analyze_message(msg)
             except Exception as e:
                 if self.running:
                     logger.error(f"İzleme hatası: {e}")
     
     async def _analyze_message(self, msg: can.Message):
         """CAN mesajını analiz et ve anomali kontrolü yap"""
-        can_id = msg.arbitration_id
-        timestamp = datetime.now()
+        self.analyze_frame(msg.arbitration_id, msg.data, time.monotonic_ns())
         
-        # Mesajı kaydet
-        self.message_history.append({
-            'id': can_id,
-            'timestamp': timestamp,
-            'data': msg.data
-        })
+    def analyze_frame(self, can_id: int, data: bytes, timestamp: int):
+        """
+        Tek frame'i analiz et (senkron çekirdek; canlı izleme ve offline replay ortak yolu)
+        
+        Args:
+            can_id: Arbitration ID
+            data: Payload
+            timestamp: Frame zamanı (ns) - canlıda time.monotonic_ns(), replay'de log zaman damgası
+        """
+        # Mesajı kaydet (payload ring buffer'a kopyalanır, msg referansı tutulmaz)
+        self.message_history.append(timestamp, can_id, data)
         
         # ID frekansını güncelle
         self.id_frequency[can_id] += 1
+        self.total_messages += 1
         
-        # Zaman aralığı analizi için timestamp kaydet
-        if can_id in self.id_timestamps:
-            last_timestamp = self.id_timestamps[can_id][-1]
-            interval = (timestamp - last_timestamp).total_seconds()
-            self.id_intervals[can_id].append(interval)
-            if len(self.id_intervals[can_id]) > 50:
-                self.id_intervals[can_id].pop(0)
-        
-        self.id_timestamps[can_id].append(timestamp)
-        if len(self.id_timestamps[can_id]) > 100:
-            self.id_timestamps[can_id].pop(0)
+        # Zaman aralığı analizi (ID'nin bir önceki frame'ine göre, saniye)
+        last_seen = self.id_last_seen_ns.get(can_id)
+        if last_seen is not None:
+            self.id_intervals[can_id].add((timestamp - last_seen) * 1e-9)
+        self.id_last_seen_ns[can_id] = timestamp
         
         # Anomali kontrolleri
-        await self._check_anomalies(can_id, timestamp)
+        self._check_anomalies(can_id, timestamp, data)
     
-    async def _check_anomalies(self, can_id: int, timestamp: datetime):
-        """Anomali kontrolleri yap"""
-        
-        # 1. Bilinmeyen CAN ID kontrolü
-        if can_id not in self.normal_ids:
-            await self._raise_alarm('UNKNOWN_ID', f"Bilinmeyen CAN ID tespit edildi: {hex(can_id)}", can_id)
-        
-        # 2. Malicious ID kontrolü (0x9FF)
-        if can_id == 0x9FF:
-            await self._raise_alarm('MALICIOUS_FRAME', f"Malicious CAN frame tespit edildi: {hex(can_id)}", can_id)
+    def _check_anomalies(self, can_id: int, timestamp: int, data: bytes = b''):
+        """Anomali kontrolleri yap (kayıtlı dedektörler sırayla çalışır)"""
+        ctx = self._context
+        ctx.can_id = can_id
+        ctx.timestamp_ns = timestamp
+        ctx.data = data
+        ctx.id_count = self.id_frequency[can_id]
+        ctx.total_messages = self.total_messages
+        ctx.intervals = self.id_intervals.get(can_id)
         
-        # 3. Frekans anomalisi kontrolü
-        if can_id in self.id_frequency:
-            total_messages = sum(self.id_frequency.values())
-            if total_messages > 0:
-                frequency_ratio = self.id_frequency[can_id] / total_messages
-                if frequency_ratio > 0.5:  # %50'den fazla aynı ID
-                    await self._raise_alarm('HIGH_FREQUENCY', 
-                                          f"Yüksek frekans anomalisi: {hex(can_id)} ({frequency_ratio*100:.1f}%)", 
-                                          can_id)
-        
-        # 4. Zaman aralığı anomalisi
-        if can_id in self.id_intervals and len(self.id_intervals[can_id]) > 10:
-            intervals = self.id_intervals[can_id]
-            mean_interval = statistics.mean(intervals)
-            std_interval = statistics.stdev(intervals) if len(intervals) > 1 else 0
-            
-            if mean_interval > 0:
-                # Son interval'ı kontrol et
-                if len(intervals) > 0:
-                    last_interval = intervals[-1]
-                    # 3 sigma kuralı
-                    if abs(last_interval - mean_interval) > 3 * std_interval and std_interval > 0:
-                        await self._raise_alarm('INTERVAL_ANOMALY',
-                                              f"Zaman aralığı anomalisi: {hex(can_id)} (beklenen: {mean_interval:.2f}s, gerçek: {last_interval:.2f}s)",
-                                              can_id)
+        for alarm_type, message in self.pipeline.run(ctx):
+            self._raise_alarm(alarm_type, message, can_id, timestamp)
     
-    async def _raise_alarm(self, alarm_type: str, message: str, can_id: int):
-        """Alarm oluştur"""
-        alarm = {
-            'type': alarm_type,
-            'message': message,
-            'can_id': hex(can_id),
-            'timestamp': datetime.now().isoformat()
-        }
-        self.alarms.append(alarm)
-        logger.warning(f"🚨 ALARM [{alarm_type}]: {message}")
+    def _raise_alarm(self, alarm_type: str, message: str, can_id: int, timestamp: Optional[int] = None):
+        """Alarm oluştur (aynı tip ve CAN ID tekrarları bastırma penceresinde toplanır)"""
+        suppressed = self.alarms.record(alarm_type, can_id, message,
+                                        time.monotonic_ns() if timestamp is None else timestamp)
+        if suppressed is None:
+            return
+        if suppressed:
+            logger.warning(f"🚨 ALARM [{alarm_type}]: {message} (+{suppressed} tekrar bastırıldı)")
+        else:
+            logger.warning(f"🚨 ALARM [{alarm_type}]: {message}")
     
     async def _periodic_analysis(self):
         """Periyodik istatistiksel analiz"""
         while self.running:
             await asyncio.sleep(30)  # Her 30 saniyede bir
             
-            if len(self.message_history) > 10:
+            snapshot = self.snapshot
+            if snapshot is not None and len(self.message_history) > 10:
                 logger.info("\n=== CAN-IDS İstatistikleri ===")
-                logger.info(f"Toplam mesaj: {len(self.message_history)}")
-                logger.info(f"Farklı CAN ID sayısı: {len(self.id_frequency)}")
-                logger.info(f"Toplam alarm: {len(self.alarms)}")
+                logger.info(f"Toplam mesaj: {snapshot.messages_processed}")
+                logger.info(f"Farklı CAN ID sayısı: {len(snapshot.id_frequency)}")
+                logger.info(f"Toplam alarm: {len(self.alarms)} (bastırılan: {self.alarms.suppressed})")
                 
-                # En sık görülen ID'ler
-                if self.id_frequency:
-                    top_ids = sorted(self.id_frequency.items(), key=lambda x: x[1], reverse=True)[:5]
+                # En sık görülen ID'ler (snapshot'ta heap ile seçilmiş)
+                if snapshot.top_ids:
                     logger.info("En sık görülen CAN ID'ler:")
-                    for can_id, count in top_ids:
+                    for can_id, count in snapshot.top_ids[:5]:
                         logger.info(f"  {hex(can_id)}: {count} mesaj")
                 
                 logger.info("="*40 + "\n")
     
+    def take_snapshot(self) -> StatsSnapshot:
+        """İstatistik snapshot'ını senkron oluştur ve yayınla (event loop dışı kullanım için)"""
+        self.snapshot = StatsSnapshot(dict(self.id_frequency), self.total_messages - self.baseline_frames)
+        return self.snapshot
+        
+    async def _refresh_snapshots(self):
+        """
+        Snapshot'ı periyodik yenile
+        
+        Loop'ta yalnızca sayaç dict'inin C seviyesinde kopyası alınır; top-K
+        seçimi executor'da yapılır. Hazır snapshot tek referans atamasıyla
+        yayınlanır, okuyucular yarım snapshot görmez.
+        """
+        loop = asyncio.get_running_loop()
+        while self.running:
+            counts = dict(self.id_frequency)
+            processed = self.total_messages - self.baseline_frames
+            self.snapshot = await loop.run_in_executor(None, StatsSnapshot, counts, processed)
+            await asyncio.sleep(self.snapshot_interval)
+            
+    def load_baseline(self, path: str) -> int:
+        """Zamanlama baseline'ını (memory-map) yükle; yüklenen CAN ID sayısını döndürür"""
+        try:
+            baseline = load_baseline(path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Baseline yüklenemedi: {e}")
+            return 0
+        if baseline is None:
+            logger.info(f"Baseline bulunamadı, sıfırdan öğrenilecek: {path}")
+            return 0
+        loaded = apply_baseline(self, baseline)
+        logger.info(f"Baseline yüklendi: {loaded} CAN ID ({path})")
+        return loaded
+        
+    def save_baseline(self, path: Optional[str] = None):
+        """Mevcut öğrenilmiş zamanlama durumunu baseline dosyasına yaz"""
+        path = path or self.baseline_path
+        try:
+            save_baseline(path, capture_baseline(self))
+            logger.debug(f"Baseline kaydedildi: {path}")
+        except OSError as e:
+            logger.error(f"Baseline kaydedilemedi: {e}")
+            
+    async def _periodic_baseline_save(self):
+        """Baseline'ı periyodik olarak kaydet"""
+        while self.running:
+            await asyncio.sleep(self.baseline_save_interval)
+            if self.running:
+                self.save_baseline()
+                
     def get_statistics(self) -> Dict:
-        """İstatistikleri döndür"""
+        """İstatistikleri döndür (ID sayaçları son snapshot'tan; IDS çalışmıyorsa anlık snapshot)"""
+        snapshot = self.snapshot
+        if snapshot is None or not self.running:
+            snapshot = self.take_snapshot()
         return {
             'total_messages': len(self.message_history),
-            'unique_ids': len(self.id_frequency),
+            'messages_processed': self.total_messages - self.baseline_frames,
             'total_alarms': len(self.alarms),
-            'id_frequency': dict(self.id_frequency),
-            'recent_alarms': self.alarms[-10:] if len(self.alarms) > 10 else self.alarms
+            **snapshot.to_dict(),
+            'alarms': self.alarms.get_statistics(),
+            'recent_alarms': list(self.alarms.recent)[-10:],
+            'reader': self.can_reader.get_metrics() if self.can_reader else {},
+            'detectors': self.pipeline.get_statistics(),
+            'payload_profile': self.payload_profiler.get_statistics() if self.payload_profiler else {}
         }
     
     def stop(self):
         """CAN-IDS'i durdur"""
         self.running = False
+        if self.baseline_path:
+            self.save_baseline()
+        if self.can_reader:
+            self.can_reader.stop()
         if self.can_bus:
             self.can_bus.shutdown()
         logger.info("CAN-IDS durduruldu")
@@ -207,8 +298,7 @@ class SecureGateway:
             self.gateway.enable_whitelist(allowed_can_ids)
         else:
             # Varsayılan: sadece normal OCPP mesajları
-            default_ids = {0x200, 0x201, 0x210, 0x300, 0x301, 0x100}
-            self.gateway.enable_whitelist(default_ids)
+            self.gateway.enable_whitelist(NORMAL_CAN_IDS)
         
         logger.info("Güvenli Gateway aktif - Whitelist filtreleme açık")
     
@@ -219,6 +309,18 @@ class SecureGateway:
     def get_stats(self) -> Dict:
         """Gateway istatistiklerini döndür"""
         return self.gateway.get_stats()
+        
+    def can_filters(self) -> Optional[List[Dict]]:
+        """Whitelist'teki ID'ler için kernel CAN filtreleri"""
+        return self.gateway.can_filters()
+        
+    def filter_frames(self, messages: List[can.Message]) -> List[can.Message]:
+        """Ham CAN frame batch'ini whitelist'ten geçir (CAN → OCPP yönü)"""
+        return self.gateway.filter_frames(messages)
+        
+    def update_whitelist(self, allowed_can_ids: Set[int], extended_ranges=()):
+        """Whitelist'i çalışırken değiştir (kilitsiz, atomik tablo değişimi)"""
+        self.gateway.enable_whitelist(allowed_can_ids, extended_ranges)
 
 
 async def test_defense_mechanisms():
@@ -307,8 +409,16 @@ async def main():
         elif command == '--compare' or command == '-c':
             await compare_secure_vs_insecure()
         elif command == '--ids':
-            # CAN-IDS'i başlat
-            ids = CANIDS(can_bus='vcan0')
+            # CAN-IDS'i başlat (--baseline=path: öğrenilmiş baseline yüklenir ve periyodik kaydedilir,
+            # --dbc=path: payload sayaç byte'ları DBC sinyal düzeninden alınır)
+            baseline = next((arg.split('=', 1)[1] for arg in sys.argv if arg.startswith('--baseline=')), None)
+            dbc = next((arg.split('=', 1)[1] for arg in sys.argv if arg.startswith('--dbc=')), None)
+            counter_bytes = COUNTER_BYTES
+            if dbc:
+                from dbc_mapping import load_dbc, signal_byte_positions
+                
+                counter_bytes = signal_byte_positions(load_dbc(dbc), COUNTER_SIGNALS)
+            ids = CANIDS(can_bus='vcan0', baseline_path=baseline, payload_counter_bytes=counter_bytes)
             try:
                 await ids.start()
                 while ids.running:
@@ -322,11 +432,18 @@ async def main():
         logger.info("  python defense_mechanisms.py --test        # Savunma testi")
         logger.info("  python defense_mechanisms.py --compare     # Gateway karşılaştırması")
         logger.info("  python defense_mechanisms.py --ids         # CAN-IDS'i başlat")
+        logger.info("  python defense_mechanisms.py --ids --baseline=ids_baseline.npy  # Öğrenilmiş baseline ile")
+        logger.info("  python defense_mechanisms.py --ids --dbc=ocpp_can.dbc  # Sayaç byte'ları DBC'den")
 
 
 if __name__ == "__main__":
+    # CAN_ASYNC_LOGGING=1: log I/O'su event loop yerine QueueListener thread'inde yapılır
+    listener = setup_async_logging() if ASYNC_LOGGING_ENABLED else None
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Kapatılıyor...")
+    finally:
+        if listener:
+            listener.stop()
 
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Dizi Tabanlı CAN Frame Geçmişi
+Frame başına dict/datetime yerine önceden ayrılmış NumPy ring buffer'ları:
+monotonic ns zaman damgası (int64), arbitration ID (uint32), DLC (uint8) ve
+(N, 8) uint8 payload bloğu.
+"""
+
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from can_gateway import FRAME_SIZE
+
+_ZERO_PAYLOAD = bytes(FRAME_SIZE)
+
+
+class FrameHistory:
+    """
+    Sabit kapasiteli frame ring buffer'ı
+    
+    Yazma yolu numpy dizilerinin memoryview'ları üzerinden yapılır; frame
+    başına Python nesnesi (dict, datetime, bytes kopyası) tutulmaz. Analiz
+    için `segments()` kopyasız view'lar, `ordered()` kronolojik sıralı dizi
+    döndürür. Payload bloğu doğrudan `can_analytics.decode_frames` ile
+    çözülebilir.
+    
+    Örnek:
+        history = FrameHistory(4096)
+        history.append(time.monotonic_ns(), msg.arbitration_id, msg.data)
+        timestamps_ns, can_ids, dlc, data = history.ordered()
+    """
+    
+    def __init__(self, capacity: int):
+        """
+        Args:
+            capacity: Tutulacak en fazla frame sayısı
+        """
+        if capacity <= 0:
+            raise ValueError(f"Kapasite pozitif olmalı: {capacity}")
+        self.capacity = capacity
+        self.timestamps_ns = np.zeros(capacity, dtype=np.int64)
+        self.can_ids = np.zeros(capacity, dtype=np.uint32)
+        self.dlc = np.zeros(capacity, dtype=np.uint8)
+        self.data = np.zeros((capacity, FRAME_SIZE), dtype=np.uint8)
+        
+        # Skaler yazmalar numpy __setitem__ yerine memoryview üzerinden (daha ucuz)
+        self._timestamps_view = memoryview(self.timestamps_ns).cast('B').cast('q')
+        self._ids_view = memoryview(self.can_ids).cast('B').cast('I')
+        self._dlc_view = memoryview(self.dlc)
+        self._data_view = memoryview(self.data).cast('B')
+        self._next = 0
+        self.total = 0  # Şimdiye kadar eklenen toplam frame
+        
+    def __len__(self) -> int:
+        return self.total if self.total < self.capacity else self.capacity
+        
+    def append(self, timestamp_ns: int, can_id: int, data) -> int:
+        """
+        Frame ekle (kapasite doluysa en eski frame'in üzerine yazılır)
+        
+        Args:
+            timestamp_ns: time.monotonic_ns() zaman damgası
+            can_id: Arbitration ID
+            data: Payload (bytes/bytearray, en fazla 8 byte)
+            
+        Returns:
+            Frame'in yazıldığı satır indeksi
+        """
+        index = self._next
+        self._timestamps_view[index] = timestamp_ns
+        self._ids_view[index] = can_id
+        length = len(data)
+        if length > FRAME_SIZE:
+            data, length = data[:FRAME_SIZE], FRAME_SIZE
+        self._dlc_view[index] = length
+        start = index * FRAME_SIZE
+        self._data_view[start:start + length] = data
+        if length < FRAME_SIZE:
+            self._data_view[start + length:start + FRAME_SIZE] = _ZERO_PAYLOAD[length:]
+            
+        self._next = index + 1 if index + 1 < self.capacity else 0
+        self.total += 1
+        return index
+        
+    def append_message(self, msg, timestamp_ns: Optional[int] = None) -> int:
+        """can.Message ekle (zaman damgası verilmezse time.monotonic_ns())"""
+        return self.append(time.monotonic_ns() if timestamp_ns is None else timestamp_ns,
+                           msg.arbitration_id, msg.data)
+        
+    def segments(self) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Kronolojik sırada en fazla iki kopyasız (timestamps_ns, can_ids, dlc, data) view
+        
+        Buffer henüz dolmadıysa tek parça, dolduysa [en eski..son] ve [0..en yeni]
+        parçaları döner. View'lar sonraki append'lerle değişir; saklanacaksa kopyalanmalıdır.
+        """
+        if self.total <= self.capacity:
+            end = len(self)
+            return [self._slice(0, end)] if end else []
+        head = self._next
+        parts = [self._slice(head, self.capacity)]
+        if head:
+            parts.append(self._slice(0, head))
+        return parts
+        
+    def _slice(self, start: int, end: int):
+        return (self.timestamps_ns[start:end], self.can_ids[start:end],
+                self.dlc[start:end], self.data[start:end])
+        
+    def ordered(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Kronolojik sıralı diziler (buffer sarılmadıysa kopyasız view, sarıldıysa kopya)"""
+        parts = self.segments()
+        if not parts:
+            return self._slice(0, 0)
+        if len(parts) == 1:
+            return parts[0]
+        return tuple(np.concatenate(columns) for columns in zip(*parts))
+        
+    def timestamps_for(self, can_id: int) -> np.ndarray:
+        """Verilen CAN ID'nin geçmişteki zaman damgaları (ns, kronolojik)"""
+        timestamps_ns, can_ids, _, _ = self.ordered()
+        return timestamps_ns[can_ids == can_id]
+        
+    def id_counts(self) -> Dict[int, int]:
+        """Geçmiş penceresindeki CAN ID frekansları"""
+        _, can_ids, _, _ = self.ordered()
+        values, counts = np.unique(can_ids, return_counts=True)
+        return dict(zip(values.tolist(), counts.tolist()))
+        
+    def clear(self):
+        """Geçmişi sıfırla (diziler yeniden ayrılmaz)"""
+        self._next = 0
+        self.total = 0
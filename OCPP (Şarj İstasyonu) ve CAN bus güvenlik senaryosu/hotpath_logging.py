@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Sıcak Yol (Hot Path) Loglama
+Frame başına loglar için lazy formatlama, seviye koruması, örnekleme/rate limit
+ve event loop'u bloklamayan QueueHandler/QueueListener kurulumu.
+"""
+
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from typing import Optional
+
+
+def _trace_level_from_env() -> int:
+    """CAN_TRACE_LEVEL'i log seviyesine çevir (bilinmeyen isimde INFO + uyarı)"""
+    name = os.environ.get('CAN_TRACE_LEVEL', '').strip().upper() or 'INFO'
+    # getLevelName bilinmeyen isim için 'Level X' string'i döner; FrameTracer'ın int karşılaştırmasını bozar
+    level = int(name) if name.isdigit() else logging.getLevelName(name)
+    if not isinstance(level, int):
+        logging.getLogger(__name__).warning(f"Geçersiz CAN_TRACE_LEVEL={name!r}, INFO kullanılıyor")
+        return logging.INFO
+    return level
+
+
+# Ortam değişkenleri ile ayarlanabilir varsayılanlar
+#   CAN_TRACE_LEVEL       : frame trace log seviyesi (varsayılan INFO)
+#   CAN_TRACE_SAMPLE      : her N frame'den birini logla (varsayılan 1 = hepsi)
+#   CAN_TRACE_RATE        : saniyede en fazla kaç trace satırı (varsayılan 20, 0 = sınırsız)
+#   CAN_ASYNC_LOGGING     : 1 ise main() fonksiyonları QueueListener kurulumunu açar
+TRACE_LEVEL = _trace_level_from_env()
+TRACE_SAMPLE_EVERY = max(1, int(os.environ.get('CAN_TRACE_SAMPLE', '1')))
+TRACE_MAX_PER_SECOND = max(0, int(os.environ.get('CAN_TRACE_RATE', '20')))
+ASYNC_LOGGING_ENABLED = os.environ.get('CAN_ASYNC_LOGGING', '0') == '1'
+
+
+_BYTES_TYPES = (bytes, bytearray, memoryview)
+
+
+class FrameTracer:
+    """
+    Frame başına trace logları için seviye korumalı, örneklemeli ve rate limitli logger
+    
+    Format string (%-stili) tracer oluşturulurken bir kez verilir; çağrı
+    yerinde yalnızca ham argümanlar geçirilir. Seviye kapalıysa çağrı
+    maliyeti tek bir `isEnabledFor` kontrolüdür (logging modülü bu sonucu
+    logger başına önbelleğe alır). bytes/bytearray/memoryview argümanları
+    yalnızca satır gerçekten yazılacaksa hex'e çevrilir. Örnekleme veya
+    rate limit nedeniyle atlanan frame sayısı bir sonraki satıra eklenir.
+    
+    Örnek:
+        _trace_rx = FrameTracer(logger, "CAN mesajı alındı: ID=0x%x, Data=%s")
+        _trace_rx(msg.arbitration_id, msg.data)
+    """
+    
+    def __init__(self, logger: logging.Logger, fmt: str, level: Optional[int] = None,
+                 sample_every: Optional[int] = None, max_per_second: Optional[int] = None):
+        """
+        Args:
+            logger: Hedef logger
+            fmt: %-stili mesaj formatı
+            level: Trace seviyesi (None ise CAN_TRACE_LEVEL)
+            sample_every: Her N frame'den birini logla (None ise CAN_TRACE_SAMPLE)
+            max_per_second: Saniyedeki satır üst sınırı, 0 = sınırsız (None ise CAN_TRACE_RATE)
+        """
+        self.logger = logger
+        self.fmt = fmt
+        self.level = TRACE_LEVEL if level is None else level
+        self.sample_every = TRACE_SAMPLE_EVERY if sample_every is None else max(1, sample_every)
+        self.max_per_second = TRACE_MAX_PER_SECOND if max_per_second is None else max(0, max_per_second)
+        self._seen = 0
+        self._suppressed = 0
+        self._window_start = 0.0
+        self._window_count = 0
+        
+    def enabled(self) -> bool:
+        """Trace seviyesi açık mı? (pahalı argüman hazırlığından önce kontrol için)"""
+        return self.logger.isEnabledFor(self.level)
+        
+    def __call__(self, *args):
+        if not self.logger.isEnabledFor(self.level):
+            return
+            
+        self._seen += 1
+        if self.sample_every > 1 and self._seen % self.sample_every:
+            self._suppressed += 1
+            return
+            
+        if self.max_per_second:
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start = now
+                self._window_count = 0
+            if self._window_count >= self.max_per_second:
+                self._suppressed += 1
+                return
+            self._window_count += 1
+            
+        fmt = self.fmt
+        args = tuple(bytes(arg).hex() if isinstance(arg, _BYTES_TYPES) else arg for arg in args)
+        if self._suppressed:
+            fmt += " (+%d frame loglanmadı)"
+            args += (self._suppressed,)
+            self._suppressed = 0
+        self.logger.log(self.level, fmt, *args, stacklevel=2)
+
+
+def setup_async_logging(root: Optional[logging.Logger] = None) -> logging.handlers.QueueListener:
+    """
+    Logger'ın mevcut handler'larını bir QueueListener thread'ine taşı
+    
+    Event loop yalnızca kaydı kuyruğa koyar; dosya/konsol I/O'su ayrı bir
+    thread'de yapılır. Dönen listener kapanışta `stop()` ile durdurulmalıdır
+    (kuyrukta kalan kayıtlar boşaltılır).
+    
+    Args:
+        root: Handler'ları taşınacak logger (None ise root logger)
+    """
+    root = root or logging.getLogger()
+    handlers = list(root.handlers)
+    if not handlers:
+        handlers = [logging.StreamHandler()]
+        
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+CAN-IDS Zamanlama Baseline'ı
+Öğrenilmiş ID başına zaman aralığı istatistiklerini (sayı, ortalama, varyans)
+ve frekans paylarını sabit kayıt düzenli bir .npy dosyasına yazar; açılışta
+dosya memory-map ile okunup IDS bu değerlerle silahlı başlar.
+"""
+
+import logging
+import os
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Dosya formatı: ID başına tek kayıt (küçük endian, sabit boyut)
+BASELINE_DTYPE = np.dtype([
+    ('can_id', '<u4'),
+    ('count', '<u4'),    # Aralık penceresindeki örnek sayısı
+    ('mean', '<f8'),     # Ortalama aralık (saniye)
+    ('var', '<f8'),      # Örneklem varyansı (saniye²)
+    ('share', '<f8'),    # Toplam trafikteki pay
+])
+# Periyodik kayıt aralığı (saniye)
+DEFAULT_BASELINE_SAVE_INTERVAL = 300.0
+# Frekans payları açılışta bu kadar sahte frame'lik ön bilgi olarak yüklenir
+BASELINE_FREQUENCY_WEIGHT = 1000
+
+
+def capture_baseline(ids) -> np.ndarray:
+    """
+    CANIDS'in mevcut öğrenilmiş durumundan baseline kayıtları oluştur
+    
+    Args:
+        ids: CANIDS örneği
+        
+    Returns:
+        BASELINE_DTYPE dizisi (CAN ID'ye göre sıralı)
+    """
+    total = ids.total_messages
+    can_ids = sorted(ids.id_frequency)
+    baseline = np.zeros(len(can_ids), dtype=BASELINE_DTYPE)
+    for row, can_id in zip(baseline, can_ids):
+        row['can_id'] = can_id
+        row['share'] = ids.id_frequency[can_id] / total if total else 0.0
+        intervals = ids.id_intervals.get(can_id)
+        if intervals is not None and intervals.count:
+            row['count'] = intervals.count
+            row['mean'] = intervals.mean
+            row['var'] = intervals.stdev() ** 2
+    return baseline
+
+
+def save_baseline(path: str, baseline: np.ndarray):
+    """
+    Baseline'ı atomik olarak yaz
+    
+    Geçici dosyaya yazılıp `os.replace` ile yerine konur; dosyayı o anda
+    memory-map etmiş süreçler eski içeriği görmeye devam eder.
+    """
+    temporary = f"{path}.tmp"
+    with open(temporary, 'wb') as f:
+        np.save(f, np.ascontiguousarray(baseline, dtype=BASELINE_DTYPE))
+    os.replace(temporary, path)
+
+
+def load_baseline(path: str) -> Optional[np.ndarray]:
+    """
+    Baseline dosyasını memory-map ile aç
+    
+    Returns:
+        Salt okunur BASELINE_DTYPE dizisi; dosya yoksa None
+        
+    Raises:
+        ValueError: Dosya formatı uyumsuzsa
+    """
+    if not os.path.exists(path):
+        return None
+    baseline = np.load(path, mmap_mode='r')
+    if baseline.dtype != BASELINE_DTYPE or baseline.ndim != 1:
+        raise ValueError(f"Baseline formatı uyumsuz: {path} ({baseline.dtype}, {baseline.shape})")
+    return baseline
+
+
+def apply_baseline(ids, baseline: np.ndarray) -> int:
+    """
+    Baseline'ı CANIDS'e yükle
+    
+    Aralık pencereleri baseline ortalama/varyansıyla doldurulur (aralık
+    kontrolü ilk frame'den itibaren çalışır). Frekans payları
+    BASELINE_FREQUENCY_WEIGHT sahte frame'lik ön bilgi olarak sayaçlara eklenir;
+    açılıştaki ilk frame'lerin %100 pay ile HIGH_FREQUENCY alarmı üretmesi önlenir.
+    
+    Returns:
+        Yüklenen CAN ID sayısı
+    """
+    seeded_frames = 0
+    for can_id, count, mean, var, share in baseline.tolist():
+        if count:
+            ids.id_intervals[can_id].seed(mean, var, count)
+        frames = round(share * BASELINE_FREQUENCY_WEIGHT)
+        if frames:
+            ids.id_frequency[can_id] += frames
+            seeded_frames += frames
+    ids.total_messages += seeded_frames
+    ids.baseline_frames += seeded_frames
+    return len(baseline)
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+CAN-IDS Dedektör Pipeline'ı
+Frame başına anomali kontrolleri eklenti (plugin) olarak kaydedilir ve sıralı
+bir pipeline'da çalışır. Her dedektör kendi gecikme histogramını ve alarm
+(hit) sayısını tutar.
+"""
+
+import math
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from can_constants import MALICIOUS_CAN_ID
+from latency_histogram import LatencyHistogram
+
+# ID başına zaman aralığı pencere boyutu
+INTERVAL_WINDOW = 50
+
+# Anomali eşikleri (CANIDS ve sharded_ids worker'ları ortak kullanır)
+NORMAL_CAN_IDS = frozenset({0x200, 0x201, 0x210, 0x300, 0x301, 0x100})
+HIGH_FREQUENCY_RATIO = 0.5  # Tek ID'nin toplam trafikteki payı
+INTERVAL_SIGMA = 3  # Zaman aralığı için sigma kuralı
+MIN_INTERVAL_SAMPLES = 10  # Aralık kontrolü için gereken en az örnek
+
+# perf_counter_ns çağrıları frame bütçesini domine etmesin diye varsayılan örnekleme
+DEFAULT_TIMING_SAMPLE = 8
+
+
+class IntervalStats:
+    """
+    Kayan pencere üzerinde O(1) ortalama ve standart sapma
+    
+    Pencereye giren değer eklenir, pencereden çıkan değer çıkarılır (kayan
+    pencere Welford güncellemesi); her frame'de tüm pencere yeniden taranmaz.
+    """
+    
+    __slots__ = ('window', 'mean', 'm2')
+    
+    def __init__(self, size: int = INTERVAL_WINDOW):
+        self.window: deque = deque(maxlen=size)
+        self.mean = 0.0
+        self.m2 = 0.0  # Ortalamadan sapmaların kareleri toplamı
+        
+    def add(self, value: float):
+        """Yeni değeri pencereye ekle (pencere doluysa en eski değer çıkar)"""
+        window = self.window
+        if len(window) == window.maxlen:
+            old = window[0]
+            window.append(value)
+            mean = self.mean + (value - old) / len(window)
+            self.m2 += (value - old) * (value - mean + old - self.mean)
+            self.mean = mean
+        else:
+            window.append(value)
+            delta = value - self.mean
+            self.mean += delta / len(window)
+            self.m2 += delta * (value - self.mean)
+        if self.m2 < 0.0:  # Kayan nokta hatası
+            self.m2 = 0.0
+            
+    def seed(self, mean: float, variance: float, count: int):
+        """
+        Pencereyi kayıtlı bir baseline'dan doldur
+        
+        Ortalaması `mean`, örneklem varyansı `variance` olan `count` (en fazla
+        pencere boyu) yapay değer yazılır: mean ± a çiftleri (tek sayıda ise bir
+        değer tam ortalamada). Canlı aralıklar geldikçe yapay değerler pencereden
+        normal şekilde çıkar.
+        """
+        window = self.window
+        window.clear()
+        n = min(count, window.maxlen)
+        if n <= 0:
+            self.mean = self.m2 = 0.0
+            return
+        pairs = n // 2
+        # Σ(x - mean)² = 2·pairs·a² = variance·(n - 1)
+        offset = math.sqrt(variance * (n - 1) / (2 * pairs)) if pairs else 0.0
+        for _ in range(pairs):
+            window.append(mean - offset)
+            window.append(mean + offset)
+        if n % 2:
+            window.append(mean)
+        self.mean = mean
+        self.m2 = variance * (n - 1)
+        
+    @property
+    def count(self) -> int:
+        return len(self.window)
+        
+    @property
+    def last(self) -> float:
+        return self.window[-1]
+        
+    def stdev(self) -> float:
+        """Örneklem standart sapması (statistics.stdev ile aynı tanım)"""
+        n = len(self.window)
+        return math.sqrt(self.m2 / (n - 1)) if n > 1 else 0.0
+
+
+class FrameContext:
+    """
+    Dedektörlere verilen frame bağlamı
+    
+    IDS frame başına yeni nesne oluşturmaz; tek bir bağlam nesnesinin alanlarını
+    günceller. Dedektörler bağlamı saklamamalıdır.
+    """
+    
+    __slots__ = ('can_id', 'timestamp_ns', 'data', 'id_count', 'total_messages', 'intervals')
+    
+    def __init__(self):
+        self.can_id = 0
+        self.timestamp_ns = 0
+        self.data = b''
+        self.id_count = 0  # Bu ID'nin şimdiye kadarki frame sayısı
+        self.total_messages = 0  # Tüm ID'lerin toplam frame sayısı
+        self.intervals: Optional[IntervalStats] = None  # ID'nin zaman aralığı penceresi
+
+
+class Detector:
+    """
+    Dedektör eklenti arayüzü
+    
+    Alt sınıflar `check()` metodunu uygular; anomali varsa (alarm_type, message)
+    döndürür, yoksa None. `order` küçük olan önce çalışır (ucuz kontroller
+    önce). `short_circuit` True ise dedektör alarm ürettiğinde sonraki
+    dedektörler o frame için çalıştırılmaz.
+    """
+    
+    name = 'detector'
+    order = 100
+    short_circuit = False
+    
+    def check(self, ctx: FrameContext) -> Optional[Tuple[str, str]]:
+        raise NotImplementedError
+
+
+class UnknownIdDetector(Detector):
+    """Normal profilde olmayan CAN ID"""
+    
+    name = 'unknown_id'
+    order = 10
+    
+    def __init__(self, normal_ids=NORMAL_CAN_IDS):
+        # Referans tutulur; IDS'in normal_ids kümesine yapılan eklemeler görünür
+        self.normal_ids = normal_ids
+        
+    def check(self, ctx: FrameContext) -> Optional[Tuple[str, str]]:
+        if ctx.can_id not in self.normal_ids:
+            return 'UNKNOWN_ID', f"Bilinmeyen CAN ID tespit edildi: {hex(ctx.can_id)}"
+        return None
+
+
+class MaliciousFrameDetector(Detector):
+    """Compromised firmware'in kullandığı malicious frame (0x9FF)"""
+    
+    name = 'malicious_frame'
+    order = 20
+    
+    def __init__(self, can_id: int = MALICIOUS_CAN_ID):
+        self.can_id = can_id
+        
+    def check(self, ctx: FrameContext) -> Optional[Tuple[str, str]]:
+        if ctx.can_id == self.can_id:
+            return 'MALICIOUS_FRAME', f"Malicious CAN frame tespit edildi: {hex(ctx.can_id)}"
+        return None
+
+
+class HighFrequencyDetector(Detector):
+    """Tek ID'nin toplam trafikteki payı eşiği aşıyor"""
+    
+    name = 'high_frequency'
+    order = 30
+    
+    def __init__(self, ratio: float = HIGH_FREQUENCY_RATIO):
+        self.ratio = ratio
+        
+    def check(self, ctx: FrameContext) -> Optional[Tuple[str, str]]:
+        if ctx.total_messages > 0:
+            frequency_ratio = ctx.id_count / ctx.total_messages
+            if frequency_ratio > self.ratio:
+                return 'HIGH_FREQUENCY', f"Yüksek frekans anomalisi: {hex(ctx.can_id)} ({frequency_ratio*100:.1f}%)"
+        return None
+
+
+class IntervalAnomalyDetector(Detector):
+    """Son zaman aralığı ID'nin pencere ortalamasından sigma kuralıyla sapıyor"""
+    
+    name = 'interval_anomaly'
+    order = 40
+    
+    def __init__(self, sigma: float = INTERVAL_SIGMA, min_samples: int = MIN_INTERVAL_SAMPLES):
+        self.sigma = sigma
+        self.min_samples = min_samples
+        
+    def check(self, ctx: FrameContext) -> Optional[Tuple[str, str]]:
+        intervals = ctx.intervals
+        if intervals is None or intervals.count <= self.min_samples:
+            return None
+        mean_interval = intervals.mean
+        std_interval = intervals.stdev()
+        last_interval = intervals.last
+        if mean_interval > 0 and std_interval > 0 and abs(last_interval - mean_interval) > self.sigma * std_interval:
+            return ('INTERVAL_ANOMALY',
+                    f"Zaman aralığı anomalisi: {hex(ctx.can_id)} (beklenen: {mean_interval:.2f}s, "
+                    f"gerçek: {last_interval:.2f}s)")
+        return None
+
+
+class DetectorPipeline:
+    """
+    Kayıtlı dedektörleri `order` sırasıyla çalıştıran pipeline
+    
+    Örnek:
+        pipeline = DetectorPipeline.default(ids.normal_ids)
+        pipeline.register(MyPayloadDetector())
+        alarms = pipeline.run(ctx)
+    """
+    
+    def __init__(self, timing: bool = True, timing_sample_every: int = DEFAULT_TIMING_SAMPLE):
+        """
+        Args:
+            timing: Dedektör başına gecikme ölçülsün mü?
+            timing_sample_every: Her N frame'den birinin gecikmesini ölç (çağrı/hit sayıları her frame'de tutulur)
+        """
+        self.timing = timing
+        self.timing_sample_every = max(1, timing_sample_every)
+        self._frames = 0
+        self.detectors: List[Detector] = []
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._stages: List[Tuple[Detector, Any, Dict[str, Any], LatencyHistogram]] = []
+        
+    @classmethod
+    def default(cls, normal_ids=NORMAL_CAN_IDS, timing: bool = True,
+                timing_sample_every: int = DEFAULT_TIMING_SAMPLE) -> 'DetectorPipeline':
+        """CANIDS'in yerleşik dört kontrolü ile pipeline"""
+        pipeline = cls(timing=timing, timing_sample_every=timing_sample_every)
+        for detector in (UnknownIdDetector(normal_ids), MaliciousFrameDetector(),
+                         HighFrequencyDetector(), IntervalAnomalyDetector()):
+            pipeline.register(detector)
+        return pipeline
+        
+    def register(self, detector: Detector) -> Detector:
+        """Dedektör ekle (aynı ada sahip dedektör varsa yerine geçer)"""
+        self.detectors = [d for d in self.detectors if d.name != detector.name]
+        self.detectors.append(detector)
+        self.detectors.sort(key=lambda d: d.order)  # sort kararlı: aynı order'da kayıt sırası korunur
+        self._stats[detector.name] = {'calls': 0, 'hits': 0, 'latency': LatencyHistogram()}
+        self._rebuild()
+        return detector
+        
+    def unregister(self, name: str):
+        """Dedektörü adıyla çıkar"""
+        self.detectors = [d for d in self.detectors if d.name != name]
+        self._stats.pop(name, None)
+        self._rebuild()
+        
+    def _rebuild(self):
+        # Frame yolunda attribute/dict aramalarını önlemek için önceden bağlanmış aşamalar
+        self._stages = [(d, d.check, self._stats[d.name], self._stats[d.name]['latency'])
+                        for d in self.detectors]
+                        
+    def run(self, ctx: FrameContext) -> List[Tuple[str, str]]:
+        """Frame'i pipeline'dan geçir, (alarm_type, message) listesi döndür"""
+        alarms = []
+        self._frames += 1
+        if self.timing and self._frames % self.timing_sample_every == 0:
+            clock = time.perf_counter_ns
+            for detector, check, stats, latency in self._stages:
+                start = clock()
+                result = check(ctx)
+                latency.record(clock() - start)
+                stats['calls'] += 1
+                if result is not None:
+                    stats['hits'] += 1
+                    alarms.append(result)
+                    if detector.short_circuit:
+                        break
+        else:
+            for detector, check, stats, _ in self._stages:
+                result = check(ctx)
+                stats['calls'] += 1
+                if result is not None:
+                    stats['hits'] += 1
+                    alarms.append(result)
+                    if detector.short_circuit:
+                        break
+        return alarms
+        
+    def get_statistics(self) -> Dict[str, Dict[str, Any]]:
+        """Dedektör başına çağrı/hit sayısı ve gecikme histogramı (pipeline sırasıyla)"""
+        return {
+            detector.name: {
+                'order': detector.order,
+                'calls': self._stats[detector.name]['calls'],
+                'hits': self._stats[detector.name]['hits'],
+                **self._stats[detector.name]['latency'].to_dict(),
+            }
+            for detector in self.detectors
+        }
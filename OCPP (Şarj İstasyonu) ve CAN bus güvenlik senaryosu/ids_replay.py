@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Offline CAN-IDS Replay
+Kaydedilmiş trafiği (candump .log, .asc, .blf ...) python-can LogReader ile
+parça parça okur ve CANIDS dedektörlerini bekleme yapmadan, frame zaman
+damgalarıyla çalıştırır. Dedektör değişikliklerini geçmiş kayıtlar üzerinde
+geriye dönük test etmek içindir.
+"""
+
+import logging
+import time
+from itertools import islice
+from typing import Any, Dict, Iterable, Optional
+
+import can
+
+import defense_mechanisms
+from alarm_store import AlarmStore
+from defense_mechanisms import CANIDS
+from hotpath_logging import ASYNC_LOGGING_ENABLED, setup_async_logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# LogReader'dan tek seferde çekilecek frame sayısı (bellekte tutulan en fazla frame)
+DEFAULT_CHUNK_SIZE = 4096
+# İlerleme logu aralığı (parça)
+PROGRESS_EVERY_CHUNKS = 256
+
+
+class IDSReplay:
+    """
+    Log dosyalarını CANIDS üzerinden en yüksek hızda oynatır
+    
+    Zaman damgası olarak `msg.timestamp` (Unix saniye) kullanılır; aralık
+    istatistikleri, alarm bastırma pencereleri ve alarm zamanları kayıt
+    zamanına göredir. Bellek kullanımı parça boyutu ve IDS'in sabit
+    boyutlu tablolarıyla sınırlıdır. Birden fazla dosya aynı IDS durumu
+    üzerinde sırayla oynatılır.
+    
+    Örnek:
+        replay = IDSReplay()
+        report = replay.run(['monday.log', 'tuesday.blf'])
+    """
+    
+    def __init__(self, ids: Optional[CANIDS] = None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        Args:
+            ids: Kullanılacak CANIDS (None ise varsayılan ayarlarla oluşturulur). Verilen
+                IDS'in alarm deposu değiştirilmez; alarm zamanlarının doğru gösterilmesi için
+                `AlarmStore(clock_offset_ns=0)` kullanmalıdır (zaman damgaları Unix ns)
+            chunk_size: LogReader'dan tek seferde okunacak frame sayısı
+        """
+        if ids is None:
+            ids = CANIDS(can_bus='replay')
+            # Alarm zamanları log zaman damgası (Unix ns) olduğu için duvar saati farkı yok
+            ids.alarms = AlarmStore(clock_offset_ns=0)
+        elif ids.alarms.clock_offset_ns != 0:
+            logger.warning("Verilen CANIDS'in alarm deposu monotonic saat farkı kullanıyor; "
+                           "alarm zamanları kayıt zamanıyla uyuşmayacak (AlarmStore(clock_offset_ns=0) kullanın)")
+        self.ids = ids
+        self.chunk_size = chunk_size
+        
+        self.files = 0
+        self.frames = 0
+        self.skipped = 0  # Hata/remote frame'leri (frames'e dahil değil)
+        self.first_timestamp: Optional[float] = None
+        self.last_timestamp: Optional[float] = None
+        self.elapsed = 0.0
+        
+    def replay_file(self, path: str, limit: Optional[int] = None):
+        """
+        Tek bir log dosyasını oynat
+        
+        Args:
+            path: Log dosyası (format uzantıdan belirlenir)
+            limit: En fazla oynatılacak frame (None: tümü)
+        """
+        analyze = self.ids.analyze_frame
+        reader = can.LogReader(path)
+        messages = iter(reader) if limit is None else islice(reader, limit)
+        started = time.perf_counter()
+        chunks = 0
+        try:
+            while True:
+                chunk = list(islice(messages, self.chunk_size))
+                if not chunk:
+                    break
+                skipped = 0
+                for msg in chunk:
+                    if msg.is_error_frame or msg.is_remote_frame:
+                        skipped += 1
+                        continue
+                    analyze(msg.arbitration_id, msg.data, int(msg.timestamp * 1e9))
+                self.frames += len(chunk) - skipped
+                self.skipped += skipped
+                
+                if self.first_timestamp is None:
+                    self.first_timestamp = chunk[0].timestamp
+                self.last_timestamp = chunk[-1].timestamp
+                chunks += 1
+                if chunks % PROGRESS_EVERY_CHUNKS == 0:
+                    logger.info(f"{path}: {self.frames:,} frame, {len(self.ids.alarms):,} alarm")
+        finally:
+            reader.stop()
+            self.elapsed += time.perf_counter() - started
+        self.files += 1
+        
+    def run(self, paths: Iterable[str], limit: Optional[int] = None) -> Dict[str, Any]:
+        """Dosyaları sırayla oynat ve raporu döndür"""
+        for path in paths:
+            logger.info(f"Oynatılıyor: {path}")
+            self.replay_file(path, limit)
+        return self.report()
+        
+    def report(self) -> Dict[str, Any]:
+        """Replay özeti: hız, kayıt süresi ve alarm toplamları"""
+        recorded = (self.last_timestamp - self.first_timestamp) if self.first_timestamp is not None else 0.0
+        return {
+            'files': self.files,
+            'frames': self.frames,
+            'skipped': self.skipped,
+            'recorded_seconds': round(recorded, 3),
+            'elapsed_seconds': round(self.elapsed, 3),
+            'frames_per_second': round(self.frames / self.elapsed) if self.elapsed > 0 else 0,
+            'speedup': round(recorded / self.elapsed, 1) if self.elapsed > 0 else 0.0,
+            'alarms': self.ids.alarms.get_statistics(),
+            'detectors': self.ids.pipeline.get_statistics(),
+        }
+
+
+def main():
+    """Ana fonksiyon"""
+    import sys
+    
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:] if arg.startswith('--') and '=' in arg)
+    paths = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if not paths:
+        logger.info("Kullanım: python ids_replay.py [--chunk=N] [--limit=N] [--verbose] capture.log [capture.blf ...]")
+        sys.exit(1)
+        
+    # Alarm satırları varsayılan olarak rapora toplanır; --verbose ile (hız sınırlı) loglanır
+    if '--verbose' not in sys.argv:
+        defense_mechanisms.logger.setLevel(logging.ERROR)
+        
+    replay = IDSReplay(chunk_size=int(options.get('chunk', DEFAULT_CHUNK_SIZE)))
+    limit = int(options['limit']) if 'limit' in options else None
+    report = replay.run(paths, limit)
+    
+    logger.info("\n=== Replay Raporu ===")
+    logger.info(f"Dosya: {report['files']}, frame: {report['frames']:,} (atlanan: {report['skipped']})")
+    logger.info(f"Kayıt süresi: {report['recorded_seconds']} sn, işlem süresi: {report['elapsed_seconds']} sn "
+                f"→ {report['frames_per_second']:,} frame/s (x{report['speedup']} gerçek zaman)")
+    alarms = report['alarms']
+    logger.info(f"Alarm: {alarms['total']:,} (farklı tip/ID: {alarms['unique']})")
+    for aggregate in alarms['aggregates']:
+        logger.info(f"  [{aggregate['type']}] {aggregate['can_id']}: {aggregate['count']:,} "
+                    f"({aggregate['first_seen']} → {aggregate['last_seen']})")
+
+
+if __name__ == "__main__":
+    listener = setup_async_logging() if ASYNC_LOGGING_ENABLED else None
+    try:
+        main()
+    finally:
+        if listener:
+            listener.stop()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Gecikme Histogramı
+IDS dedektörleri, CAN TX kuyruğu, firewall ve OCPP istemcileri için ortak,
+bağımlılığı olmayan sabit bellekli gecikme histogramı.
+"""
+
+from typing import Any, Dict
+
+# Gecikme histogramı: 2'nin kuvveti ns kovaları (oktav), 64 ns .. ~1 ms
+_HISTOGRAM_MIN_BITS = 6
+_HISTOGRAM_BUCKETS = 15
+# Her oktav 4 doğrusal alt kovaya bölünür (yüzdelik hatası kova genişliğinin %25'i)
+_SUB_BUCKET_BITS = 2
+_SUB_BUCKETS = 1 << _SUB_BUCKET_BITS
+# OCPP/WebSocket gidiş-dönüş süreleri için: 64 ns .. ~1 dk
+OCPP_LATENCY_BUCKETS = 30
+
+
+class LatencyHistogram:
+    """
+    2'nin kuvveti ns kovalarında gecikme histogramı (kayıt O(1), bellek sabit)
+    
+    Her kova (oktav) 4 eşit genişlikte alt kovaya bölünür; yüzdelikler alt
+    kovanın üst sınırıdır ve gözlenen en büyük değerle sınırlanır, yani
+    gerçek değeri en fazla ~%25 fazla gösterir (düz oktavda 2 kat).
+    """
+    
+    __slots__ = ('buckets', 'count', 'total_ns', 'max_ns', '_last_index')
+    
+    def __init__(self, bucket_count: int = _HISTOGRAM_BUCKETS):
+        """
+        Args:
+            bucket_count: Oktav sayısı (varsayılan 64 ns .. ~1 ms; ağ gecikmeleri için
+                OCPP_LATENCY_BUCKETS ~1 dk'ya kadar kapsar)
+        """
+        self.buckets = [0] * (bucket_count << _SUB_BUCKET_BITS)
+        self._last_index = len(self.buckets) - 1
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        
+    def record(self, elapsed_ns: int):
+        # Frame başına çağrılır: _HISTOGRAM_MIN_BITS (6) ve _SUB_BUCKET_BITS (2) satır içi
+        bits = elapsed_ns.bit_length()
+        if bits < 6:
+            index = 0
+        else:
+            # Oktav, ardından en anlamlı bitin altındaki 2 bit alt kovayı seçer
+            index = (bits - 6) << 2 | (elapsed_ns >> (bits - 3)) & 3
+            if index > self._last_index:
+                index = self._last_index
+        self.buckets[index] += 1
+        self.count += 1
+        self.total_ns += elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+            
+    @staticmethod
+    def bucket_limit_ns(index: int) -> int:
+        """Alt kovanın üst sınırı (ns)"""
+        octave, sub_bucket = divmod(index, _SUB_BUCKETS)
+        return (_SUB_BUCKETS + sub_bucket + 1) << (octave + _HISTOGRAM_MIN_BITS - 1 - _SUB_BUCKET_BITS)
+        
+    def percentile(self, q: float) -> int:
+        """Yaklaşık yüzdelik (alt kova üst sınırı, en fazla max_ns; ns)"""
+        if not self.count:
+            return 0
+        target = q / 100 * self.count
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= target:
+                return min(self.bucket_limit_ns(index), self.max_ns)
+        return self.max_ns
+        
+    def merge(self, other: 'LatencyHistogram'):
+        """Başka bir histogramı (ör. başka süreçten gelen) bu histograma ekle"""
+        if len(other.buckets) > len(self.buckets):
+            self.buckets.extend([0] * (len(other.buckets) - len(self.buckets)))
+            self._last_index = len(self.buckets) - 1
+        for index, bucket in enumerate(other.buckets):
+            self.buckets[index] += bucket
+        self.count += other.count
+        self.total_ns += other.total_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+        
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'mean_ns': self.total_ns // self.count if self.count else 0,
+            'p50_ns': self.percentile(50),
+            'p99_ns': self.percentile(99),
+            'max_ns': self.max_ns,
+            'histogram': {f"<{self.bucket_limit_ns(i)}ns": n for i, n in enumerate(self.buckets) if n},
+        }
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+MeterValues Birleştirici
+CAN'dan gelen sayaç örneklerini connector başına bir zaman penceresinde
+toplar ve tek bir OCPP MeterValues çağrısı (çok öğeli `meter_value`) olarak
+arka planda gönderir; CAN işleme döngüsü CSMS yanıtını beklemez.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Connector başına birleştirme penceresi (saniye)
+DEFAULT_METER_WINDOW = 1.0
+# Tek çağrıdaki en fazla örnek (dolunca pencere beklenmeden gönderilir)
+DEFAULT_MAX_SAMPLES = 32
+# Connector başına bekleyen en fazla örnek (CSMS yanıt vermezken bellek sınırı)
+DEFAULT_MAX_PENDING = 1024
+
+
+class MeterValueCoalescer:
+    """
+    Connector başına zaman pencereli MeterValues birleştirici
+    
+    İlk örnek geldiğinde connector için `window` saniyelik zamanlayıcı kurulur;
+    pencere içinde gelen örnekler (her biri kendi zaman damgasıyla ayrı
+    `meter_value` öğesi) tek çağrıda gönderilir. Gönderim arka plan görevidir.
+    Connector başına aynı anda tek çağrı uçuştadır: CSMS yavaşsa yeni örnekler
+    birikir ve çağrı bitince tek seferde gönderilir (yavaş CSMS'e daha çok değil,
+    daha büyük çağrılar gider). Birikim `max_pending`'i aşarsa en eski örnek atılır.
+    
+    `window=0` birleştirme yapmaz, yalnızca gönderimi arka plana alır.
+    
+    Örnek:
+        coalescer = MeterValueCoalescer(cp._send_meter_values, window=1.0)
+        coalescer.add(connector_id, meter_value_entry(energy))
+        ...
+        await coalescer.flush()
+    """
+    
+    def __init__(self, send: Callable[[int, List[dict]], Awaitable[Any]], window: float = DEFAULT_METER_WINDOW,
+                 max_samples: int = DEFAULT_MAX_SAMPLES, max_pending: int = DEFAULT_MAX_PENDING,
+                 name: str = 'meter'):
+        """
+        Args:
+            send: `await send(connector_id, meter_value)` - tek MeterValues çağrısı
+            window: Birleştirme penceresi (saniye)
+            max_samples: Çağrı başına en fazla örnek
+            max_pending: Connector başına bekleyen en fazla örnek
+            name: Log ve metriklerde kullanılacak ad
+        """
+        self.send = send
+        self.window = window
+        self.max_samples = max_samples
+        self.max_pending = max_pending
+        self.name = name
+        self._pending: Dict[int, Deque[dict]] = {}
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._in_flight: Dict[int, asyncio.Task] = {}
+        self._closed = False
+        
+        # Metrikler
+        self.samples = 0
+        self.calls = 0
+        self.failed_calls = 0
+        self.dropped = 0
+        self.largest_call = 0
+        
+    def add(self, connector_id: int, entry: dict):
+        """
+        Örneği connector kuyruğuna ekle (beklemez, CAN döngüsünden çağrılır)
+        
+        Args:
+            connector_id: Connector
+            entry: `meter_value` öğesi (timestamp + sampledValue)
+        """
+        if self._closed:
+            return
+        pending = self._pending.get(connector_id)
+        if pending is None:
+            pending = self._pending[connector_id] = deque(maxlen=self.max_pending)
+        if len(pending) == self.max_pending:
+            self.dropped += 1
+        pending.append(entry)
+        self.samples += 1
+        
+        if connector_id in self._in_flight:
+            return  # Çağrı bitince gönderilir
+        if len(pending) >= self.max_samples or self.window <= 0:
+            self._flush(connector_id)
+        elif connector_id not in self._timers:
+            self._timers[connector_id] = asyncio.get_running_loop().call_later(
+                self.window, self._flush, connector_id)
+                
+    def _flush(self, connector_id: int):
+        """Bekleyen örneklerden bir çağrı oluştur ve arka planda gönder"""
+        timer = self._timers.pop(connector_id, None)
+        if timer is not None:
+            timer.cancel()
+        pending = self._pending.get(connector_id)
+        if not pending or connector_id in self._in_flight:
+            return
+        count = min(len(pending), self.max_samples)
+        meter_value = [pending.popleft() for _ in range(count)]
+        task = asyncio.get_running_loop().create_task(self._send(connector_id, meter_value))
+        self._in_flight[connector_id] = task
+        
+    async def _send(self, connector_id: int, meter_value: List[dict]):
+        self.calls += 1
+        if len(meter_value) > self.largest_call:
+            self.largest_call = len(meter_value)
+        try:
+            await self.send(connector_id, meter_value)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed_calls += 1
+            logger.error(f"[{self.name}] MeterValues gönderme hatası (connector {connector_id}, "
+                         f"{len(meter_value)} örnek): {e}")
+        finally:
+            del self._in_flight[connector_id]
+        # Çağrı sürerken biriken örnekler: en az bir pencere beklediler, hemen gönder
+        if not self._closed and self._pending.get(connector_id):
+            self._flush(connector_id)
+            
+    async def flush(self):
+        """Bekleyen tüm örnekleri gönder ve uçuştaki çağrıların bitmesini bekle"""
+        while self._in_flight or any(self._pending.values()):
+            for connector_id in list(self._pending):
+                self._flush(connector_id)
+            await asyncio.gather(*self._in_flight.values(), return_exceptions=True)
+            
+    def get_metrics(self) -> Dict[str, Any]:
+        """Birleştirme metrikleri (samples_per_call = CSMS'e giden çağrı başına örnek)"""
+        return {
+            'window': self.window,
+            'samples': self.samples,
+            'calls': self.calls,
+            'failed_calls': self.failed_calls,
+            'samples_per_call': round(self.samples / self.calls, 2) if self.calls else 0,
+            'largest_call': self.largest_call,
+            'pending': sum(len(pending) for pending in self._pending.values()),
+            'in_flight': len(self._in_flight),
+            'dropped': self.dropped,
+        }
+        
+    def close(self):
+        """Zamanlayıcıları ve uçuştaki çağrıları iptal et (bekleyen örnekler atılır)"""
+        if self._closed:
+            return
+        self._closed = True
+        for timer in self._timers.values():
+            timer.cancel()
+        for task in self._in_flight.values():
+            task.cancel()
+        self._timers.clear()
+        metrics = self.get_metrics()
+        if metrics['pending']:
+            logger.warning(f"[{self.name}] Kapatılırken gönderilmemiş {metrics['pending']} sayaç örneği atıldı")
+        logger.debug(f"[{self.name}] MeterValues birleştirici kapatıldı: {metrics}")
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Giden OCPP Çağrı Hattı
+CP'den CSMS'e giden çağrılar öncelik şeritli bir kuyruktan sınırlı sayıda
+gönderici görevle gönderilir. Bağlantı yokken işlem verisi (MeterValues,
+StatusNotification, Start/StopTransaction) diskteki ekleme-only tampona yazılır
+ve yeniden bağlanınca sırasıyla tekrar gönderilir.
+"""
+
+import asyncio
+import dataclasses
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from itertools import count
+from typing import Any, Dict, List, Optional, Tuple
+
+import websockets
+from ocpp.v16 import call
+
+from latency_histogram import OCPP_LATENCY_BUCKETS, LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# Öncelik şeritleri (küçük değer önce gönderilir)
+LANE_STATUS = 0       # Durum / kayıt: CSMS'in CP'yi doğru görmesi için önce
+LANE_TRANSACTION = 1  # İşlem olayları ve canlılık
+LANE_BULK = 2         # Toplu sayaç verisi
+ACTION_LANES = {
+    'BootNotification': LANE_STATUS,
+    'StatusNotification': LANE_STATUS,
+    'StartTransaction': LANE_TRANSACTION,
+    'StopTransaction': LANE_TRANSACTION,
+    'Heartbeat': LANE_TRANSACTION,
+    'MeterValues': LANE_BULK,
+}
+# Bağlantı yokken kaybedilmemesi gereken çağrılar (OCPP 1.6: işlem mesajları kuyruklanır)
+PERSISTENT_ACTIONS = frozenset({'MeterValues', 'StatusNotification', 'StartTransaction', 'StopTransaction'})
+
+# OCPP-J bir CP için tek açık çağrı önerir; 2, sıradaki çağrının şema doğrulamasını
+# öncekinin yanıtı beklenirken yapar (ocpp kütüphanesi gönderimi kilitle sıralar)
+DEFAULT_MAX_IN_FLIGHT = 1
+# Bellekteki en fazla bekleyen çağrı
+DEFAULT_MAX_QUEUE = 1024
+
+# Tampon kaydı: uint32 uzunluk (küçük endian) + JSON gövde
+_RECORD_HEADER = struct.Struct('<I')
+_CURSOR = struct.Struct('<Q')
+
+
+class OutboxFull(Exception):
+    """Bellek kuyruğu dolu ve çağrı diske yazılamıyor"""
+
+
+class Offline(ConnectionError):
+    """Bağlantı yok ve çağrı kalıcı değil (ör. Heartbeat)"""
+
+
+class OfflineBuffer:
+    """
+    Diskte ekleme-only çağrı tamponu
+    
+    Kayıtlar `<uzunluk><JSON>` olarak dosya sonuna eklenir, hiç yerinde
+    değiştirilmez; okunan konum ayrı 8 byte'lık `.cursor` dosyasında tutulur.
+    Tekrar gönderim dosyayı memory-map ile okur. Tüm kayıtlar gönderilince
+    dosya sıfırlanır. Açılışta yarım kalmış son kayıt (çökme) kesilir; süreç
+    yeniden başlasa da gönderilmemiş kayıtlar kaybolmaz.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.cursor_path = f"{path}.cursor"
+        self._file = open(path, 'ab')
+        self.size = self._recover()
+        self._cursor_fd = os.open(self.cursor_path, os.O_RDWR | os.O_CREAT, 0o644)
+        raw = os.pread(self._cursor_fd, _CURSOR.size, 0)
+        self.offset = min(_CURSOR.unpack(raw)[0], self.size) if len(raw) == _CURSOR.size else 0
+        self.appended = 0
+        
+    def _recover(self) -> int:
+        """Tam kayıtların bittiği konumu bul, sonrasını (yarım kayıt) kes"""
+        size = os.path.getsize(self.path)
+        end = 0
+        if size:
+            with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                while end + _RECORD_HEADER.size <= size:
+                    length, = _RECORD_HEADER.unpack_from(view, end)
+                    if end + _RECORD_HEADER.size + length > size:
+                        break
+                    end += _RECORD_HEADER.size + length
+        if end != size:
+            logger.warning(f"Offline tampon: yarım kayıt kesildi ({self.path}, {size - end} byte)")
+            self._file.truncate(end)
+        return end
+        
+    @property
+    def pending(self) -> bool:
+        return self.offset < self.size
+        
+    def append(self, record: Dict[str, Any]):
+        body = json.dumps(record, separators=(',', ':')).encode()
+        self._file.write(_RECORD_HEADER.pack(len(body)) + body)
+        self._file.flush()
+        self.size += _RECORD_HEADER.size + len(body)
+        self.appended += 1
+        
+    def read(self, max_records: int = 64) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Okunmamış kayıtlar (dosya sırasıyla)
+        
+        Returns:
+            (kaydın bitiş konumu, kayıt) listesi; konum `commit`e verilir
+        """
+        records = []
+        if not self.pending:
+            return records
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), self.size, access=mmap.ACCESS_READ) as view:
+            position = self.offset
+            while position < self.size and len(records) < max_records:
+                length, = _RECORD_HEADER.unpack_from(view, position)
+                start = position + _RECORD_HEADER.size
+                position = start + length
+                records.append((position, json.loads(view[start:position])))
+        return records
+        
+    def commit(self, offset: int):
+        """Kaydı gönderildi olarak işaretle; tampon boşaldıysa dosyayı sıfırla"""
+        if offset >= self.size:
+            self._file.truncate(0)
+            self.size = self.offset = 0
+        else:
+            self.offset = offset
+        os.pwrite(self._cursor_fd, _CURSOR.pack(self.offset), 0)
+        
+    def close(self):
+        self._file.close()
+        os.close(self._cursor_fd)
+
+
+class OutboundCall:
+    """Kuyruktaki tek çağrı"""
+    
+    __slots__ = ('lane', 'seq', 'request', 'future', 'enqueued_ns')
+    
+    def __init__(self, lane: int, seq: int, request, future: asyncio.Future):
+        self.lane = lane
+        self.seq = seq
+        self.request = request
+        self.future = future
+        self.enqueued_ns = time.monotonic_ns()
+        
+    def __lt__(self, other: 'OutboundCall') -> bool:
+        # Aynı şeritte gönderim sırası korunur
+        return (self.lane, self.seq) < (other.lane, other.seq)
+        
+    @property
+    def action(self) -> str:
+        return type(self.request).__name__
+
+
+def request_to_record(request) -> Dict[str, Any]:
+    """OCPP call nesnesi → tampon kaydı"""
+    return {'action': type(request).__name__, 'payload': dataclasses.asdict(request), 'ts': time.time()}
+
+
+def record_to_request(record: Dict[str, Any]):
+    """Tampon kaydı → OCPP call nesnesi"""
+    return getattr(call, record['action'])(**record['payload'])
+
+
+class OCPPOutbox:
+    """
+    Öncelik şeritli, sınırlı eşzamanlılıklı giden çağrı hattı
+    
+    `submit` çağrıyı kuyruğa koyup hemen bir Future döndürür; `max_in_flight`
+    gönderici görev çağrıları şerit önceliğiyle (StatusNotification toplu
+    MeterValues'tan önce) `cp.call` ile gönderir. Bağlantı kopunca hat
+    çevrimdışına geçer: kalıcı çağrılar offline tampona (yoksa bellekte
+    bekler), diğerleri `Offline` hatasıyla sonuçlanır. `set_online` ile tampon
+    dosya sırasıyla tekrar gönderilir; tampon boşalana kadar yeni kalıcı
+    çağrılar da tampona eklenir, böylece CSMS sayaç verisini sırayla görür.
+    
+    Tampona yazılan çağrının Future'ı None ile (CSMS yanıtı olmadan) tamamlanır.
+    
+    Örnek:
+        outbox = OCPPOutbox(cp, offline_path='CP001.outbox')
+        response = await outbox.call(call.StatusNotification(...))
+    """
+    
+    def __init__(self, cp, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, max_queue: int = DEFAULT_MAX_QUEUE,
+                 offline_path: Optional[str] = None):
+        """
+        Args:
+            cp: `call()` sunan OCPP ChargePoint
+            max_in_flight: Eşzamanlı gönderici görev sayısı
+            max_queue: Bellekte bekleyen en fazla çağrı
+            offline_path: Offline tampon dosyası (None ise çevrimdışı kalıcı çağrılar bellekte bekler)
+        """
+        self.cp = cp
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.buffer = OfflineBuffer(offline_path) if offline_path else None
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._online: Optional[asyncio.Event] = None
+        self._workers: List[asyncio.Task] = []
+        self._replay_task: Optional[asyncio.Task] = None
+        self._seq = count()
+        self._closed = False
+        self.in_flight = 0
+        self.latency = LatencyHistogram(OCPP_LATENCY_BUCKETS)
+        self.stats = {
+            'submitted': 0,
+            'sent': 0,
+            'failed': 0,
+            'call_errors': 0,
+            'rejected_offline': 0,
+            'rejected_full': 0,
+            'buffered': 0,
+            'replayed': 0,
+        }
+        if self.buffer is not None and self.buffer.pending:
+            logger.info(f"[{cp.id}] Offline tamponda önceki oturumdan gönderilmemiş kayıtlar var "
+                        f"({self.buffer.size - self.buffer.offset} byte)")
+                        
+    def _ensure_started(self):
+        """Kuyruk ve görevleri ilk kullanımda kur (çalışan event loop gerekir)"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._online = asyncio.Event()
+        self._online.set()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_in_flight)]
+        if self.buffer is not None and self.buffer.pending:
+            self._replay_task = asyncio.create_task(self._replay())
+            
+    @property
+    def online(self) -> bool:
+        return self._online is None or self._online.is_set()
+        
+    def submit(self, request, lane: Optional[int] = None) -> asyncio.Future:
+        """
+        Çağrıyı kuyruğa koy (beklemez)
+        
+        Args:
+            request: ocpp.v16.call nesnesi
+            lane: Öncelik şeridi (None ise ACTION_LANES'ten)
+            
+        Returns:
+            CSMS yanıtıyla (tampona yazıldıysa None) tamamlanan Future
+        """
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        action = type(request).__name__
+        self.stats['submitted'] += 1
+        if self._closed:
+            future.set_exception(Offline("Giden çağrı hattı kapatıldı"))
+            return future
+        persistent = action in PERSISTENT_ACTIONS
+        if persistent and self.buffer is not None and (not self.online or self.buffer.pending):
+            # Çevrimdışı veya tekrar gönderim sürüyor: sıra korunsun diye tampon sonuna
+            self._buffer(request, future)
+        elif not persistent and not self.online:
+            self.stats['rejected_offline'] += 1
+            future.set_exception(Offline(f"{action}: CSMS bağlantısı yok"))
+        elif self._queue.qsize() >= self.max_queue:
+            if persistent and self.buffer is not None:
+                self._buffer(request, future)
+            else:
+                self.stats['rejected_full'] += 1
+                future.set_exception(OutboxFull(f"{action}: giden kuyruk dolu ({self.max_queue})"))
+        else:
+            lane = ACTION_LANES.get(action, LANE_TRANSACTION) if lane is None else lane
+            self._queue.put_nowait(OutboundCall(lane, next(self._seq), request, future))
+        return future
+        
+    async def call(self, request, lane: Optional[int] = None):
+        """submit + yanıtı bekle"""
+        return await self.submit(request, lane)
+        
+    def _buffer(self, request, future: asyncio.Future):
+        self.buffer.append(request_to_record(request))
+        self.stats['buffered'] += 1
+        if not future.done():
+            future.set_result(None)
+        if self.online and (self._replay_task is None or self._replay_task.done()):
+            self._replay_task = asyncio.create_task(self._replay())
+            
+    async def _worker(self):
+        """Gönderici görev: en öncelikli çağrıyı al, bağlantı varsa gönder"""
+        while True:
+            await self._online.wait()
+            item: OutboundCall = await self._queue.get()
+            if item.future.done():  # Çağıran iptal etti
+                continue
+            if not self.online:
+                self._hold(item)
+                continue
+            self.in_flight += 1
+            try:
+                response = await self.cp.call(item.request)
+            except websockets.ConnectionClosed:
+                self.set_offline()
+                self._hold(item)
+            except asyncio.TimeoutError as e:
+                if not self.online:
+                    # Yanıt beklenirken bağlantı koptu: çağrı CSMS'e ulaşmamış olabilir
+                    self._hold(item)
+                else:
+                    self.stats['failed'] += 1
+                    if not item.future.done():
+                        item.future.set_exception(e)
+            except Exception as e:
+                self.stats['failed'] += 1
+                if not item.future.done():
+                    item.future.set_exception(e)
+            else:
+                self.stats['sent'] += 1
+                if response is None:
+                    self.stats['call_errors'] += 1
+                self.latency.record(time.monotonic_ns() - item.enqueued_ns)
+                if not item.future.done():
+                    item.future.set_result(response)
+            finally:
+                self.in_flight -= 1
+                
+    def _hold(self, item: OutboundCall):
+        """Bağlantı yokken alınmış çağrı: kalıcıysa tampona / kuyruğa geri, değilse hata"""
+        if item.action not in PERSISTENT_ACTIONS:
+            self.stats['rejected_offline'] += 1
+            if not item.future.done():
+                item.future.set_exception(Offline(f"{item.action}: CSMS bağlantısı yok"))
+        elif self.buffer is not None:
+            self._buffer(item.request, item.future)
+        else:
+            # Aynı (şerit, sıra) ile geri konur; bağlantı gelince ilk bu gider
+            self._queue.put_nowait(item)
+            
+    async def _replay(self):
+        """Offline tamponu dosya sırasıyla gönder (tampon boşalana veya bağlantı kopana kadar)"""
+        buffer = self.buffer
+        replayed = 0
+        while self.online and buffer.pending:
+            for end, record in buffer.read():
+                try:
+                    response = await self.cp.call(record_to_request(record))
+                except websockets.ConnectionClosed:
+                    self.set_offline()
+                    return
+                except asyncio.TimeoutError:
+                    # Kayıt tamponda kalır; sıra bozulmasın diye sonraki kayıtlara geçilmez
+                    logger.warning(f"[{self.cp.id}] Offline tampon gönderimi zaman aşımı, tekrar denenecek")
+                    await asyncio.sleep(1.0)
+                    break
+                except Exception as e:
+                    logger.error(f"[{self.cp.id}] Offline kayıt atlandı ({record['action']}): {e}")
+                else:
+                    if response is None:
+                        self.stats['call_errors'] += 1
+                    replayed += 1
+                    self.stats['replayed'] += 1
+                buffer.commit(end)
+        if replayed:
+            logger.info(f"[{self.cp.id}] Offline tampondan {replayed} çağrı tekrar gönderildi")
+            
+    def set_offline(self):
+        """Bağlantı koptu - gönderimi durdur (kalıcı çağrılar tampona/kuyrukta bekler)"""
+        self._ensure_started()
+        if self._online.is_set():
+            self._online.clear()
+            logger.warning(f"[{self.cp.id}] CSMS bağlantısı yok, giden çağrılar "
+                           f"{'offline tampona yazılıyor' if self.buffer is not None else 'bellekte bekletiliyor'}")
+                           
+    def set_online(self):
+        """Bağlantı kuruldu - offline tamponu sırayla gönder, kuyruğu yeniden başlat"""
+        self._ensure_started()
+        if self._online.is_set():
+            return
+        self._online.set()
+        if self.buffer is not None and self.buffer.pending and (self._replay_task is None or self._replay_task.done()):
+            self._replay_task = asyncio.create_task(self._replay())
+            
+    def get_metrics(self) -> Dict[str, Any]:
+        """Hat metrikleri (latency: kuyruğa girişten yanıta)"""
+        metrics = {
+            **self.stats,
+            'online': self.online,
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'in_flight': self.in_flight,
+            'latency': self.latency.to_dict(),
+        }
+        if self.buffer is not None:
+            metrics['offline_buffer_bytes'] = self.buffer.size - self.buffer.offset
+        return metrics
+        
+    def close(self):
+        """Görevleri durdur; bekleyen kalıcı çağrılar mümkünse tampona yazılır"""
+        if self._closed:
+            return
+        self._closed = True
+        for task in self._workers:
+            task.cancel()
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+        if self._queue is not None:
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item.action in PERSISTENT_ACTIONS and self.buffer is not None:
+                    self.buffer.append(request_to_record(item.request))
+                    self.stats['buffered'] += 1
+                if not item.future.done():
+                    item.future.cancel()
+        if self.buffer is not None:
+            self.buffer.close()
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Payload Profilleme ve Anomali Skoru
+CAN ID başına byte pozisyonu değer aralıkları, byte değer dağılımları (Shannon
+entropisi) ve bit flip oranlarını sabit boyutlu sayım tablolarında öğrenir;
+eğitimden sonra frame'leri sabit sürede (ID başına örnekleyerek) skorlar.
+"""
+
+import logging
+from operator import getitem
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+
+import numpy as np
+
+from can_gateway import CAN_IDS, FRAME_SIZE
+from ids_detectors import Detector, FrameContext
+
+logger = logging.getLogger(__name__)
+
+# Profil tablosu kapasitesi (farklı CAN ID)
+DEFAULT_MAX_IDS = 512
+# Eğitim fazı uzunluğu (toplam frame) - CANIDS varsayılanı
+PAYLOAD_TRAINING_FRAMES = 10_000
+# Skorlama için ID başına gereken en az eğitim frame'i
+MIN_PROFILE_FRAMES = 20
+# Eğitim sonrası ID başına her N. frame skorlanır (1: her frame); örnekleme IDS throughput'unu korur
+PAYLOAD_SCORE_SAMPLE = 8
+# Beklenen sürprizin (entropi) üzerindeki bit cinsinden alarm eşiği
+SURPRISE_THRESHOLD_BITS = 24.0
+# Additive yumuşatma: pozisyon başına toplam 1 sahte sayım (görülmemiş değer olasılığı sıfır olmasın)
+_SMOOTHING = 1.0 / 256
+
+# Monoton artan sayaç/zaman damgası sinyalleri (mesaj adı → sinyal adları); DBC ile
+# signal_byte_positions() üzerinden COUNTER_BYTES yerine kullanılabilir
+COUNTER_SIGNALS = MappingProxyType({'MeterValues': ('energy', 'timestamp')})
+# Yerleşik frame düzeninde sayaç byte'ları: MeterValues '<BIBH' → energy 1-4, timestamp 6-7.
+# Bu pozisyonlar aralık, donmuş bit ve sürpriz skorlamasına katılmaz (eğitimde görülmemiş
+# değerler normaldir)
+COUNTER_BYTES = MappingProxyType({CAN_IDS['MeterValues']: (1, 2, 3, 4, 6, 7)})
+
+_VALUES = 256
+_BITS = FRAME_SIZE * 8
+# Skor tablosunda aralık dışı byte'ın ağırlığı: toplam sürprizden (|x| < 2^9) ayrılabilecek kadar büyük
+_RANGE_WEIGHT = float(1 << 16)
+
+
+class PayloadProfiler:
+    """
+    CAN ID başına artımlı payload profili
+    
+    Tüm tablolar profil slot'u ile indekslenen önceden ayrılmış NumPy
+    dizileridir (ID → slot eşlemesi dict'te); frame yolundaki okuma/yazmalar
+    memoryview üzerinden yapılır. Eğitim bitince (`finish_training`) her
+    (pozisyon, değer) için entropi üstü sürpriz ve aralık dışı bayrağı
+    vektörel olarak tek tabloya indirilir; skorlama byte başına tek tablo
+    okumasıdır (C düzeyinde `map`/`sum`, Python döngüsü yok). Donmuş bit
+    kontrolü (payload'ın int'e çevrilmesi + XOR) yalnızca donmuş biti olan
+    ID'lerde yapılır.
+    
+    Skor bileşenleri:
+      - sürpriz: Σ (-log2 p(değer) - H(pozisyon)) → eşik üstü ise anomali
+      - aralık: eğitimde görülen [min, max] dışında byte
+      - donmuş bitler: eğitimde hiç değişmemiş bitin değişmesi
+      - DLC: eğitimde görülmemiş payload uzunluğu
+      
+    Sayaç byte'ları (`counter_bytes`) skora katılmaz. Skorlama ID başına her
+    `sample_every`. frame'de yapılır; aradaki frame'ler yalnızca sayılır.
+    """
+    
+    def __init__(self, max_ids: int = DEFAULT_MAX_IDS, threshold_bits: float = SURPRISE_THRESHOLD_BITS,
+                 min_frames: int = MIN_PROFILE_FRAMES, sample_every: int = PAYLOAD_SCORE_SAMPLE,
+                 counter_bytes: Mapping[int, Iterable[int]] = COUNTER_BYTES):
+        """
+        Args:
+            max_ids: Profillenecek en fazla CAN ID
+            threshold_bits: Sürpriz skoru alarm eşiği (bit)
+            min_frames: Skorlama için ID başına en az eğitim frame'i
+            sample_every: ID başına her N. frame skorlanır (1: her frame)
+            counter_bytes: CAN ID → skorlamadan çıkarılan sayaç/zaman damgası byte pozisyonları
+        """
+        self.max_ids = max_ids
+        self.threshold_bits = threshold_bits
+        self.min_frames = min_frames
+        self.sample_every = max(1, sample_every)
+        self.counter_bytes = {can_id: tuple(positions) for can_id, positions in counter_bytes.items()}
+        self.training = True
+        self.slots: Dict[int, int] = {}
+        self.trained_frames = 0
+        self.scored_frames = 0
+        self.skipped_frames = 0  # Örnekleme dışında kalan (skorlanmayan) frame
+        self.anomalies = 0
+        self.unprofiled_frames = 0  # Kapasite dışı veya eğitimde görülmemiş ID
+        
+        # Eğitim sayımları
+        self.frames = np.zeros(max_ids, dtype=np.uint32)
+        self.value_counts = np.zeros((max_ids, FRAME_SIZE, _VALUES), dtype=np.uint32)
+        self.byte_min = np.full((max_ids, FRAME_SIZE), 0xFF, dtype=np.uint8)
+        self.byte_max = np.zeros((max_ids, FRAME_SIZE), dtype=np.uint8)
+        self.flip_counts = np.zeros((max_ids, _BITS), dtype=np.uint32)
+        self.dlc_mask = np.zeros(max_ids, dtype=np.uint16)  # Görülen DLC'ler (bit başına bir DLC)
+        
+        # Baseline (finish_training sonrası)
+        # -log2 p(değer) - H(pozisyon), değer eğitim aralığı dışındaysa + _RANGE_WEIGHT
+        self.score_table = np.zeros((max_ids, FRAME_SIZE, _VALUES), dtype=np.float64)
+        self.entropy = np.zeros((max_ids, FRAME_SIZE), dtype=np.float32)
+        self.frozen_mask = np.zeros(max_ids, dtype=np.uint64)
+        
+        self._bind_views()
+        self._last = [None] * max_ids  # Slot başına son payload (int), bit flip için
+        self._skip = [0] * max_ids  # Slot başına bir sonraki skorlamaya kalan frame
+        
+    def _bind_views(self):
+        """Frame yolunda kullanılan düz memoryview'lar"""
+        self._frames_view = memoryview(self.frames).cast('B').cast('I')
+        self._counts_view = memoryview(self.value_counts).cast('B').cast('I')
+        self._min_view = memoryview(self.byte_min).cast('B')
+        self._max_view = memoryview(self.byte_max).cast('B')
+        self._flips_view = memoryview(self.flip_counts).cast('B').cast('I')
+        self._dlc_view = memoryview(self.dlc_mask).cast('B').cast('H')
+        # Slot başına pozisyon satırları: satır[pozisyon][değer] → skor tablosu girdisi
+        score_view = memoryview(self.score_table).cast('B').cast('d')
+        self._score_rows = [[score_view[row * _VALUES:(row + 1) * _VALUES]
+                             for row in range(slot * FRAME_SIZE, (slot + 1) * FRAME_SIZE)]
+                            for slot in range(self.max_ids)]
+        self._frozen = self.frozen_mask.tolist()
+        self._scorable = [False] * self.max_ids
+        
+    def _slot(self, can_id: int) -> Optional[int]:
+        slot = self.slots.get(can_id)
+        if slot is None and self.training and len(self.slots) < self.max_ids:
+            slot = self.slots[can_id] = len(self.slots)
+        return slot
+        
+    def train(self, can_id: int, data):
+        """Eğitim fazında frame'i profile ekle"""
+        slot = self._slot(can_id)
+        if slot is None:
+            self.unprofiled_frames += 1
+            return
+        self.trained_frames += 1
+        self._frames_view[slot] += 1
+        length = min(len(data), FRAME_SIZE)
+        self._dlc_view[slot] |= 1 << length
+        
+        counts = self._counts_view
+        byte_min = self._min_view
+        byte_max = self._max_view
+        base = slot * FRAME_SIZE
+        for position in range(length):
+            value = data[position]
+            counts[(base + position) * _VALUES + value] += 1
+            index = base + position
+            if value < byte_min[index]:
+                byte_min[index] = value
+            if value > byte_max[index]:
+                byte_max[index] = value
+                
+        payload = int.from_bytes(data[:length], 'little')
+        last = self._last[slot]
+        if last is not None:
+            flips = payload ^ last
+            flip_base = slot * _BITS
+            while flips:
+                low = flips & -flips
+                self._flips_view[flip_base + low.bit_length() - 1] += 1
+                flips ^= low
+        self._last[slot] = payload
+        
+    def finish_training(self):
+        """Eğitimi bitir: sürpriz/aralık tabloları, entropi ve donmuş bit maskesini hesapla"""
+        frames = self.frames.astype(np.float64)[:, None, None]
+        probabilities = (self.value_counts + _SMOOTHING) / (frames + _SMOOTHING * _VALUES)
+        surprise = -np.log2(probabilities)
+        entropy = (probabilities * surprise).sum(axis=2)
+        self.entropy[:] = entropy
+        values = np.arange(_VALUES, dtype=np.uint8)
+        out_of_range = (values < self.byte_min[:, :, None]) | (values > self.byte_max[:, :, None])
+        self.score_table[:] = surprise - entropy[:, :, None] + out_of_range * _RANGE_WEIGHT
+        
+        frozen = self.flip_counts == 0
+        # Sayaç byte'ları: skor satırı sıfır, bitleri donmuş sayılmaz
+        for can_id, positions in self.counter_bytes.items():
+            slot = self.slots.get(can_id)
+            if slot is None:
+                continue
+            for position in positions:
+                if 0 <= position < FRAME_SIZE:
+                    self.score_table[slot, position] = 0.0
+                    frozen[slot, position * 8:(position + 1) * 8] = False
+        weights = np.uint64(1) << np.arange(_BITS, dtype=np.uint64)
+        self.frozen_mask[:] = (frozen.astype(np.uint64) * weights).sum(axis=1, dtype=np.uint64)
+        
+        self.training = False
+        self._bind_views()
+        self._scorable = (self.frames >= self.min_frames).tolist()
+        logger.info(f"Payload profili eğitildi: {len(self.slots)} CAN ID, {self.trained_frames} frame")
+        
+    def score(self, can_id: int, data) -> Tuple[float, Optional[str]]:
+        """
+        Frame'i skorla (sabit süre)
+        
+        ID başına yalnızca her `sample_every`. frame skorlanır; diğerleri
+        (0.0, None) döner. Donmuş bit kontrolü son skorlanan frame'e göre yapılır.
+        
+        Returns:
+            (sürpriz skoru bit, anomali açıklaması veya None)
+        """
+        slot = self.slots.get(can_id)
+        if slot is None or not self._scorable[slot]:
+            self.unprofiled_frames += 1
+            return 0.0, None
+        skip = self._skip[slot]
+        if skip:
+            self._skip[slot] = skip - 1
+            self.skipped_frames += 1
+            return 0.0, None
+        self._skip[slot] = self.sample_every - 1
+        self.scored_frames += 1
+        length = min(len(data), FRAME_SIZE)
+        
+        # Pozisyon başına tek okuma (map ilk FRAME_SIZE byte'ta durur); aralık dışı sayısı ağırlıktan ayrılır
+        total = sum(map(getitem, self._score_rows[slot], data), 0.0)
+        out_of_range = int((total + _RANGE_WEIGHT / 2) // _RANGE_WEIGHT)
+        score = total - out_of_range * _RANGE_WEIGHT
+        
+        frozen = self._frozen[slot]
+        if frozen:
+            payload = int.from_bytes(data[:length], 'little')
+            last = self._last[slot]
+            self._last[slot] = payload
+            frozen_flips = (payload ^ last) & frozen if last is not None else 0
+        else:
+            # Her bit eğitimde değişmiş: XOR'un sonucu her zaman 0 olurdu
+            frozen_flips = 0
+        unseen_dlc = not (self._dlc_view[slot] >> length) & 1
+        if score <= self.threshold_bits and not (out_of_range or frozen_flips or unseen_dlc):
+            return score, None
+            
+        # Anomali yolu (nadir): açıklamayı oluştur
+        reasons = []
+        if unseen_dlc:
+            reasons.append(f"DLC {length}")
+        if out_of_range:
+            reasons.append(f"{out_of_range} byte aralık dışı")
+        if frozen_flips:
+            reasons.append(f"{bin(frozen_flips).count('1')} donmuş bit değişti")
+        if score > self.threshold_bits:
+            reasons.append(f"sürpriz {score:.1f} bit")
+        self.anomalies += 1
+        return score, ", ".join(reasons)
+        
+    def profile(self, can_id: int) -> Dict[str, Any]:
+        """CAN ID profil özeti (aralıklar, entropi, bit flip oranları)"""
+        slot = self.slots.get(can_id)
+        if slot is None:
+            return {}
+        frames = int(self.frames[slot])
+        return {
+            'frames': frames,
+            'byte_min': self.byte_min[slot].tolist(),
+            'byte_max': self.byte_max[slot].tolist(),
+            'entropy_bits': [round(float(h), 3) for h in self.entropy[slot]] if not self.training else None,
+            'bit_flip_rate': (self.flip_counts[slot] / max(1, frames - 1)).round(3).tolist(),
+        }
+        
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            'training': self.training,
+            'profiled_ids': len(self.slots),
+            'trained_frames': self.trained_frames,
+            'scored_frames': self.scored_frames,
+            'skipped_frames': self.skipped_frames,
+            'anomalies': self.anomalies,
+            'unprofiled_frames': self.unprofiled_frames,
+        }
+
+
+class PayloadAnomalyDetector(Detector):
+    """
+    Payload profili tabanlı dedektör
+    
+    İlk `training_frames` frame boyunca profili eğitir (alarm üretmez), ardından
+    frame'leri ID başına örnekleyerek skorlar. Pipeline'daki en pahalı kontrol olduğu için en sonda çalışır.
+    """
+    
+    name = 'payload_anomaly'
+    order = 50
+    
+    def __init__(self, profiler: Optional[PayloadProfiler] = None,
+                 training_frames: int = PAYLOAD_TRAINING_FRAMES):
+        self.profiler = profiler or PayloadProfiler()
+        self.training_frames = training_frames
+        
+    def check(self, ctx: FrameContext) -> Optional[Tuple[str, str]]:
+        profiler = self.profiler
+        if profiler.training:
+            profiler.train(ctx.can_id, ctx.data)
+            if profiler.trained_frames >= self.training_frames:
+                profiler.finish_training()
+            return None
+        score, reason = profiler.score(ctx.can_id, ctx.data)
+        if reason is not None:
+            return 'PAYLOAD_ANOMALY', f"Payload anomalisi: {hex(ctx.can_id)} ({reason})"
+        return None
@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Çok Süreçli (Sharded) CAN-IDS
+Okuyucu süreçler frame'leri paylaşımlı bellek ring buffer'larına yazar; her
+worker süreci arbitration ID hash aralığının bir parçasına sahiptir ve ID başına
+frekans/zaman aralığı dedektörlerini paralel çalıştırır. Alarmlar tek bir
+toplayıcıya (ana süreç) gönderilir; worker'lar alarmları (tip, CAN ID) başına
+toplayıp periyodik olarak gönderir, IPC maliyeti farklı alarm sayısıyla sınırlıdır.
+"""
+
+import asyncio
+import logging
+import multiprocessing as mp
+import os
+import queue
+import time
+from collections import defaultdict
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from alarm_store import AlarmStore
+from can_gateway import FRAME_SIZE
+from ids_detectors import DetectorPipeline, FrameContext, IntervalStats, NORMAL_CAN_IDS
+from hotpath_logging import ASYNC_LOGGING_ENABLED, setup_async_logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Okuyucu → worker ring kapasitesi (frame); 1 Mbit/s bus'ta ~7 sn'lik tampon
+DEFAULT_RING_CAPACITY = 65536
+# Worker'ın ring boşken bekleme süresi (saniye)
+WORKER_POLL_INTERVAL = 0.001
+# Worker'ın tek seferde işleyeceği en fazla frame
+WORKER_BATCH_SIZE = 1024
+# Worker'da toplanan alarmların toplayıcıya gönderilme aralığı (saniye)
+ALARM_FLUSH_INTERVAL = 0.1
+
+# Ring başlığındaki int64 alanlar
+_WRITE, _READ, _DROPPED = 0, 1, 2
+_HEADER_FIELDS = 4
+
+
+def shard_for(can_id: int, shards: int) -> int:
+    """Arbitration ID → worker indeksi (ardışık ID'leri dağıtan çarpımsal hash)"""
+    return ((can_id * 2654435761) & 0xFFFFFFFF) % shards
+
+
+class SharedFrameRing:
+    """
+    Paylaşımlı bellekte tek üretici / tek tüketici (SPSC) frame ring'i
+    
+    Düzen: int64 başlık [write, read, dropped, -] + monotonic ns (int64) +
+    arbitration ID (uint32) + DLC (uint8) + (N, 8) uint8 payload. Üretici
+    yalnızca `write`, tüketici yalnızca `read` indeksini ilerletir; indeksler
+    mutlak sayaçtır (kapasiteye göre mod alınır). Ring doluysa yeni frame
+    atılır ve `dropped` artırılır.
+    """
+    
+    def __init__(self, capacity: int, name: Optional[str] = None, create: bool = True):
+        """
+        Args:
+            capacity: Frame kapasitesi
+            name: Paylaşımlı bellek adı (bağlanırken zorunlu)
+            create: True ise yeni bellek ayır, False ise mevcut belleğe bağlan
+        """
+        self.capacity = capacity
+        size = capacity * (8 + 4 + 1 + FRAME_SIZE) + _HEADER_FIELDS * 8
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self.name = self.shm.name
+        buffer = self.shm.buf
+        
+        offset = 0
+        self.header = np.ndarray(_HEADER_FIELDS, dtype=np.int64, buffer=buffer, offset=offset)
+        offset += _HEADER_FIELDS * 8
+        self.timestamps_ns = np.ndarray(capacity, dtype=np.int64, buffer=buffer, offset=offset)
+        offset += capacity * 8
+        self.can_ids = np.ndarray(capacity, dtype=np.uint32, buffer=buffer, offset=offset)
+        offset += capacity * 4
+        self.dlc = np.ndarray(capacity, dtype=np.uint8, buffer=buffer, offset=offset)
+        offset += capacity
+        self.data = np.ndarray((capacity, FRAME_SIZE), dtype=np.uint8, buffer=buffer, offset=offset)
+        if create:
+            self.header[:] = 0
+            
+        # Üretici yolu: skaler yazmalar memoryview üzerinden (FrameHistory ile aynı)
+        self._header_bytes = buffer[:_HEADER_FIELDS * 8]
+        self._header_view = self._header_bytes.cast('q')
+        self._timestamps_view = memoryview(self.timestamps_ns).cast('B').cast('q')
+        self._ids_view = memoryview(self.can_ids).cast('B').cast('I')
+        self._dlc_view = memoryview(self.dlc)
+        self._data_view = memoryview(self.data).cast('B')
+        
+    def push(self, timestamp_ns: int, can_id: int, data) -> bool:
+        """Frame ekle (yalnızca üretici); ring doluysa False"""
+        header = self._header_view
+        write = header[_WRITE]
+        if write - header[_READ] >= self.capacity:
+            header[_DROPPED] += 1
+            return False
+        index = write % self.capacity
+        self._timestamps_view[index] = timestamp_ns
+        self._ids_view[index] = can_id
+        length = min(len(data), FRAME_SIZE)
+        self._dlc_view[index] = length
+        start = index * FRAME_SIZE
+        self._data_view[start:start + length] = data[:length]
+        # Veri yazıldıktan sonra yayınla
+        header[_WRITE] = write + 1
+        return True
+        
+    def pop_batch(self, max_frames: int = WORKER_BATCH_SIZE) -> Tuple[List[int], List[int], List[bytes]]:
+        """
+        Bekleyen frame'leri al (yalnızca tüketici)
+        
+        Payload'lar `read` ilerletilmeden önce kopyalanır (sonrasında üretici
+        aynı slotların üzerine yazabilir); blok tek seferde kopyalanıp DLC'ye
+        göre dilimlenir.
+        
+        Returns:
+            (timestamps_ns, can_ids, payloads) listeleri
+        """
+        header = self._header_view
+        read = header[_READ]
+        count = min(header[_WRITE] - read, max_frames)
+        if count <= 0:
+            return [], [], []
+        start = read % self.capacity
+        end = start + count
+        if end <= self.capacity:
+            timestamps = self.timestamps_ns[start:end].tolist()
+            can_ids = self.can_ids[start:end].tolist()
+            lengths = self.dlc[start:end].tolist()
+            block = self.data[start:end].tobytes()
+        else:
+            end -= self.capacity
+            timestamps = self.timestamps_ns[start:].tolist() + self.timestamps_ns[:end].tolist()
+            can_ids = self.can_ids[start:].tolist() + self.can_ids[:end].tolist()
+            lengths = self.dlc[start:].tolist() + self.dlc[:end].tolist()
+            block = self.data[start:].tobytes() + self.data[:end].tobytes()
+        header[_READ] = read + count
+        payloads = [block[offset:offset + length]
+                    for offset, length in zip(range(0, count * FRAME_SIZE, FRAME_SIZE), lengths)]
+        return timestamps, can_ids, payloads
+        
+    def stats(self) -> Dict[str, int]:
+        header = self._header_view
+        return {
+            'written': header[_WRITE],
+            'read': header[_READ],
+            'backlog': header[_WRITE] - header[_READ],
+            'dropped': header[_DROPPED],
+        }
+        
+    def close(self, unlink: bool = False):
+        """Belleği serbest bırak (unlink yalnızca sahibi tarafından)"""
+        for view in (self._header_view, self._header_bytes, self._timestamps_view, self._ids_view,
+                     self._dlc_view, self._data_view):
+            view.release()
+        self.header = self.timestamps_ns = self.can_ids = self.dlc = self.data = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class ShardAnalyzer:
+    """
+    Worker'ın sahip olduğu ID'ler için CANIDS ile aynı dedektör pipeline'ı
+    
+    Frekans oranı için payda tüm okuyucuların ürettiği toplam frame sayısıdır
+    (paylaşımlı sayaç); böylece oran shard'a değil tüm bus trafiğine göredir.
+    """
+    
+    def __init__(self, normal_ids=NORMAL_CAN_IDS):
+        self.normal_ids = frozenset(normal_ids)
+        self.id_frequency: Dict[int, int] = defaultdict(int)
+        self.id_last_seen_ns: Dict[int, int] = {}
+        self.id_intervals: Dict[int, IntervalStats] = defaultdict(IntervalStats)
+        self.pipeline = DetectorPipeline.default(self.normal_ids)
+        self._context = FrameContext()
+        
+    def analyze(self, timestamp_ns: int, can_id: int, data: bytes, total_messages: int) -> List[Tuple[str, str]]:
+        """Frame'i analiz et, (alarm_type, message) listesi döndür"""
+        self.id_frequency[can_id] += 1
+        last_seen = self.id_last_seen_ns.get(can_id)
+        if last_seen is not None:
+            self.id_intervals[can_id].add((timestamp_ns - last_seen) * 1e-9)
+        self.id_last_seen_ns[can_id] = timestamp_ns
+        
+        ctx = self._context
+        ctx.can_id = can_id
+        ctx.timestamp_ns = timestamp_ns
+        ctx.data = data
+        ctx.id_count = self.id_frequency[can_id]
+        ctx.total_messages = total_messages
+        ctx.intervals = self.id_intervals.get(can_id)
+        return self.pipeline.run(ctx)
+
+
+def _reader_main(reader_index: int, channel: str, bustype: str, ring_names: Sequence[str],
+                 capacity: int, produced, stop_event):
+    """Okuyucu süreci: bus'tan oku, ID hash'ine göre worker ring'ine yaz"""
+    import can
+    
+    rings = [SharedFrameRing(capacity, name=name, create=False) for name in ring_names]
+    shards = len(rings)
+    bus = can.interface.Bus(channel, bustype=bustype)
+    monotonic_ns = time.monotonic_ns
+    count = 0
+    try:
+        while not stop_event.is_set():
+            # Ayrı süreçte bloklayan recv sorun değil; timeout yalnızca stop kontrolü için
+            msg = bus.recv(timeout=0.2)
+            if msg is None:
+                continue
+            can_id = msg.arbitration_id
+            rings[shard_for(can_id, shards)].push(monotonic_ns(), can_id, msg.data)
+            count += 1
+            produced[reader_index] = count
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bus.shutdown()
+        for ring in rings:
+            ring.close()
+
+
+def _flush_alarms(shard: int, pending: Dict[Tuple[str, int], List], alarm_queue):
+    """Toplanan alarmları tek kuyruk mesajında gönder: (shard, [(tip, ID, mesaj, sayı, ilk ns, son ns), ...])"""
+    if pending:
+        alarm_queue.put((shard, [(alarm_type, can_id, message, count, first_ns, last_ns)
+                                 for (alarm_type, can_id), (count, first_ns, last_ns, message)
+                                 in pending.items()]))
+        pending.clear()
+
+
+def _worker_main(shard: int, ring_names: Sequence[str], capacity: int, produced, worker_stats,
+                 alarm_queue, stop_event, normal_ids):
+    """
+    Worker süreci: kendi ring'lerini (okuyucu başına bir tane) tüket ve analiz et
+    
+    Alarmlar (tip, CAN ID) başına [sayı, ilk ns, son ns, son mesaj] olarak
+    toplanır ve ALARM_FLUSH_INTERVAL'de bir tek `put` ile gönderilir; flood'da
+    kuyruk trafiği frame sayısıyla değil farklı alarm sayısıyla büyür.
+    """
+    rings = [SharedFrameRing(capacity, name=name, create=False) for name in ring_names]
+    analyzer = ShardAnalyzer(normal_ids)
+    processed = 0
+    alarm_count = 0
+    pending: Dict[Tuple[str, int], List] = {}
+    next_flush = time.monotonic() + ALARM_FLUSH_INTERVAL
+    try:
+        while not stop_event.is_set():
+            idle = True
+            for ring in rings:
+                timestamps, can_ids, payloads = ring.pop_batch()
+                if not can_ids:
+                    continue
+                idle = False
+                total_messages = sum(produced)
+                for timestamp_ns, can_id, data in zip(timestamps, can_ids, payloads):
+                    for alarm_type, message in analyzer.analyze(timestamp_ns, can_id, data, total_messages):
+                        entry = pending.get((alarm_type, can_id))
+                        if entry is None:
+                            pending[(alarm_type, can_id)] = [1, timestamp_ns, timestamp_ns, message]
+                        else:
+                            entry[0] += 1
+                            entry[2] = timestamp_ns
+                            entry[3] = message
+                        alarm_count += 1
+                processed += len(can_ids)
+                worker_stats[shard * 2] = processed
+                worker_stats[shard * 2 + 1] = alarm_count
+            now = time.monotonic()
+            if now >= next_flush:
+                _flush_alarms(shard, pending, alarm_queue)
+                next_flush = now + ALARM_FLUSH_INTERVAL
+            if idle:
+                time.sleep(WORKER_POLL_INTERVAL)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        _flush_alarms(shard, pending, alarm_queue)
+        for ring in rings:
+            ring.close()
+
+
+class ShardedCANIDS:
+    """
+    CAN-IDS'in çok süreçli sürümü
+    
+    Her kanal için bir okuyucu süreci, `workers` adet analiz süreci ve ana
+    süreçte bir alarm toplayıcı çalışır. Her (okuyucu, worker) çifti kendi
+    SPSC ring'ini kullanır, süreçler arası kilit yoktur. Alarm formatı
+    CANIDS ile aynıdır (ek olarak 'shard').
+    """
+    
+    def __init__(self, channels: Sequence[str] = ('vcan0',), workers: Optional[int] = None,
+                 bustype: str = 'socketcan', ring_capacity: int = DEFAULT_RING_CAPACITY,
+                 normal_ids=NORMAL_CAN_IDS):
+        """
+        Args:
+            channels: Dinlenecek CAN kanalları (her biri için bir okuyucu süreci)
+            workers: Analiz süreci sayısı (None ise CPU sayısı - okuyucu sayısı, en az 1)
+            bustype: python-can arayüzü
+            ring_capacity: Okuyucu → worker ring kapasitesi
+            normal_ids: Bilinen CAN ID'ler
+        """
+        self.channels = list(channels)
+        self.workers = workers or max(1, (os.cpu_count() or 2) - len(self.channels))
+        self.bustype = bustype
+        self.ring_capacity = ring_capacity
+        self.normal_ids = frozenset(normal_ids)
+        
+        self._ctx = mp.get_context('spawn')
+        self.rings: List[List[SharedFrameRing]] = []  # [okuyucu][worker]
+        self.produced = self._ctx.Array('q', max(1, len(self.channels)), lock=False)
+        self.worker_stats = self._ctx.Array('q', self.workers * 2, lock=False)
+        self.alarm_queue = self._ctx.Queue()
+        self.stop_event = self._ctx.Event()
+        self.processes: List[mp.process.BaseProcess] = []
+        self.alarms = AlarmStore()
+        self.running = False
+        
+    def _spawn(self, target, name: str, *args):
+        process = self._ctx.Process(target=target, args=args, name=name, daemon=True)
+        process.start()
+        self.processes.append(process)
+        
+    async def start(self):
+        """Ring'leri ayır, worker ve okuyucu süreçlerini başlat"""
+        self.rings = [[SharedFrameRing(self.ring_capacity) for _ in range(self.workers)]
+                      for _ in self.channels]
+        for shard in range(self.workers):
+            self._spawn(_worker_main, f"ids-worker-{shard}", shard,
+                        [rings[shard].name for rings in self.rings], self.ring_capacity,
+                        self.produced, self.worker_stats, self.alarm_queue, self.stop_event,
+                        self.normal_ids)
+        for reader_index, channel in enumerate(self.channels):
+            self._spawn(_reader_main, f"ids-reader-{channel}", reader_index, channel, self.bustype,
+                        [ring.name for ring in self.rings[reader_index]], self.ring_capacity,
+                        self.produced, self.stop_event)
+        self.running = True
+        logger.info(f"Sharded CAN-IDS başlatıldı: kanallar={self.channels}, worker={self.workers}")
+        asyncio.create_task(self._collect_alarms())
+        
+    async def _collect_alarms(self):
+        """Worker alarmlarını topla (kuyruk okuması executor'da, event loop bloklanmaz)"""
+        loop = asyncio.get_running_loop()
+        while self.running:
+            try:
+                batch = await loop.run_in_executor(None, self._drain_alarm_queue, 0.5)
+            except Exception as e:
+                logger.error(f"Alarm toplama hatası: {e}")
+                continue
+            # Zaman damgaları frame'in okuyucuda alındığı an (CLOCK_MONOTONIC süreçler arası ortak);
+            # kuyruk gecikmesi ilk/son görülme ve bastırma penceresine karışmaz
+            for shard, aggregates in batch:
+                for alarm_type, can_id, message, count, first_ns, last_ns in aggregates:
+                    suppressed = self.alarms.record(alarm_type, can_id, message, last_ns,
+                                                    count=count, first_seen_ns=first_ns)
+                    if suppressed is None:
+                        continue
+                    repeated = f" (+{suppressed} tekrar bastırıldı)" if suppressed else ""
+                    logger.warning(f"🚨 ALARM [{alarm_type}] (shard {shard}): {message}{repeated}")
+                
+    def _drain_alarm_queue(self, timeout: float) -> List[Tuple]:
+        """İlk alarm grubunu bekle, ardından kuyrukta biriken tüm grupları al"""
+        try:
+            batch = [self.alarm_queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                batch.append(self.alarm_queue.get_nowait())
+            except queue.Empty:
+                return batch
+                
+    def get_statistics(self) -> Dict[str, Any]:
+        """Okuyucu, worker ve ring istatistikleri"""
+        return {
+            'total_messages': sum(self.produced),
+            'total_alarms': len(self.alarms),
+            'readers': dict(zip(self.channels, self.produced)),
+            'workers': [
+                {'processed': self.worker_stats[shard * 2], 'alarms': self.worker_stats[shard * 2 + 1],
+                 'rings': [rings[shard].stats() for rings in self.rings]}
+                for shard in range(self.workers)
+            ],
+            'alarms': self.alarms.get_statistics(),
+            'recent_alarms': list(self.alarms.recent)[-10:],
+        }
+        
+    def stop(self):
+        """Süreçleri durdur ve paylaşımlı belleği serbest bırak"""
+        if not self.running:
+            return
+        self.running = False
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        for rings in self.rings:
+            for ring in rings:
+                ring.close(unlink=True)
+        logger.info("Sharded CAN-IDS durduruldu")
+
+
+async def main():
+    """Ana fonksiyon"""
+    import sys
+    
+    workers = next((int(arg.split('=', 1)[1]) for arg in sys.argv if arg.startswith('--workers=')), None)
+    channels = [arg for arg in sys.argv[1:] if not arg.startswith('--')] or ['vcan0']
+    
+    ids = ShardedCANIDS(channels=channels, workers=workers)
+    try:
+        await ids.start()
+        while ids.running:
+            await asyncio.sleep(30)
+            stats = ids.get_statistics()
+            logger.info(f"Toplam mesaj: {stats['total_messages']}, toplam alarm: {stats['total_alarms']}")
+            for shard, worker in enumerate(stats['workers']):
+                logger.info(f"  worker {shard}: {worker['processed']} frame, {worker['alarms']} alarm, "
+                            f"ring: {worker['rings']}")
+    finally:
+        ids.stop()
+
+
+if __name__ == "__main__":
+    # Kullanım: python sharded_ids.py [--workers=N] vcan0 [vcan1 ...]
+    listener = setup_async_logging() if ASYNC_LOGGING_ENABLED else None
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Kapatılıyor...")
+    finally:
+        if listener:
+            listener.stop()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+CAN-IDS İstatistik Snapshot'ları
+Okuyucular (raporlama, get_statistics) frame yolunun canlı sayaçlarını
+kopyalamak yerine periyodik olarak yayınlanan değişmez snapshot'ları okur.
+En sık ID'ler tam sıralama yerine heap ile seçilir (O(n log k)).
+"""
+
+import heapq
+import time
+from operator import itemgetter
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Tuple
+
+# Snapshot yenileme aralığı (saniye)
+DEFAULT_SNAPSHOT_INTERVAL = 1.0
+# Raporlanan en sık ID sayısı
+DEFAULT_TOP_K = 10
+
+
+def top_k(counts: Mapping[int, int], k: int = DEFAULT_TOP_K) -> List[Tuple[int, int]]:
+    """En büyük k (ID, sayı) çifti (azalan sırada, heap ile; tam sıralama yok)"""
+    return heapq.nlargest(k, counts.items(), key=itemgetter(1))
+
+
+class StatsSnapshot:
+    """
+    Belirli bir andaki IDS istatistikleri (değişmez)
+    
+    Snapshot yayınlandıktan sonra değiştirilmez; yeni snapshot eski nesnenin
+    yerine tek bir referans ataması ile konur (copy-on-write). Okuyucu hangi
+    snapshot'ı aldıysa onu tutarlı görür, ingest yolu okuyucuyu beklemez.
+    """
+    
+    __slots__ = ('created_ns', 'messages_processed', 'id_frequency', 'top_ids')
+    
+    def __init__(self, id_frequency: Dict[int, int], messages_processed: int, top: int = DEFAULT_TOP_K):
+        """
+        Args:
+            id_frequency: Sayaçların kopyası (snapshot sahiplenir, çağıran değiştirmemeli)
+            messages_processed: İşlenen toplam frame
+            top: Hesaplanacak en sık ID sayısı
+        """
+        self.created_ns = time.monotonic_ns()
+        self.messages_processed = messages_processed
+        self.id_frequency: Mapping[int, int] = MappingProxyType(id_frequency)
+        self.top_ids = top_k(id_frequency, top)
+        
+    @property
+    def age(self) -> float:
+        """Snapshot yaşı (saniye)"""
+        return (time.monotonic_ns() - self.created_ns) * 1e-9
+        
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'unique_ids': len(self.id_frequency),
+            'id_frequency': self.id_frequency,
+            'top_ids': [(hex(can_id), count) for can_id, count in self.top_ids],
+            'snapshot_age': round(self.age, 3),
+        }
+
@@ -174,6 +174,54 @@ async def monitor_can_traffic():
         logger.error(f"Hata: {e}")
 
 
+async def check_malicious_frame_delivery(channel: str = 'vcan0'):
+    """
+    vcan kontrolü: compromised CP'nin 0x9FF frame'i kernel filtrelerinden geçip charger'a ulaşıyor mu?
+    
+    CP ve charger simülatörü kendi soketlerini (tüketilen ID'lere kernel
+    filtresiyle) açar; CP RemoteStartTransaction ile 0x200 ve ardından
+    malicious frame'i gönderir.
+    """
+    from can_bus_simulator import CANBusSimulator
+    from can_constants import MALICIOUS_CAN_ID
+    from cp_simulator import ChargePointSimulator
+    
+    logger.info("\n" + "="*60)
+    logger.info(f"KONTROL: Malicious frame teslimi ({channel})")
+    logger.info("="*60)
+    
+    simulator = CANBusSimulator(can_bus=channel)
+    received = set()
+    handle = simulator._handle_can_message
+    
+    async def recording_handler(msg):
+        received.add(msg.arbitration_id)
+        await handle(msg)
+        
+    simulator._handle_can_message = recording_handler
+    cp = ChargePointSimulator('CP_001', None, can_bus=channel, compromised=True)
+    try:
+        await simulator.start()
+        cp._start_can()
+        cp.on_remote_start_transaction(1, 'CHECK_TAG')
+        
+        expected = {0x200, MALICIOUS_CAN_ID}
+        for _ in range(20):
+            if expected <= received:
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        cp.stop()
+        simulator.stop()
+        
+    missing = expected - received
+    if missing:
+        logger.error(f"❌ Charger'a ulaşmayan frame'ler: {[hex(can_id) for can_id in sorted(missing)]}")
+        return False
+    logger.info(f"✅ 0x200 ve {hex(MALICIOUS_CAN_ID)} charger simülatörüne ulaştı")
+    return True
+
+
 async def main():
     """Ana fonksiyon"""
     import sys
@@ -193,6 +241,9 @@ async def main():
             await interactive_csms_commands()
         elif scenario == '--monitor' or scenario == '-mon':
             await monitor_can_traffic()
+        elif scenario == '--can-check':
+            if not await check_malicious_frame_delivery(sys.argv[2] if len(sys.argv) > 2 else 'vcan0'):
+                sys.exit(1)
         else:
             logger.error(f"Bilinmeyen senaryo: {scenario}")
     else:
@@ -203,6 +254,7 @@ async def main():
         logger.info("  python test_scenarios.py --defense       # Savunma karşılaştırması")
         logger.info("  python test_scenarios.py --interactive   # İnteraktif komutlar")
         logger.info("  python test_scenarios.py --monitor       # CAN trafik izleme")
+        logger.info("  python test_scenarios.py --can-check     # 0x9FF frame'inin charger'a ulaştığını kontrol et (vcan)")
 
 
 if __name__ == "__main__":